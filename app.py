@@ -1,54 +1,52 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
 import sqlite3
 import os
 import time
-import threading
 import functools
 from models.mvcc import MVCCSimulation
 from models.deadlock import DeadlockDetection
 from models.two_phase_locking import TwoPhaseLockingBenchmark
+from models.locking_engine import TwoPhaseLockingEngine
+from models.bulk_load import create_schema, create_indexes
+from models.rendering import collect_chart
+from models.coordination import CoordinationStore, RunLease, SQLiteResultStore, SQLiteTokenBucket
+from models import responses
 
 app = Flask(__name__)
 
 # Ensure database directory exists
 DB_PATH = os.path.join(os.path.dirname(__file__), 'database.db')
 
-# Global lock for preventing overlapping simulation requests
-simulation_lock = threading.Lock()
+# Rate-limit buckets and the simulation lease are kept in a SQLite file
+# shared by every worker process, so limits and exclusive runs hold when the
+# app is served by several workers
+COORDINATION_PATH = os.environ.get(
+    'COORDINATION_DB', os.path.join(os.path.dirname(__file__), 'coordination.db')
+)
+coordination_store = CoordinationStore(COORDINATION_PATH)
+
+# Lease for preventing overlapping simulation requests (across all workers)
+simulation_lock = RunLease(coordination_store, "simulation", ttl=300)
 
 # Rate limiter implementation for simulation endpoints
 class RateLimiter:
     def __init__(self, max_calls=1, period=3):  # Allow 1 call per 3 seconds
-        self.calls = {}
-        self.max_calls = max_calls
-        self.period = period
-        self.lock = threading.Lock()
+        self.bucket = SQLiteTokenBucket(coordination_store, capacity=max_calls, period=period)
     
     def __call__(self, func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             # Get client IP or a default if running locally
             client_id = request.remote_addr or "127.0.0.1"
-            current_time = time.time()
             
-            with self.lock:
-                # Clean up old entries
-                self.calls = {k: v for k, v in self.calls.items() 
-                             if current_time - v[-1] < self.period}
-                
-                # Check if client has made too many calls
-                if client_id in self.calls and len(self.calls[client_id]) >= self.max_calls:
-                    last_call = self.calls[client_id][-1]
-                    time_left = int(self.period - (current_time - last_call)) + 1
-                    return jsonify({
-                        "error": f"Please wait {time_left} seconds before trying again.",
-                        "rate_limited": True
-                    }), 429
-                
-                # Add this call
-                if client_id not in self.calls:
-                    self.calls[client_id] = []
-                self.calls[client_id].append(current_time)
+            # Check and take a token in one step, shared with the other workers
+            allowed, retry_after = self.bucket.acquire(client_id)
+            if not allowed:
+                time_left = int(retry_after) + 1
+                return jsonify({
+                    "error": f"Please wait {time_left} seconds before trying again.",
+                    "rate_limited": True
+                }), 429
             
             # Execute the function
             return func(*args, **kwargs)
@@ -58,48 +56,50 @@ class RateLimiter:
 # Create rate limiter instances
 simulation_rate_limiter = RateLimiter(max_calls=1, period=3)
 
+# Recent full results, so later pages are served without re-running a
+# simulation; shared, since a page request may reach any worker
+result_store = SQLiteResultStore(coordination_store, max_runs=8)
+
+def paged_response(paged):
+    """
+    Send a view's result dict through the response layer.
+    
+    The full result is cached in result_store; the response carries the
+    first page of every list in `paged` ({path pattern: keyset field or
+    None}) plus cursors for the rest, keeps only the ?fields= requested,
+    and is compressed according to Accept-Encoding. Error responses
+    returned by the view pass through unchanged.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Validate paging parameters before running anything
+            try:
+                limit = responses.page_size(request.args.get('limit'))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            fields = responses.parse_fields(request.args.get('fields'))
+            
+            results = func(*args, **kwargs)
+            if not isinstance(results, dict):
+                return results
+            
+            run_id = result_store.put(results)
+            payload = responses.paginate_results(results, run_id, paged, limit, fields)
+            body, headers = responses.render(payload, request.headers.get('Accept-Encoding', ''))
+            return Response(body, headers=headers)
+        
+        return wrapper
+    return decorator
+
 def init_db():
     """Initialize the SQLite database with sample data"""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
-    # Create tables if they don't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS accounts (
-        id INTEGER PRIMARY KEY,
-        name TEXT NOT NULL,
-        balance REAL NOT NULL
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS transaction_log (
-        txn_id INTEGER PRIMARY KEY,
-        start_timestamp TEXT NOT NULL,
-        commit_timestamp TEXT,
-        status TEXT
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS account_versions (
-        version_id INTEGER PRIMARY KEY,
-        account_id INTEGER,
-        balance REAL,
-        txn_id INTEGER,
-        timestamp TEXT,
-        FOREIGN KEY (account_id) REFERENCES accounts (id),
-        FOREIGN KEY (txn_id) REFERENCES transaction_log (txn_id)
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS items (
-        id INTEGER PRIMARY KEY,
-        name TEXT NOT NULL,
-        value INTEGER NOT NULL
-    )
-    ''')
+    # Create tables and lookup indexes if they don't exist
+    create_schema(cursor)
+    create_indexes(cursor)
     
     # Check if we need to insert initial data
     cursor.execute("SELECT COUNT(*) FROM accounts")
@@ -132,6 +132,7 @@ def mvcc():
 
 @app.route('/api/run-mvcc')
 @simulation_rate_limiter
+@paged_response({"timeline": None, "versions": "version_id"})
 def run_mvcc():
     """Run MVCC simulation and return results"""
     try:
@@ -146,7 +147,7 @@ def run_mvcc():
             # Run the simulation
             simulation = MVCCSimulation(DB_PATH)
             results = simulation.run_simulation()
-            return jsonify(results)
+            return results
         finally:
             simulation_lock.release()
     except sqlite3.Error as e:
@@ -161,6 +162,7 @@ def deadlock():
 
 @app.route('/api/run-deadlock')
 @simulation_rate_limiter
+@paged_response({"steps": None})
 def run_deadlock():
     """Run deadlock detection simulation and return results"""
     try:
@@ -172,10 +174,39 @@ def run_deadlock():
             # Add a small delay to simulate processing time and avoid race conditions
             time.sleep(0.5)
             
-            # Run the simulation
+            # Run the simulation; the graph is still rendering when it returns
+            detection = DeadlockDetection(DB_PATH)
+            results = detection.detect_deadlocks(wait_for_chart=False)
+        finally:
+            simulation_lock.release()
+        
+        # Wait for the graph image only once the lease is free for other runs
+        return collect_chart(results, "graph_image")
+    except sqlite3.Error as e:
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+    except Exception as e:
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
+@app.route('/api/run-distributed-deadlock')
+@simulation_rate_limiter
+@paged_response({"rows": None})
+def run_distributed_deadlock():
+    """Compare distributed (edge-chasing) and centralized deadlock detection"""
+    try:
+        node_counts = [int(n) for n in request.args.get('nodes', '2,4,8').split(',') if n.strip()]
+    except ValueError:
+        return jsonify({"error": "nodes must be a comma-separated list of integers"}), 400
+    if not node_counts or not all(1 <= n <= 32 for n in node_counts):
+        return jsonify({"error": "Node counts must be between 1 and 32"}), 400
+    
+    try:
+        if not simulation_lock.acquire(blocking=False):
+            return jsonify({"error": "Another simulation is still running. Please try again in a moment."}), 429
+        
+        try:
             detection = DeadlockDetection(DB_PATH)
-            results = detection.detect_deadlocks()
-            return jsonify(results)
+            results = detection.detect_distributed(node_counts=node_counts)
+            return results
         finally:
             simulation_lock.release()
     except sqlite3.Error as e:
@@ -190,6 +221,8 @@ def two_phase_locking():
 
 @app.route('/api/run-2pl')
 @simulation_rate_limiter
+@paged_response({"benchmarks.*.timeline": None, "variants.*.timeline": None, "hybrid.timeline": None,
+                 "range_locking.*.timeline": None})
 def run_2pl():
     """Run 2PL benchmark simulation and return results"""
     try:
@@ -201,16 +234,45 @@ def run_2pl():
             # Add a small delay to simulate processing time and avoid race conditions
             time.sleep(0.5)
             
-            # Run the simulation
-            benchmark = TwoPhaseLockingBenchmark(DB_PATH)
-            results = benchmark.run_benchmark()
-            return jsonify(results)
+            # Optional comma-separated list of 2PL variants to compare
+            variants = request.args.get('variants')
+            if variants:
+                variants = [v.strip() for v in variants.split(',') if v.strip()]
+                unknown = [v for v in variants if v not in TwoPhaseLockingEngine.VARIANTS]
+                if unknown:
+                    return jsonify({"error": f"Unknown 2PL variant(s): {', '.join(unknown)}"}), 400
+            
+            # Run the simulation; the chart is still rendering when it returns
+            benchmark = TwoPhaseLockingBenchmark(DB_PATH, variants=variants)
+            results = benchmark.run_benchmark(wait_for_chart=False)
         finally:
             simulation_lock.release()
+        
+        # Wait for the chart only once the lease is free for other runs
+        return collect_chart(results, "chart")
     except sqlite3.Error as e:
         return jsonify({"error": f"Database error: {str(e)}"}), 500
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
+@app.route('/api/results/page')
+def results_page():
+    """Return the next page of a paginated list from a recent simulation run"""
+    token = request.args.get('cursor')
+    if not token:
+        return jsonify({"error": "Missing cursor parameter"}), 400
+    
+    try:
+        limit = responses.page_size(request.args.get('limit'))
+        fields = responses.parse_fields(request.args.get('fields'))
+        page = responses.next_page(result_store, token, limit, fields)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except KeyError as e:
+        return jsonify({"error": e.args[0]}), 404
+    
+    body, headers = responses.render(page, request.headers.get('Accept-Encoding', ''))
+    return Response(body, headers=headers)
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
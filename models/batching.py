@@ -0,0 +1,89 @@
+import sqlite3
+
+
+class CountingConnection(sqlite3.Connection):
+    """
+    SQLite connection that counts the statements and commits it executes.
+    
+    Every execute() or executemany() call on one of its cursors counts as
+    one statement, however many parameter rows it carries, so batching
+    shows up as a lower count.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements = 0
+        self.commits = 0
+    
+    def cursor(self, factory=None):
+        return super().cursor(factory or CountingCursor)
+    
+    def commit(self):
+        self.commits += 1
+        super().commit()
+    
+    def sql_stats(self):
+        """Statement and commit counters for reporting."""
+        return {"statements": self.statements, "commits": self.commits}
+
+
+class CountingCursor(sqlite3.Cursor):
+    """Cursor that reports each execute/executemany call to its connection."""
+    
+    def execute(self, sql, parameters=()):
+        self.connection.statements += 1
+        return super().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        self.connection.statements += 1
+        return super().executemany(sql, seq_of_parameters)
+
+
+def connect(db_path):
+    """
+    Open a statement-counting connection to the simulation database.
+    
+    SQLite keeps a per-connection cache of prepared statements keyed by SQL
+    text, so a statement string reused across calls is prepared only once.
+    """
+    conn = sqlite3.connect(db_path, factory=CountingConnection, cached_statements=256)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class BatchWriter:
+    """
+    Buffers write statements and flushes them with executemany().
+    
+    Consecutive rows for the same SQL text are sent as one batch. Adding a
+    row for a different statement first flushes the pending batch, so the
+    statements reach SQLite in the order they were added; a batch is also
+    flushed when it reaches batch_size rows, or on flush(). Flushing does
+    not commit, so a whole run of batches can share one explicit
+    transaction.
+    """
+    
+    def __init__(self, cursor, batch_size=500):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.sql = None  # statement of the pending batch
+        self.pending = []  # buffered parameter rows for self.sql
+        self.batches = 0
+        self.rows = 0
+    
+    def add(self, sql, parameters):
+        """Buffer one parameter row for a statement."""
+        if sql != self.sql:
+            self.flush()
+            self.sql = sql
+        self.pending.append(parameters)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Send the pending batch to SQLite as one executemany()."""
+        if self.pending:
+            self.cursor.executemany(self.sql, self.pending)
+            self.batches += 1
+            self.rows += len(self.pending)
+            self.pending = []
@@ -0,0 +1,132 @@
+import random
+import time
+
+
+# Tables used by the MVCC simulations
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS accounts (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        balance REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transaction_log (
+        txn_id INTEGER PRIMARY KEY,
+        start_timestamp TEXT NOT NULL,
+        commit_timestamp TEXT,
+        status TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS account_versions (
+        version_id INTEGER PRIMARY KEY,
+        account_id INTEGER,
+        balance REAL,
+        txn_id INTEGER,
+        timestamp TEXT,
+        xmax INTEGER,
+        FOREIGN KEY (account_id) REFERENCES accounts (id),
+        FOREIGN KEY (txn_id) REFERENCES transaction_log (txn_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS items (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        value INTEGER NOT NULL
+    )
+    """
+]
+
+# Indexes for name lookups and for finding the newest version of an
+# account visible to a snapshot
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_accounts_name ON accounts (name)",
+    "CREATE INDEX IF NOT EXISTS idx_account_versions_account_txn ON account_versions (account_id, txn_id)"
+]
+
+
+# Columns added after the first release, for databases created before them
+MIGRATIONS = [
+    ("account_versions", "xmax", "ALTER TABLE account_versions ADD COLUMN xmax INTEGER")
+]
+
+
+def create_schema(cursor):
+    """Create the simulation tables if they don't exist"""
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    for table, column, statement in MIGRATIONS:
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(statement)
+
+
+def create_indexes(cursor):
+    """Create the lookup indexes if they don't exist"""
+    for statement in INDEXES:
+        cursor.execute(statement)
+
+
+def account_name(number):
+    """Name of the generated account with this number"""
+    return f"Account {number}"
+
+
+def generate_accounts(num_accounts, chunk_size, seed=None):
+    """
+    Stream generated accounts in fixed-size chunks.
+    
+    Only one chunk is held in memory at a time, so the number of accounts is
+    bounded by disk space rather than RAM.
+    
+    Yields:
+        list: (name, balance) rows, at most chunk_size of them.
+    """
+    rng = random.Random(seed)
+    for start in range(1, num_accounts + 1, chunk_size):
+        end = min(start + chunk_size, num_accounts + 1)
+        yield [(account_name(number), float(rng.randint(100, 10000))) for number in range(start, end)]
+
+
+def bulk_load_accounts(cursor, num_accounts, chunk_size=50000, seed=None):
+    """
+    Load generated accounts with one executemany and one commit per chunk.
+    
+    Indexes are created after the load, which is cheaper than maintaining
+    them row by row.
+    
+    Args:
+        cursor: Database cursor
+        num_accounts: Number of accounts to generate
+        chunk_size: Rows per chunk (and per transaction)
+        seed: Random seed for the generated balances
+    
+    Returns:
+        dict: Rows loaded, chunks, and the time spent loading and indexing.
+    """
+    create_schema(cursor)
+    
+    start = time.perf_counter()
+    chunks = 0
+    for chunk in generate_accounts(num_accounts, chunk_size, seed):
+        cursor.executemany("INSERT INTO accounts (name, balance) VALUES (?, ?)", chunk)
+        cursor.connection.commit()
+        chunks += 1
+    load_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    create_indexes(cursor)
+    cursor.connection.commit()
+    index_time = time.perf_counter() - start
+    
+    return {
+        "rows": num_accounts,
+        "chunks": chunks,
+        "chunk_size": chunk_size,
+        "load_time": load_time,
+        "rows_per_second": num_accounts / load_time if load_time > 0 else 0,
+        "index_time": index_time
+    }
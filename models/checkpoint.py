@@ -0,0 +1,420 @@
+import os
+import sys
+import json
+import mmap
+import glob
+import bisect
+import random
+import shutil
+import sqlite3
+import struct
+import tempfile
+import time
+from array import array
+from models.bulk_load import create_schema
+from models.lock_manager import LockManager
+from models.scheduler import InterleavedScheduler
+from models.snapshot_isolation import SnapshotIsolationEngine
+from models.workload import generate_workload, item_key, item_name
+
+# Image header: magic, format version, kind, sequence number, engine clock,
+# version entries, distinct keys, length of the JSON lock-state section
+MAGIC = b"VSTORECK"
+VERSION = 1
+HEADER = struct.Struct("<8sHHIQQQQ")
+FULL = 0
+INCREMENTAL = 1
+
+
+def _column_bytes(column):
+    # Images are little-endian whatever the host
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def write_image(path, chains, clock, sequence=0, kind=FULL, locks=None):
+    """
+    Write version chains to a checkpoint image.
+    
+    After the header come three columns of equal length, sorted by key and
+    then commit timestamp: keys (uint32), commit timestamps (uint64) and
+    values (int64), followed by the lock state as JSON. The file is
+    written under a temporary name and renamed into place, so a crash
+    never leaves a half-written image.
+    
+    Args:
+        path: Image file to write
+        chains: Iterable of (key, [commit_ts], [value]) in ascending key order
+        clock: Engine clock (newest commit timestamp) at the checkpoint
+        sequence: Checkpoint sequence number
+        kind: FULL or INCREMENTAL
+        locks: Lock state from LockManager.export_state(), if any
+    
+    Returns:
+        dict: Entries and keys written, bytes and write time.
+    """
+    start = time.perf_counter()
+    keys, timestamps, values = array('I'), array('Q'), array('q')
+    distinct = 0
+    for key, chain_ts, chain_values in chains:
+        keys.extend([key] * len(chain_ts))
+        timestamps.extend(chain_ts)
+        values.extend(chain_values)
+        distinct += 1
+    lock_section = json.dumps(locks).encode() if locks is not None else b""
+    
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, kind, sequence, clock, len(keys), distinct, len(lock_section)))
+        for column in (keys, timestamps, values):
+            f.write(_column_bytes(column))
+        f.write(lock_section)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    
+    return {"entries": len(keys), "keys": distinct, "bytes": os.path.getsize(path),
+            "write_time": time.perf_counter() - start}
+
+
+class MappedImage:
+    """
+    A checkpoint image mapped into memory.
+    
+    Opening it reads only the header; the columns are memoryviews over the
+    mapping, so a key's chain is found by binary search and only the pages
+    it touches are read from disk.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.kind, self.sequence, self.clock, self.entries,
+         self.distinct, lock_bytes) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} checkpoint image")
+        
+        view = memoryview(self.map)
+        offset = HEADER.size
+        self.keys = view[offset:offset + 4 * self.entries].cast('I')
+        offset += 4 * self.entries
+        self.timestamps = view[offset:offset + 8 * self.entries].cast('Q')
+        offset += 8 * self.entries
+        self.values = view[offset:offset + 8 * self.entries].cast('q')
+        offset += 8 * self.entries
+        self.locks = json.loads(bytes(view[offset:offset + lock_bytes])) if lock_bytes else None
+    
+    def chain(self, key):
+        """Return ([commit_ts], [value]) for a key, or None if it is not in the image."""
+        lo = bisect.bisect_left(self.keys, key)
+        if lo == self.entries or self.keys[lo] != key:
+            return None
+        hi = bisect.bisect_right(self.keys, key, lo)
+        return self.timestamps[lo:hi].tolist(), self.values[lo:hi].tolist()
+    
+    def __contains__(self, key):
+        index = bisect.bisect_left(self.keys, key)
+        return index < self.entries and self.keys[index] == key
+    
+    def iter_chains(self):
+        """Yield (key, [commit_ts], [value]) in key order."""
+        start = 0
+        while start < self.entries:
+            key = self.keys[start]
+            end = bisect.bisect_right(self.keys, key, start)
+            yield key, self.timestamps[start:end].tolist(), self.values[start:end].tolist()
+            start = end
+    
+    def close(self):
+        for name in ("keys", "timestamps", "values"):
+            if hasattr(self, name):
+                getattr(self, name).release()
+        if not self.map.closed:
+            self.map.close()
+        self.file.close()
+
+
+class VersionStore:
+    """
+    Version chains of the snapshot-isolation engine, keyed by item name.
+    
+    Behaves like the engine's plain dict of item -> ([commit_ts], [value]),
+    but can sit on top of a mapped base image: a chain is copied out of the
+    image into the in-memory overlay the first time it is used, and items
+    never used cost nothing. Chains loaded from incremental images, and
+    every chain the engine changes, live in the overlay.
+    """
+    
+    def __init__(self, base=None):
+        self.base = base
+        self.overlay = {}
+    
+    def get(self, item, default=None):
+        chain = self.overlay.get(item)
+        if chain is None and self.base is not None:
+            chain = self.base.chain(item_key(item))
+            if chain is not None:
+                self.overlay[item] = chain
+        return default if chain is None else chain
+    
+    def __getitem__(self, item):
+        chain = self.get(item)
+        if chain is None:
+            raise KeyError(item)
+        return chain
+    
+    def __setitem__(self, item, chain):
+        self.overlay[item] = chain
+    
+    def __contains__(self, item):
+        return item in self.overlay or (self.base is not None and item_key(item) in self.base)
+    
+    def iter_chains(self):
+        """Yield (key, [commit_ts], [value]) for every item, in key order."""
+        overlay = sorted((item_key(item), chain) for item, chain in self.overlay.items())
+        index = 0
+        if self.base is not None:
+            for key, timestamps, values in self.base.iter_chains():
+                while index < len(overlay) and overlay[index][0] < key:
+                    yield overlay[index][0], *overlay[index][1]
+                    index += 1
+                if index < len(overlay) and overlay[index][0] == key:
+                    continue  # changed since the base image was written
+                yield key, timestamps, values
+        for key, chain in overlay[index:]:
+            yield key, *chain
+    
+    def close(self):
+        if self.base is not None:
+            self.base.close()
+            self.base = None
+
+
+class CheckpointManager:
+    """
+    Full and incremental checkpoints of a version store in one directory.
+    
+    A full checkpoint writes base.img with every chain and deletes older
+    deltas. An incremental checkpoint writes delta-NNNNNN.img with only the
+    chains changed since the previous checkpoint, so its cost follows the
+    write rate rather than the size of the store. Restoring maps base.img
+    and loads the deltas in sequence order on top of it.
+    """
+    
+    BASE = "base.img"
+    
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.sequence = max((image["sequence"] for image in self.images()), default=0)
+    
+    def delta_path(self, sequence):
+        return os.path.join(self.directory, f"delta-{sequence:06d}.img")
+    
+    def images(self):
+        """Existing images, base first, then deltas in sequence order."""
+        found = []
+        base = os.path.join(self.directory, self.BASE)
+        if os.path.exists(base):
+            image = MappedImage(base)
+            found.append({"path": base, "kind": FULL, "sequence": image.sequence})
+            image.close()
+        for path in sorted(glob.glob(os.path.join(self.directory, "delta-*.img"))):
+            found.append({"path": path, "kind": INCREMENTAL,
+                          "sequence": int(os.path.basename(path)[6:12])})
+        return found
+    
+    def write_full(self, store, clock, locks=None):
+        """
+        Write every chain of a store to base.img.
+        
+        Args:
+            store: VersionStore or dict of item -> ([commit_ts], [value])
+            clock: Engine clock at the checkpoint
+            locks: Lock state from LockManager.export_state(), if any
+        
+        Returns:
+            dict: Checkpoint kind, sequence, entries, bytes and write time.
+        """
+        if isinstance(store, VersionStore):
+            chains = store.iter_chains()
+        else:
+            chains = ((item_key(item), *chain) for item, chain in sorted(store.items(), key=lambda entry: item_key(entry[0])))
+        self.sequence += 1
+        path = os.path.join(self.directory, self.BASE)
+        result = write_image(path, chains, clock, self.sequence, FULL, locks)
+        # The deltas are folded into the new base
+        for image in self.images():
+            if image["kind"] == INCREMENTAL:
+                os.remove(image["path"])
+        return dict(result, kind="full", sequence=self.sequence)
+    
+    def write_incremental(self, store, items, clock, locks=None):
+        """
+        Write the chains of the given items to a new delta image.
+        
+        Args:
+            store: VersionStore or dict of item -> ([commit_ts], [value])
+            items: Items changed since the previous checkpoint
+            clock: Engine clock at the checkpoint
+            locks: Lock state from LockManager.export_state(), if any
+        
+        Returns:
+            dict: Checkpoint kind, sequence, entries, bytes and write time.
+        """
+        chains = sorted((item_key(item), *store[item]) for item in items)
+        self.sequence += 1
+        result = write_image(self.delta_path(self.sequence), chains, clock, self.sequence, INCREMENTAL, locks)
+        return dict(result, kind="incremental", sequence=self.sequence)
+    
+    def restore(self):
+        """
+        Map the newest checkpoint back in.
+        
+        Only the base image's header is read; its chains are paged in when
+        first used. Delta chains are copied into the store's overlay, newer
+        deltas overwriting older ones.
+        
+        Returns:
+            dict: The VersionStore, the engine clock and lock state of the
+            newest image, the number of deltas applied and the time taken.
+        """
+        start = time.perf_counter()
+        images = self.images()
+        if not images or images[0]["kind"] != FULL:
+            raise FileNotFoundError(f"No full checkpoint in {self.directory}")
+        
+        base = MappedImage(images[0]["path"])
+        store = VersionStore(base)
+        clock, locks = base.clock, base.locks
+        deltas = [image for image in images[1:] if image["sequence"] > base.sequence]
+        for image in deltas:
+            delta = MappedImage(image["path"])
+            for key, timestamps, values in delta.iter_chains():
+                store[item_name(key)] = (timestamps, values)
+            clock, locks = delta.clock, delta.locks
+            delta.close()
+        
+        return {"store": store, "clock": clock, "locks": locks, "deltas_applied": len(deltas),
+                "restore_time": time.perf_counter() - start}
+
+
+def benchmark_restart(key_space=1000000, batches=3, txns_per_batch=2000, ops_per_txn=4, read_ratio=0.5,
+                      sample_reads=10000, held_locks=1000, seed=46, work_dir=None):
+    """
+    Compare engine time-to-ready after a cold start and after restoring a
+    checkpoint.
+    
+    A fresh database is seeded with key_space items. The cold start loads
+    every item into the snapshot-isolation engine's version store from
+    SQLite. The engine then runs batches of transactions: a full checkpoint
+    is written after the first batch and an incremental one after each
+    later batch, together with the state of a 2PL lock table holding
+    held_locks row locks. Restarting from the checkpoints maps the base
+    image, applies the deltas and imports the lock table; the restored
+    chains and locks are compared with the running engine's.
+    
+    Args:
+        key_space: Items seeded (and chains in the store)
+        batches: Workload batches; checkpoints after each of them
+        txns_per_batch: Transactions per batch
+        ops_per_txn: Operations per transaction
+        read_ratio: Probability that an accessed key is only read
+        sample_reads: Random reads timed on the restored engine
+        held_locks: Row locks held in the checkpointed lock table
+        seed: Random seed
+        work_dir: Parent directory for the temporary database and images
+    
+    Returns:
+        dict: Cold and restored time-to-ready, checkpoint sizes and write
+        times, and the verification results.
+    """
+    base_dir = tempfile.mkdtemp(dir=work_dir)
+    db_path = os.path.join(base_dir, "restart.db")
+    rng = random.Random(seed)
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        create_schema(cursor)
+        cursor.executemany(
+            "INSERT INTO items (value, name) VALUES (?, ?)",
+            ((key * 100, item_name(key)) for key in range(1, key_space + 1))
+        )
+        # Commits update items by name; without an index each is a full scan
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_name ON items (name)")
+        conn.commit()
+        
+        # Cold start: every chain is built from the items table
+        start = time.perf_counter()
+        engine = SnapshotIsolationEngine(cursor)
+        loaded = engine.load_versions()
+        cold_time = time.perf_counter() - start
+        
+        locks = LockManager()
+        for n in range(held_locks):
+            resource = LockManager.path("items", rng.randint(1, key_space))
+            locks.acquire(n % 50 + 1, resource, "X" if rng.random() < 0.5 else "S")
+        
+        checkpoints = []
+        manager = CheckpointManager(os.path.join(base_dir, "checkpoints"))
+        first_id = 1
+        for batch in range(batches):
+            transactions = generate_workload(
+                num_txns=txns_per_batch, ops_per_txn=ops_per_txn, key_space=key_space,
+                read_ratio=read_ratio, first_id=first_id, seed=seed + batch
+            )
+            first_id += txns_per_batch
+            InterleavedScheduler(engine, concurrency=8).run(transactions)
+            checkpoints.append(engine.checkpoint(manager, full=batch == 0, locks=locks.export_state()))
+        
+        # Restart: map the images back in
+        start = time.perf_counter()
+        restored = SnapshotIsolationEngine.restore(cursor, manager)
+        restored_locks = LockManager()
+        restored_locks.import_state(restored.restored_locks)
+        restore_time = time.perf_counter() - start
+        
+        sample = [item_name(rng.randint(1, key_space)) for _ in range(sample_reads)]
+        start = time.perf_counter()
+        for item in sample:
+            restored.versions[item]
+        first_reads_time = time.perf_counter() - start
+        
+        mismatched = sum(
+            1 for key, timestamps, values in restored.versions.iter_chains()
+            if engine.versions[item_name(key)] != (timestamps, values)
+        )
+        chains_checked = len(engine.versions)
+        clock_matches = restored.clock == engine.clock
+        locks_match = restored_locks.export_state() == locks.export_state()
+        restored.versions.close()
+        conn.close()
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+    
+    full = [checkpoint for checkpoint in checkpoints if checkpoint["kind"] == "full"]
+    incremental = [checkpoint for checkpoint in checkpoints if checkpoint["kind"] == "incremental"]
+    return {
+        "explanation": "Time-to-ready of the snapshot-isolation engine: cold load from SQLite vs mapped checkpoint",
+        "key_space": key_space,
+        "chains_loaded": loaded,
+        "cold_start_time": cold_time,
+        "restore_time": restore_time,
+        "restore_speedup": cold_time / restore_time if restore_time > 0 else None,
+        "first_reads": sample_reads,
+        "first_reads_time": first_reads_time,
+        "checkpoints": checkpoints,
+        "full_checkpoint_bytes": sum(checkpoint["bytes"] for checkpoint in full),
+        "full_checkpoint_time": sum(checkpoint["write_time"] for checkpoint in full),
+        "incremental_checkpoint_bytes": sum(checkpoint["bytes"] for checkpoint in incremental),
+        "incremental_checkpoint_time": sum(checkpoint["write_time"] for checkpoint in incremental),
+        "chains_checked": chains_checked,
+        "chains_mismatched": mismatched,
+        "clock_matches": clock_matches,
+        "locks_match": locks_match,
+        "consistent": mismatched == 0 and clock_matches and locks_match
+    }
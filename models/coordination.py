@@ -0,0 +1,413 @@
+import gzip
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from models.responses import dumps
+
+# Coordination state lives in its own database file, so a simulation holding
+# a long write transaction on database.db never delays a rate-limit check
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS rate_buckets (
+        client_id TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS run_leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS result_runs (
+        seq INTEGER PRIMARY KEY,
+        run_id TEXT NOT NULL UNIQUE,
+        results BLOB NOT NULL
+    )
+    """
+]
+
+
+class CoordinationStore:
+    """
+    SQLite file shared by every worker process on a host.
+    
+    Each thread gets its own connection (sqlite3 connections must not be
+    shared between threads). The file runs in WAL mode with
+    synchronous=NORMAL: a check is one short write transaction, and losing
+    the last few rate-limit updates in a power failure is harmless.
+    """
+    
+    def __init__(self, db_path, busy_timeout=5.0):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.local = threading.local()
+        conn = self.connection()
+        for statement in SCHEMA:
+            conn.execute(statement)
+    
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None or getattr(self.local, "pid", None) != os.getpid():
+            # Connections are not carried over a fork
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+    
+    def transaction(self, work):
+        """Run work(conn) inside BEGIN IMMEDIATE, so it sees and writes the current state atomically."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+
+class LocalTokenBucket:
+    """
+    Per-client token buckets in process memory.
+    
+    Each worker process of a multi-worker server has its own buckets, so
+    with N workers a client gets up to N times the configured rate; kept
+    for single-process use and as the baseline of benchmark_coordination.
+    """
+    
+    def __init__(self, capacity=1, period=3.0):
+        self.capacity = capacity
+        self.rate = capacity / period  # tokens per second
+        self.buckets = {}  # client_id -> (tokens, updated_at)
+        self.lock = threading.Lock()
+    
+    def acquire(self, client_id, now=None):
+        """
+        Take one token from a client's bucket.
+        
+        Returns:
+            tuple: (allowed, seconds until a token is available).
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            tokens, updated_at = self.buckets.get(client_id, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                self.buckets[client_id] = (tokens - 1, now)
+                return True, 0.0
+            self.buckets[client_id] = (tokens, now)
+            return False, (1 - tokens) / self.rate
+
+
+class SQLiteTokenBucket:
+    """
+    Per-client token buckets in a CoordinationStore, shared by all workers.
+    
+    A bucket holds up to capacity tokens and refills at capacity / period
+    tokens per second. Refill and take happen in one immediate transaction,
+    so concurrent requests from different processes are serialized by
+    SQLite's write lock and never spend the same token twice. Buckets that
+    have refilled completely are pruned now and then; a missing row is a
+    full bucket.
+    """
+    
+    def __init__(self, store, capacity=1, period=3.0, prune_every=1000):
+        self.store = store
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.prune_every = prune_every
+        self.calls = 0
+    
+    def acquire(self, client_id, now=None):
+        """
+        Take one token from a client's bucket.
+        
+        Returns:
+            tuple: (allowed, seconds until a token is available).
+        """
+        self.calls += 1
+        prune = self.prune_every and self.calls % self.prune_every == 0
+        
+        def take(conn):
+            # Read the clock only once the write lock is held: a time taken
+            # before waiting for it could move updated_at backwards and
+            # credit the same refill twice
+            current = time.time() if now is None else now
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_buckets WHERE client_id = ?", (client_id,)
+            ).fetchone()
+            tokens, updated_at = row if row else (self.capacity, current)
+            current = max(current, updated_at)
+            tokens = min(self.capacity, tokens + (current - updated_at) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute(
+                "INSERT INTO rate_buckets (client_id, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (client_id) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (client_id, tokens, current)
+            )
+            if prune:
+                conn.execute("DELETE FROM rate_buckets WHERE updated_at < ?", (current - self.capacity / self.rate,))
+            return allowed, 0.0 if allowed else (1 - tokens) / self.rate
+        
+        return self.store.transaction(take)
+
+
+class RunLease:
+    """
+    Exclusive, expiring lease on a named resource, shared by all workers.
+    
+    A drop-in for threading.Lock where simulations must not overlap across
+    processes: acquire(blocking=False) returns whether the lease was taken
+    and release() gives it back. The lease row records the holder and an
+    expiry time, so a worker that dies while holding it blocks others for
+    at most ttl seconds. The holder token is kept per thread; a thread
+    that already holds the lease is refused like any other, as with
+    threading.Lock.
+    """
+    
+    def __init__(self, store, name, ttl=300.0, poll_interval=0.05):
+        self.store = store
+        self.name = name
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.local = threading.local()
+    
+    def _try_acquire(self):
+        holder = uuid.uuid4().hex
+        
+        def take(conn):
+            now = time.time()
+            row = conn.execute("SELECT expires_at FROM run_leases WHERE name = ?", (self.name,)).fetchone()
+            if row and row[0] > now:
+                return False
+            conn.execute(
+                "INSERT INTO run_leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at",
+                (self.name, holder, now + self.ttl)
+            )
+            return True
+        
+        if self.store.transaction(take):
+            self.local.holder = holder
+            return True
+        return False
+    
+    def acquire(self, blocking=True, timeout=-1):
+        """
+        Take the lease, polling while another worker holds it.
+        
+        Args:
+            blocking: Wait for the lease instead of returning at once
+            timeout: Seconds to wait when blocking (-1 waits forever)
+        
+        Returns:
+            bool: True if the lease was taken.
+        """
+        deadline = None if timeout < 0 else time.time() + timeout
+        while True:
+            if self._try_acquire():
+                return True
+            if not blocking or (deadline is not None and time.time() >= deadline):
+                return False
+            time.sleep(self.poll_interval)
+    
+    def release(self):
+        holder = getattr(self.local, "holder", None)
+        if holder is None:
+            raise RuntimeError(f"Lease {self.name!r} is not held by this thread")
+        self.local.holder = None
+        # Only our own lease: if it expired and was taken over, leave it alone
+        self.store.transaction(lambda conn: conn.execute(
+            "DELETE FROM run_leases WHERE name = ? AND holder = ?", (self.name, holder)
+        ))
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class SQLiteResultStore:
+    """
+    Recent simulation results in a CoordinationStore, shared by all workers.
+    
+    The drop-in for responses.ResultStore under a multi-worker server: a
+    page cursor may reach any worker, not just the one that ran the
+    simulation, so every worker must see the stored runs. Results are kept
+    as gzip-compressed JSON under a random run id, and the oldest runs
+    are deleted once max_runs is exceeded.
+    """
+    
+    def __init__(self, store, max_runs=8):
+        self.store = store
+        self.max_runs = max_runs
+    
+    def put(self, results):
+        """Store a result and return its run id."""
+        run_id = uuid.uuid4().hex
+        blob = gzip.compress(dumps(results), compresslevel=1)
+        
+        def insert(conn):
+            conn.execute("INSERT INTO result_runs (run_id, results) VALUES (?, ?)", (run_id, blob))
+            conn.execute(
+                "DELETE FROM result_runs WHERE seq NOT IN "
+                "(SELECT seq FROM result_runs ORDER BY seq DESC LIMIT ?)", (self.max_runs,)
+            )
+        
+        self.store.transaction(insert)
+        return run_id
+    
+    def get(self, run_id):
+        """Return a stored result, or None if it was evicted."""
+        row = self.store.connection().execute(
+            "SELECT results FROM result_runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        return json.loads(gzip.decompress(row[0])) if row else None
+
+
+def _bucket_worker(backend, db_path, requests, capacity, period, start_at, results):
+    """Send requests for one shared client id as fast as possible (one process)."""
+    if backend == "sqlite":
+        bucket = SQLiteTokenBucket(CoordinationStore(db_path), capacity, period)
+    else:
+        bucket = LocalTokenBucket(capacity, period)
+    while time.time() < start_at:
+        time.sleep(0.001)
+    
+    allowed = 0
+    started = time.time()
+    start = time.perf_counter()
+    for _ in range(requests):
+        allowed += bucket.acquire("client")[0]
+    results.put({"allowed": allowed, "requests": requests, "elapsed": time.perf_counter() - start,
+                 "started": started, "finished": time.time()})
+
+
+def _lease_worker(db_path, rounds, hold_time, start_at, results):
+    """Take, hold and release the run lease rounds times, recording overlapping holders."""
+    store = CoordinationStore(db_path)
+    lease = RunLease(store, "simulation", poll_interval=hold_time / 2)
+    marker = db_path + ".holder"
+    while time.time() < start_at:
+        time.sleep(0.001)
+    
+    attempts = overlaps = 0
+    lease_time = 0.0
+    for _ in range(rounds):
+        while True:
+            attempts += 1
+            start = time.perf_counter()
+            taken = lease.acquire(blocking=False)
+            lease_time += time.perf_counter() - start
+            if taken:
+                break
+            time.sleep(lease.poll_interval)
+        # O_EXCL fails if another process is inside its lease at the same time
+        try:
+            fd = os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            overlaps += 1
+        else:
+            time.sleep(hold_time)
+            os.close(fd)
+            os.remove(marker)
+        start = time.perf_counter()
+        lease.release()
+        lease_time += time.perf_counter() - start
+    results.put({"rounds": rounds, "attempts": attempts, "overlaps": overlaps, "elapsed": lease_time})
+
+
+def benchmark_coordination(process_counts=(1, 2, 4, 8), requests_per_process=2000, capacity=100,
+                           period=1.0, lease_rounds=100, lease_hold=0.001, work_dir=None):
+    """
+    Measure the per-request cost of cross-process coordination and check
+    that the shared limit holds.
+    
+    For each process count, every process hammers one client id through
+    an in-process LocalTokenBucket and then through a SQLiteTokenBucket on
+    a shared file. A correct shared limit allows at most capacity plus the
+    refill over the run, however many processes there are; per-process
+    buckets allow that much per process. Then the processes contend for a
+    RunLease until each has held it lease_rounds times for lease_hold
+    seconds, and every holder checks that nobody else is inside the lease.
+    
+    Returns:
+        dict: Per-request overhead (mean microseconds) of each backend, the
+        requests allowed against the shared limit, and lease throughput and
+        overlaps (which must be 0), per process count.
+    """
+    base_dir = tempfile.mkdtemp(dir=work_dir)
+    context = multiprocessing.get_context()
+    rows = []
+    try:
+        for processes in process_counts:
+            row = {"processes": processes}
+            for backend in ("local", "sqlite"):
+                db_path = os.path.join(base_dir, f"{backend}-{processes}.db")
+                CoordinationStore(db_path)
+                results = context.Queue()
+                start_at = time.time() + 0.5
+                workers = [
+                    context.Process(target=_bucket_worker,
+                                    args=(backend, db_path, requests_per_process, capacity, period, start_at, results))
+                    for _ in range(processes)
+                ]
+                for worker in workers:
+                    worker.start()
+                outcomes = [results.get() for _ in workers]
+                for worker in workers:
+                    worker.join()
+                
+                window = max(outcome["finished"] for outcome in outcomes) - min(outcome["started"] for outcome in outcomes)
+                total = sum(outcome["requests"] for outcome in outcomes)
+                row[f"{backend}_overhead_us"] = 1e6 * sum(outcome["elapsed"] for outcome in outcomes) / total
+                row[f"{backend}_allowed"] = sum(outcome["allowed"] for outcome in outcomes)
+                row[f"{backend}_limit"] = int(capacity + window * capacity / period)
+            
+            db_path = os.path.join(base_dir, f"lease-{processes}.db")
+            CoordinationStore(db_path)
+            results = context.Queue()
+            start_at = time.time() + 0.5
+            workers = [context.Process(target=_lease_worker, args=(db_path, lease_rounds, lease_hold, start_at, results))
+                       for _ in range(processes)]
+            for worker in workers:
+                worker.start()
+            outcomes = [results.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+            
+            # Time spent in acquire() and release() calls, not waiting or holding
+            calls = sum(outcome["attempts"] + outcome["rounds"] for outcome in outcomes)
+            row["lease_overhead_us"] = 1e6 * sum(outcome["elapsed"] for outcome in outcomes) / calls
+            row["lease_acquired"] = sum(outcome["rounds"] for outcome in outcomes)
+            row["lease_refused"] = sum(outcome["attempts"] - outcome["rounds"] for outcome in outcomes)
+            row["lease_overlaps"] = sum(outcome["overlaps"] for outcome in outcomes)
+            row["shared_limit_held"] = row["sqlite_allowed"] <= row["sqlite_limit"]
+            rows.append(row)
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+    
+    return {
+        "explanation": "Per-request cost of in-process vs SQLite-shared rate limiting and run leases across worker processes",
+        "requests_per_process": requests_per_process,
+        "capacity": capacity,
+        "period": period,
+        "rows": rows
+    }
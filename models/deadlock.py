@@ -1,13 +1,18 @@
 import sqlite3
 import networkx as nx
-import matplotlib
-# Set non-interactive backend before importing pyplot
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import os
-import base64
-from io import BytesIO
 import time
+from models.distributed_deadlock import compare_detectors
+from models.event_log import EventLog
+from models.rendering import collect_chart, render_service
+
+# Simulation steps of the deadlock detection
+LOCK_ACQUIRED = EventLog.define("Transaction T{} acquires exclusive lock on {}")
+LOCK_WAITS = EventLog.define("Transaction T{} waits for lock on {}")
+LOCK_WAITS_HELD = EventLog.define("Transaction T{} waits for lock on {} (held by T{})")
+DEADLOCK_DETECTED = EventLog.define("Deadlock detected: {} → {}", conflict=True)
+NO_DEADLOCK = EventLog.define("No deadlocks detected in the wait-for graph.")
+VICTIM_ABORTED = EventLog.define("Deadlock resolved by aborting Transaction T{} (victim selection)", abort=True)
 
 class DeadlockDetection:
     """
@@ -19,11 +24,15 @@ class DeadlockDetection:
     
     def __init__(self, db_path):
         self.db_path = db_path
-        
-    def detect_deadlocks(self):
+    
+    def detect_deadlocks(self, wait_for_chart=True):
         """
         Run a deadlock detection simulation using a wait-for graph.
         
+        Args:
+            wait_for_chart: Wait for the graph image; with False, "graph_image"
+                holds the pending render (see models.rendering.collect_chart)
+        
         Returns:
             dict: Results of the simulation including the wait-for graph and detected deadlocks.
         """
@@ -38,6 +47,9 @@ class DeadlockDetection:
             "steps": []
         }
         
+        # Steps are numbered and formatted into results["steps"] at the end
+        steps = EventLog(timestamps=False, steps=True)
+        
         # Connect to the database
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
@@ -84,7 +96,7 @@ class DeadlockDetection:
         ]
         
         # Apply locks and record the simulation steps
-        for i, lock in enumerate(lock_operations):
+        for lock in lock_operations:
             cursor.execute(
                 "INSERT INTO locks (transaction_id, resource_id, lock_type) VALUES (?, ?, ?)",
                 (lock["txn_id"], lock["resource_id"], lock["lock_type"])
@@ -95,12 +107,9 @@ class DeadlockDetection:
             cursor.execute("SELECT name FROM resources WHERE id = ?", (lock["resource_id"],))
             resource_name = cursor.fetchone()[0]
             
-            action = ""
             if lock["lock_type"] == "EXCLUSIVE":
-                action = f"Transaction T{lock['txn_id']} acquires exclusive lock on {resource_name}"
+                steps.append(LOCK_ACQUIRED, None, lock["txn_id"], resource_name, lock=lock)
             else:
-                action = f"Transaction T{lock['txn_id']} waits for lock on {resource_name}"
-                
                 # Find who holds the lock
                 cursor.execute("""
                     SELECT transaction_id FROM locks 
@@ -108,13 +117,9 @@ class DeadlockDetection:
                 """, (lock["resource_id"],))
                 holder = cursor.fetchone()
                 if holder:
-                    action += f" (held by T{holder[0]})"
-            
-            results["steps"].append({
-                "step": i + 1,
-                "action": action,
-                "lock": lock
-            })
+                    steps.append(LOCK_WAITS_HELD, None, lock["txn_id"], resource_name, holder[0], lock=lock)
+                else:
+                    steps.append(LOCK_WAITS, None, lock["txn_id"], resource_name, lock=lock)
             
             # Small delay to make the simulation more realistic
             time.sleep(0.1)
@@ -170,32 +175,18 @@ class DeadlockDetection:
                 })
                 
                 # Add a step for deadlock detection
-                results["steps"].append({
-                    "step": len(results["steps"]) + 1,
-                    "action": f"Deadlock detected: {' → '.join(cycle_with_names)} → {cycle_with_names[0]}",
-                    "is_deadlock": True
-                })
+                steps.append(DEADLOCK_DETECTED, None, " → ".join(cycle_with_names), cycle_with_names[0], is_deadlock=True)
         except nx.NetworkXNoCycle:
             # No cycles found
-            results["steps"].append({
-                "step": len(results["steps"]) + 1,
-                "action": "No deadlocks detected in the wait-for graph.",
-                "is_deadlock": False
-            })
-        
-        # Generate graph visualization
-        plt.figure(figsize=(10, 8))
-        pos = nx.spring_layout(wait_for_graph)
-        nx.draw(wait_for_graph, pos, with_labels=True, node_color='lightblue', 
-                node_size=500, arrows=True, arrowsize=20)
-        
-        # Save the graph to a base64 encoded string
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        image_data = base64.b64encode(buffer.read()).decode()
-        results["graph_image"] = image_data
-        plt.close()
+            steps.append(NO_DEADLOCK, None, is_deadlock=False)
+        
+        # Graph visualization, drawn by the render service while the victim is aborted
+        graph_image = render_service().submit({
+            "kind": "graph",
+            "nodes": list(wait_for_graph.nodes),
+            "edges": list(wait_for_graph.edges),
+            "figsize": (10, 8)
+        })
         
         # Add deadlock resolution step
         if results["deadlocks"]:
@@ -206,12 +197,31 @@ class DeadlockDetection:
             cursor.execute("DELETE FROM locks WHERE transaction_id = ?", (victim,))
             conn.commit()
             
-            results["steps"].append({
-                "step": len(results["steps"]) + 1,
-                "action": f"Deadlock resolved by aborting Transaction T{victim} (victim selection)",
-                "victim": victim
-            })
+            steps.append(VICTIM_ABORTED, None, victim, victim=victim)
+        
+        results["steps"] = steps.serialize()
         
         conn.close()
         
-        return results
\ No newline at end of file
+        results["graph_image"] = graph_image
+        return collect_chart(results, "graph_image") if wait_for_chart else results
+    
+    def detect_distributed(self, node_counts=(2, 4, 8), cycles=2, chains=4):
+        """
+        Detect deadlocks whose wait-for graph spans several nodes.
+        
+        Resources are partitioned across worker processes with their own
+        lock tables; global deadlocks are found by Chandy-Misra-Haas edge
+        chasing and, for comparison, by a centralized collector (see
+        models.distributed_deadlock).
+        
+        Args:
+            node_counts: Node counts to run; each deadlock cycle visits every node
+            cycles: Deadlock cycles per scenario
+            chains: Wait chains that are not deadlocks
+        
+        Returns:
+            dict: Deadlocks found, detection messages and latency per node
+            count and detector.
+        """
+        return compare_detectors(node_counts=node_counts, cycles=cycles, chains=chains)
@@ -0,0 +1,302 @@
+import multiprocessing
+import queue
+import random
+import time
+
+
+def build_scenario(nodes, cycles=2, cycle_length=None, chains=4, chain_length=3, seed=42):
+    """
+    Build a lock scenario whose wait-for graph spans several nodes.
+    
+    Every transaction first locks one resource of its own, then requests a
+    resource held by another transaction. Deadlock cycles put consecutive
+    members on different home nodes, so no single node sees a whole cycle;
+    chains end at a transaction that does not wait, so they are not
+    deadlocks. Resources are owned by node resource % nodes and placed at
+    random, so most lock requests cross nodes.
+    
+    Returns:
+        dict: transactions ({id, home, holds, wants}), the expected cycles
+        and the number of nodes.
+    """
+    rng = random.Random(seed)
+    cycle_length = cycle_length or nodes
+    transactions = []
+    expected = []
+    
+    def add(home):
+        txn = {"id": len(transactions) + 1, "home": home,
+               "holds": len(transactions) * nodes + rng.randrange(nodes), "wants": None}
+        transactions.append(txn)
+        return txn
+    
+    for c in range(cycles):
+        members = [add((c + k) % nodes) for k in range(cycle_length)]
+        for txn, holder in zip(members, members[1:] + members[:1]):
+            txn["wants"] = holder["holds"]
+        expected.append([txn["id"] for txn in members])
+    
+    for c in range(chains):
+        members = [add(rng.randrange(nodes)) for _ in range(chain_length)]
+        for txn, holder in zip(members, members[1:]):
+            txn["wants"] = holder["holds"]
+    
+    return {"nodes": nodes, "transactions": transactions, "cycles": expected}
+
+
+def run_node(node_id, nodes, inboxes, results, homes, mode):
+    """
+    Event loop of one node (runs in its own process).
+    
+    The node owns the lock table of resources r with r % nodes == node_id
+    (exclusive locks, FIFO wait queues) and is the home site of some
+    transactions: it sends their lock requests to the owning nodes and
+    keeps their wait-for edges. In "probe" mode a transaction that blocks
+    starts a Chandy-Misra-Haas probe (initiator, sender, receiver) along its
+    edges; the home site of a blocked receiver forwards the probe along the
+    receiver's own edges, once per initiator, and a probe that comes back
+    to its initiator proves a deadlock. In "central" mode each new edge is
+    sent to the coordinator instead, which keeps the global graph.
+    
+    Messages are tuples; the node stops on ("stop",) and answers with its
+    counters.
+    """
+    inbox = inboxes[node_id]
+    owners = {}  # resource -> holder
+    waiting = {}  # resource -> [waiting txn ids], FIFO
+    edges = {}  # blocked home txn -> ids of the txns it waits for
+    forwarded = {}  # blocked home txn -> initiators whose probe was forwarded
+    blocked_at = {}
+    detected = []
+    counters = {"messages": 0, "probes": 0, "probe_messages": 0, "edge_messages": 0}
+    
+    def send(node, message):
+        counters["messages"] += 1
+        inboxes[node].put(message)
+    
+    def probe(initiator, sender, receiver):
+        counters["probes"] += 1
+        if homes[receiver] == node_id:
+            handle(("probe", initiator, sender, receiver))
+        else:
+            counters["probe_messages"] += 1
+            send(homes[receiver], ("probe", initiator, sender, receiver))
+    
+    def handle(message):
+        kind = message[0]
+        if kind in ("acquire", "request"):
+            # From the coordinator: lock a resource on behalf of a home txn
+            _, txn_id, resource = message
+            send(resource % nodes, ("lock", txn_id, resource, kind))
+        
+        elif kind == "lock":
+            _, txn_id, resource, phase = message
+            holder = owners.get(resource)
+            if holder is None:
+                owners[resource] = txn_id
+                send(homes[txn_id], ("granted", txn_id, resource, phase))
+            else:
+                queue_ = waiting.setdefault(resource, [])
+                send(homes[txn_id], ("blocked", txn_id, resource, [holder] + queue_))
+                queue_.append(txn_id)
+        
+        elif kind == "granted":
+            _, txn_id, resource, phase = message
+            results.put(("granted", txn_id, phase))
+        
+        elif kind == "blocked":
+            _, txn_id, resource, holders = message
+            edges[txn_id] = holders
+            blocked_at[txn_id] = time.time()
+            if mode == "probe":
+                for holder in holders:
+                    probe(txn_id, txn_id, holder)
+            else:
+                counters["edge_messages"] += 1
+                results.put(("edges", txn_id, holders, blocked_at[txn_id]))
+        
+        elif kind == "probe":
+            _, initiator, sender, receiver = message
+            if receiver not in edges:
+                return  # receiver is running, so this path ends here
+            if receiver == initiator:
+                detected.append({"initiator": initiator, "detected_at": time.time()})
+                results.put(("deadlock", initiator, time.time()))
+                return
+            seen = forwarded.setdefault(receiver, set())
+            if initiator not in seen:
+                seen.add(initiator)
+                for holder in edges[receiver]:
+                    probe(initiator, receiver, holder)
+    
+    while True:
+        message = inbox.get()
+        if message[0] == "stop":
+            results.put(("stats", node_id, dict(counters, blocked_at=blocked_at, detected=detected)))
+            return
+        handle(message)
+
+
+class CentralCollector:
+    """
+    Global wait-for graph kept by the coordinator in "central" mode.
+    
+    Nodes report every edge as it forms; each report triggers a
+    depth-first search from the newly blocked transaction, so a cycle is
+    found as soon as its last edge arrives.
+    """
+    
+    def __init__(self):
+        self.graph = {}
+        self.detected = []
+    
+    def add_edges(self, txn_id, holders):
+        self.graph[txn_id] = holders
+        cycle = self._find_cycle(txn_id)
+        if cycle:
+            self.detected.append({"initiator": txn_id, "cycle": cycle, "detected_at": time.time()})
+        return cycle
+    
+    def _find_cycle(self, start):
+        stack = [(start, [start])]
+        seen = set()
+        while stack:
+            node, path = stack.pop()
+            for nxt in self.graph.get(node, []):
+                if nxt == start:
+                    return path
+                if nxt not in seen:
+                    seen.add(nxt)
+                    stack.append((nxt, path + [nxt]))
+        return None
+
+
+def run_distributed_detection(scenario, mode="probe", timeout=10.0):
+    """
+    Play a scenario on one worker process per node and detect its deadlocks.
+    
+    All transactions first acquire the resource they hold; once every
+    grant is back, each requests the resource it wants, which builds the
+    scenario's wait-for graph across the nodes.
+    
+    Args:
+        scenario: Output of build_scenario
+        mode: "probe" (Chandy-Misra-Haas edge chasing) or "central"
+            (edges reported to a collector in the coordinator)
+        timeout: Seconds to wait for all expected deadlocks
+    
+    Returns:
+        dict: Deadlocks found, message counts and detection latency.
+    """
+    nodes = scenario["nodes"]
+    transactions = scenario["transactions"]
+    homes = {txn["id"]: txn["home"] for txn in transactions}
+    context = multiprocessing.get_context()
+    inboxes = [context.Queue() for _ in range(nodes)]
+    results = context.Queue()
+    workers = [
+        context.Process(target=run_node, args=(node_id, nodes, inboxes, results, homes, mode), daemon=True)
+        for node_id in range(nodes)
+    ]
+    for worker in workers:
+        worker.start()
+    
+    collector = CentralCollector()
+    found = set()
+    expected = len(scenario["cycles"])
+    cycles_found = lambda: sum(1 for cycle in scenario["cycles"] if found & set(cycle))
+    deadline = time.time() + timeout
+    
+    def drain(until):
+        # Handle coordinator messages until the predicate holds or time runs out
+        while not until() and time.time() < deadline:
+            try:
+                message = results.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                break
+            if message[0] == "granted":
+                granted.add(message[1])
+            elif message[0] == "deadlock":
+                found.add(message[1])
+            elif message[0] == "edges":
+                if collector.add_edges(message[1], message[2]):
+                    found.add(message[1])
+    
+    try:
+        granted = set()
+        for txn in transactions:
+            inboxes[txn["home"]].put(("acquire", txn["id"], txn["holds"]))
+        drain(lambda: len(granted) == len(transactions))
+        
+        start = time.time()
+        for txn in transactions:
+            if txn["wants"] is not None:
+                inboxes[txn["home"]].put(("request", txn["id"], txn["wants"]))
+        drain(lambda: cycles_found() >= expected)
+        elapsed = time.time() - start
+    finally:
+        for inbox in inboxes:
+            inbox.put(("stop",))
+        stats = {}
+        while len(stats) < nodes:
+            try:
+                message = results.get(timeout=5)
+            except queue.Empty:
+                break
+            if message[0] == "stats":
+                stats[message[1]] = message[2]
+        for worker in workers:
+            worker.join(timeout=5)
+    
+    blocked_at = {}
+    for node_stats in stats.values():
+        blocked_at.update(node_stats["blocked_at"])
+    if mode == "probe":
+        detections = [entry for node_stats in stats.values() for entry in node_stats["detected"]]
+    else:
+        detections = collector.detected
+    
+    # Latency: from the last edge of a cycle forming to its detection
+    latencies = []
+    for cycle in scenario["cycles"]:
+        hits = [entry["detected_at"] for entry in detections if entry["initiator"] in cycle]
+        formed = [blocked_at[txn_id] for txn_id in cycle if txn_id in blocked_at]
+        if hits and len(formed) == len(cycle):
+            latencies.append(max(0.0, min(hits) - max(formed)))
+    
+    counter = lambda key: sum(node_stats[key] for node_stats in stats.values())
+    return {
+        "mode": mode,
+        "nodes": nodes,
+        "transactions": len(transactions),
+        "expected_deadlocks": expected,
+        "deadlocks_found": cycles_found(),
+        "false_positives": len(found - {txn_id for cycle in scenario["cycles"] for txn_id in cycle}),
+        "messages": counter("messages"),
+        "probes": counter("probes"),
+        "probe_messages": counter("probe_messages"),
+        "edge_messages": counter("edge_messages"),
+        "detection_messages": counter("probe_messages") + counter("edge_messages"),
+        "detection_latency_mean": sum(latencies) / len(latencies) if latencies else None,
+        "detection_latency_max": max(latencies) if latencies else None,
+        "elapsed": elapsed
+    }
+
+
+def compare_detectors(node_counts=(2, 4, 8), cycles=2, chains=4, seed=42):
+    """
+    Run edge chasing and the centralized collector on the same scenarios
+    for growing node counts (each cycle visits every node).
+    
+    Returns:
+        dict: One row per node count and mode.
+    """
+    rows = []
+    for nodes in node_counts:
+        scenario = build_scenario(nodes, cycles=cycles, chains=chains, seed=seed)
+        for mode in ("probe", "central"):
+            rows.append(run_distributed_detection(scenario, mode))
+    return {
+        "explanation": "Chandy-Misra-Haas edge chasing vs a centralized wait-for graph collector",
+        "rows": rows
+    }
@@ -0,0 +1,117 @@
+import array
+import datetime
+import time
+
+
+class EventType:
+    """An event kind: its action template and the flags it carries."""
+    
+    __slots__ = ("code", "template", "flags")
+    
+    def __init__(self, code, template, flags):
+        self.code = code
+        self.template = template
+        self.flags = flags
+
+
+class EventLog:
+    """
+    Compact, append-only timeline shared by the simulations.
+    
+    Events are stored column-wise: typed arrays hold each event's
+    timestamp, integer event code and transaction id, and a list holds the
+    values its action template is filled with. Payloads such as "data" are
+    kept in a sparse dict, only for the events that have one. The English
+    action string is rendered from the event type's template only when the
+    log is serialized.
+    
+    Event types are defined once, at import time, with EventLog.define().
+    A type can carry the flags "conflict", "abort" and "commit"; counters
+    per flag are kept while events are appended, so counting conflicts or
+    aborts never requires scanning the log.
+    """
+    
+    FLAGS = ("conflict", "abort", "commit")
+    
+    # Registry of event types, indexed by code
+    _types = []
+    
+    # Transaction id stored for events that don't belong to a transaction
+    NO_TXN = -1
+    
+    @classmethod
+    def define(cls, template, conflict=False, abort=False, commit=False):
+        """
+        Register an event type.
+        
+        Args:
+            template: str.format template of the action, with positional
+                fields filled from the arguments given to append()
+            conflict, abort, commit: Flags counted for and serialized with
+                every event of this type
+        
+        Returns:
+            int: Event code to pass to append().
+        """
+        flags = tuple(flag for flag, value in zip(cls.FLAGS, (conflict, abort, commit)) if value)
+        event_type = EventType(len(cls._types), template, flags)
+        cls._types.append(event_type)
+        return event_type.code
+    
+    def __init__(self, timestamps=True, steps=False):
+        # Serialize a "time" field, and/or a 1-based "step" field
+        self.timestamps = timestamps
+        self.steps = steps
+        self.times = array.array("d")
+        self.codes = array.array("H")
+        self.txn_ids = array.array("q")
+        self.args = []
+        self.extras = {}  # event index -> extra fields (data, error, ...)
+        self.counters = dict.fromkeys(self.FLAGS, 0)
+    
+    def append(self, code, txn_id=None, *args, **extra):
+        """
+        Record an event.
+        
+        Args:
+            code: Event code returned by define()
+            txn_id: Transaction the event belongs to, if any
+            *args: Values for the template's fields
+            **extra: Extra fields serialized with the event (e.g. data)
+        """
+        if extra:
+            self.extras[len(self.codes)] = extra
+        self.times.append(time.time())
+        self.codes.append(code)
+        self.txn_ids.append(self.NO_TXN if txn_id is None else txn_id)
+        self.args.append(args)
+        for flag in self._types[code].flags:
+            self.counters[flag] += 1
+    
+    def count(self, flag):
+        """Number of events carrying a flag."""
+        return self.counters[flag]
+    
+    def __len__(self):
+        return len(self.codes)
+    
+    def __iter__(self):
+        """Yield events as timeline dicts, formatting them on the way."""
+        for index in range(len(self.codes)):
+            event_type = self._types[self.codes[index]]
+            event = {}
+            if self.steps:
+                event["step"] = index + 1
+            if self.timestamps:
+                event["time"] = datetime.datetime.fromtimestamp(self.times[index]).isoformat()
+            event["action"] = event_type.template.format(*self.args[index])
+            if self.txn_ids[index] != self.NO_TXN:
+                event["txn_id"] = self.txn_ids[index]
+            for flag in event_type.flags:
+                event[flag] = True
+            event.update(self.extras.get(index, ()))
+            yield event
+    
+    def serialize(self):
+        """Render the whole log as a list of timeline dicts."""
+        return list(self)
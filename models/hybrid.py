@@ -0,0 +1,279 @@
+import time
+from models.event_log import EventLog
+from models.histogram import LatencyHistogram
+from models.lock_manager import LockManager
+from models.scheduler import ProtocolEngine
+from models.workload import written_value
+
+# Timeline events of the hybrid engine
+HYBRID_READ = EventLog.define("{} - Read {} = {} ({})")
+HYBRID_WRITE = EventLog.define("{} - Buffer write {} = {} (changed by {}, {})")
+HYBRID_LOCK_WAIT = EventLog.define("{} - Waiting for {} lock on {} ({} held by T{})", conflict=True)
+HYBRID_LOCK_MEMORY_EXHAUSTED = EventLog.define("{} - No lock memory for {} lock on {}: aborting", conflict=True)
+HYBRID_VALIDATION_CONFLICT = EventLog.define("{} - Validation conflict: {} changed since read", conflict=True)
+HYBRID_INSTALLED = EventLog.define("{} - Validated {} optimistic reads, installed {} writes")
+KEY_SWITCHED = EventLog.define("{} - {} switched to {} (conflict rate {:.2f}, abort rate {:.2f})")
+
+OPTIMISTIC = "optimistic"
+LOCKED = "locked"
+
+
+class KeyContention:
+    """
+    Contention statistics of one key over a decaying window.
+    
+    Accesses, conflicts (lock waits and failed validations) and aborts of
+    transactions that used the key are exponentially decayed counters: an
+    event that happened half_life finished transactions ago weighs half
+    as much as a new one, so the rates follow the recent workload.
+    """
+    
+    __slots__ = ("accesses", "conflicts", "aborts", "updated", "mode")
+    
+    def __init__(self, now):
+        self.accesses = 0.0
+        self.conflicts = 0.0
+        self.aborts = 0.0
+        self.updated = now
+        self.mode = OPTIMISTIC
+    
+    def decay(self, now, half_life):
+        if now != self.updated:
+            factor = 0.5 ** ((now - self.updated) / half_life)
+            self.accesses *= factor
+            self.conflicts *= factor
+            self.aborts *= factor
+            self.updated = now
+    
+    def rates(self):
+        """(conflict rate, abort rate) per access."""
+        if not self.accesses:
+            return 0.0, 0.0
+        return self.conflicts / self.accesses, self.aborts / self.accesses
+
+
+class HybridEngine(ProtocolEngine):
+    """
+    Concurrency control that picks locking or validation per key.
+    
+    Every key starts optimistic: reads remember the key's committed
+    version counter and writes are buffered, as in OptimisticEngine. The
+    engine keeps KeyContention statistics online, and a key whose
+    conflict or abort rate reaches hot_threshold (once it has seen
+    min_accesses decayed accesses) switches to locking: operations on it
+    take a lock when they happen (X if the transaction writes the key,
+    else S) and conflicting requests wait as in 2PL instead of failing
+    validation at commit. A locked key whose
+    rates fall below cool_threshold switches back; the gap between the
+    thresholds keeps keys from flapping. Every switch is logged on the
+    timeline.
+    
+    The two modes stay serializable together because commit takes an X
+    lock on every written key, whatever its mode, before validating the
+    optimistic reads and installing the writes in one step: a write can
+    never be installed under a reader's S lock, and reads made without a
+    lock are validated. All locks are held until commit or abort, and
+    deadlocks among waiting transactions are broken by the scheduler.
+    """
+    
+    name = "Hybrid"
+    
+    def __init__(self, cursor, hot_threshold=0.2, cool_threshold=0.05, half_life=20, min_accesses=2.0):
+        super().__init__(cursor)
+        self.hot_threshold = hot_threshold
+        self.cool_threshold = cool_threshold
+        self.half_life = half_life
+        self.min_accesses = min_accesses
+        self.lock_manager = LockManager()
+        self.keys = {}  # item -> KeyContention
+        self.finished = 0  # transactions committed or aborted: the decay clock
+        self.versions = {}  # item -> committed version counter
+        self.read_sets = {}  # txn_id -> {item: version seen}, optimistic reads only
+        self.write_sets = {}  # txn_id -> {item: new value}
+        self.accessed = {}  # txn_id -> items used
+        self.write_keys = {}  # txn_id -> items the transaction will write
+        self.waiting_for = {}  # txn_id -> {holder}
+        self.doomed = set()  # txns that failed validation
+        self.lock_waits = 0
+        self.validations = 0
+        self.validation_failures = 0
+        self.mode_switches = 0
+        self.switches = []  # (item, new mode), in order
+        self.locked_ops = 0
+        self.optimistic_ops = 0
+        self.latency["validation"] = LatencyHistogram()
+    
+    def _stats(self, item):
+        stats = self.keys.get(item)
+        if stats is None:
+            stats = self.keys[item] = KeyContention(self.finished)
+        else:
+            stats.decay(self.finished, self.half_life)
+        return stats
+    
+    def _observe(self, txn, item, accesses=0, conflicts=0, aborts=0):
+        """Update a key's statistics and switch its mode if a threshold is crossed."""
+        stats = self._stats(item)
+        stats.accesses += accesses
+        stats.conflicts += conflicts
+        stats.aborts += aborts
+        if stats.accesses < self.min_accesses:
+            return
+        
+        conflict_rate, abort_rate = stats.rates()
+        rate = max(conflict_rate, abort_rate)
+        if stats.mode == OPTIMISTIC and rate >= self.hot_threshold:
+            stats.mode = LOCKED
+        elif stats.mode == LOCKED and rate < self.cool_threshold:
+            stats.mode = OPTIMISTIC
+        else:
+            return
+        self.mode_switches += 1
+        self.switches.append((item, stats.mode))
+        self.log(txn, KEY_SWITCHED, item, f"{stats.mode} mode", conflict_rate, abort_rate,
+                 data={"item": item, "mode": stats.mode, "conflict_rate": conflict_rate, "abort_rate": abort_rate})
+    
+    def mode(self, item):
+        stats = self.keys.get(item)
+        return stats.mode if stats is not None else OPTIMISTIC
+    
+    def _lock(self, txn, item, mode):
+        """Request a lock on a locked-mode key, returning "ok", "wait" or "abort"."""
+        grant = self.lock_manager.acquire(txn["id"], LockManager.path("items", item), mode)
+        if grant["granted"]:
+            self.waiting_for.pop(txn["id"], None)
+            return "ok"
+        
+        holder = grant["conflict"]["holder"]
+        if holder is None:
+            # Out of lock memory: nothing to wait for, so abort (no-wait)
+            self.waiting_for.pop(txn["id"], None)
+            self.log(txn, HYBRID_LOCK_MEMORY_EXHAUSTED, mode, item)
+            return "abort"
+        
+        if self.waiting_for.get(txn["id"]) != {holder}:
+            # A new wait, not a retry of the same one
+            self.lock_waits += 1
+            self._observe(txn, item, conflicts=1)
+            self.log(txn, HYBRID_LOCK_WAIT, mode, item, grant["conflict"]["mode"], holder)
+        self.waiting_for[txn["id"]] = {holder}
+        return "wait"
+    
+    def begin(self, txn):
+        # Keys the transaction will write: a locked read of one takes X at
+        # once (like SELECT ... FOR UPDATE), since S-to-X upgrades on hot
+        # keys are what deadlocks 2PL
+        self.write_keys[txn["id"]] = {op["item"] for op in txn["ops"] if op["type"] == "write"}
+        self.read_sets[txn["id"]] = {}
+        self.write_sets[txn["id"]] = {}
+        self.accessed[txn["id"]] = set()
+        return "ok"
+    
+    def execute(self, txn, op):
+        item = op["item"]
+        locked = self.mode(item) == LOCKED
+        lock_mode = "X" if op["type"] == "write" or item in self.write_keys[txn["id"]] else "S"
+        if locked:
+            status = self._lock(txn, item, lock_mode)
+            if status != "ok":
+                return status
+        
+        if item not in self.accessed[txn["id"]]:
+            self.accessed[txn["id"]].add(item)
+            self._observe(txn, item, accesses=1)
+        
+        write_set = self.write_sets[txn["id"]]
+        if item in write_set:
+            value = write_set[item]
+        else:
+            self.cursor.execute("SELECT value FROM items WHERE name = ?", (item,))
+            value = self.cursor.fetchone()[0]
+            if not locked:
+                self.read_sets[txn["id"]].setdefault(item, self.versions.get(item, 0))
+        
+        if locked:
+            self.locked_ops += 1
+            how = "locked"
+        else:
+            self.optimistic_ops += 1
+            how = f"optimistic, version {self.versions.get(item, 0)}"
+        
+        if op["type"] == "read":
+            self.log(txn, HYBRID_READ, item, value, how, data={"item": item, "value": value, "mode": how})
+            return "ok"
+        
+        new_value = written_value(op, value)
+        write_set[item] = new_value
+        self.log(txn, HYBRID_WRITE, item, new_value, new_value - value, how,
+                 data={"item": item, "old_value": value, "new_value": new_value, "mode": how})
+        return "ok"
+    
+    def commit(self, txn):
+        write_set = self.write_sets[txn["id"]]
+        
+        # Writers of any mode hold X locks while installing
+        for item in write_set:
+            status = self._lock(txn, item, "X")
+            if status != "ok":
+                return status
+        
+        start = time.perf_counter()
+        read_set = self.read_sets[txn["id"]]
+        stale = [item for item, version in read_set.items() if self.versions.get(item, 0) != version]
+        self.latency["validation"].record(time.perf_counter() - start)
+        self.validations += 1
+        
+        if stale:
+            self.validation_failures += 1
+            self.doomed.add(txn["id"])
+            for item in stale:
+                self._observe(txn, item, conflicts=1)
+            self.log(txn, HYBRID_VALIDATION_CONFLICT, ", ".join(stale))
+            return "abort"
+        
+        if write_set:
+            self.cursor.executemany(
+                "UPDATE items SET value = ? WHERE name = ?",
+                [(value, item) for item, value in write_set.items()]
+            )
+            for item in write_set:
+                self.versions[item] = self.versions.get(item, 0) + 1
+            self.persist()
+        
+        self.log(txn, HYBRID_INSTALLED, len(read_set), len(write_set))
+        self._finish(txn["id"])
+        return "ok"
+    
+    def abort(self, txn):
+        # Failed validation or chosen as a deadlock victim (not an application
+        # rollback): count it against every key the transaction used
+        if txn["id"] in self.doomed or txn["id"] in self.waiting_for:
+            for item in sorted(self.accessed.get(txn["id"], ())):
+                self._observe(txn, item, aborts=1)
+        self._finish(txn["id"])
+        return []
+    
+    def _finish(self, txn_id):
+        # Nothing reached the database before commit, so dropping private state is enough
+        self.lock_manager.release_all(txn_id)
+        self.read_sets.pop(txn_id, None)
+        self.write_sets.pop(txn_id, None)
+        self.accessed.pop(txn_id, None)
+        self.write_keys.pop(txn_id, None)
+        self.waiting_for.pop(txn_id, None)
+        self.doomed.discard(txn_id)
+        self.finished += 1
+    
+    def blockers(self, txn):
+        return self.waiting_for.get(txn["id"], set())
+    
+    def stats(self):
+        return {
+            "lock_waits": self.lock_waits,
+            "validations": self.validations,
+            "validation_failures": self.validation_failures,
+            "mode_switches": self.mode_switches,
+            "locked_keys": sorted(item for item, stats in self.keys.items() if stats.mode == LOCKED),
+            "locked_ops": self.locked_ops,
+            "optimistic_ops": self.optimistic_ops
+        }
@@ -0,0 +1,296 @@
+class LockManager:
+    """
+    Multi-granularity lock table for the 2PL simulations.
+    
+    Resources form a hierarchy: database -> table (items, accounts) -> row.
+    Before locking a node, a transaction takes intention locks on all of its
+    ancestors, so a coarse lock on a table can be checked against row locks
+    held by other transactions without scanning the rows:
+    
+    - IS / IX: intention to lock descendants in S / X mode
+    - S / X: shared / exclusive lock on the node and all its descendants
+    - SIX: S on the whole subtree plus the intention to X-lock some rows
+      (the usual mode for "scan a table and update a few rows")
+    
+    Locks are granted under a no-wait policy: a request that is incompatible
+    with another transaction's lock is refused and the caller decides how to
+    react (the simulations abort the requester).
+    
+    Lock escalation keeps the table bounded: once a transaction holds more
+    than escalation_threshold row locks on one table, or the table grows past
+    the memory budget, the transaction's row locks on that table are replaced
+    by a single S or X table lock.
+    """
+    
+    ROOT = "database"
+    
+    # Compatibility matrix: requested mode -> modes it can coexist with
+    COMPATIBLE = {
+        "IS": {"IS", "IX", "S", "SIX"},
+        "IX": {"IS", "IX"},
+        "S": {"IS", "S"},
+        "SIX": {"IS"},
+        "X": set()
+    }
+    
+    # Intention mode required on every ancestor of a node locked in a mode
+    INTENTION = {"IS": "IS", "IX": "IX", "S": "IS", "SIX": "IX", "X": "IX"}
+    
+    # Modes held on an ancestor that already cover a request on a descendant
+    COVERS = {
+        "IS": {"S", "SIX", "X"},
+        "IX": {"X"},
+        "S": {"S", "SIX", "X"},
+        "SIX": {"X"},
+        "X": {"X"}
+    }
+    
+    # Strength order used to combine a held mode with a requested one
+    _RANK = {"IS": 0, "IX": 1, "S": 1, "SIX": 2, "X": 3}
+    
+    # Estimated footprint of one lock-table entry (key, holder slot, mode)
+    ENTRY_BYTES = 128
+    
+    def __init__(self, escalation_threshold=None, memory_budget=None):
+        self.table = {}  # resource path -> {txn_id: mode}
+        self.txn_locks = {}  # txn_id -> resource paths in acquisition order
+        self.row_counts = {}  # (txn_id, table path) -> row locks held
+        self.escalated = set()  # (txn_id, table path) replaced by a table lock
+        self.escalation_retry = {}  # (txn_id, table path) -> row count of next attempt
+        self.escalation_threshold = escalation_threshold
+        # Global lock-memory budget in bytes, enforced as a cap on entries
+        self.max_entries = memory_budget // self.ENTRY_BYTES if memory_budget else None
+        self.entries = 0
+        self.lock_calls = 0
+        self.peak_entries = 0
+        self.escalations = []
+        self.escalation_failures = 0
+        self.escalation_conflicts = 0
+    
+    @classmethod
+    def combine(cls, held, requested):
+        """Return the weakest mode at least as strong as both modes."""
+        if {held, requested} == {"IX", "S"}:
+            return "SIX"
+        return held if cls._RANK[held] >= cls._RANK[requested] else requested
+    
+    @classmethod
+    def path(cls, table, row=None):
+        """Build the resource path for a table or a row within it."""
+        if row is None:
+            return (cls.ROOT, table)
+        return (cls.ROOT, table, row)
+    
+    def held_mode(self, txn_id, resource):
+        """Return the mode a transaction holds on a resource, or None."""
+        return self.table.get(resource, {}).get(txn_id)
+    
+    def is_covered(self, txn_id, resource, mode):
+        """Check whether a lock held on an ancestor already implies this request."""
+        for depth in range(1, len(resource)):
+            if self.held_mode(txn_id, resource[:depth]) in self.COVERS[mode]:
+                return True
+        return False
+    
+    def acquire(self, txn_id, resource, mode):
+        """
+        Lock a resource, taking intention locks on its ancestors first.
+        
+        If the request is refused, intention locks granted on the way down
+        stay held until the transaction calls release_all().
+        
+        Args:
+            txn_id: Requesting transaction
+            resource: Resource path, e.g. ("database", "items", "Item 1")
+            mode: One of IS, IX, S, SIX, X
+        
+        Returns:
+            dict: {"granted": bool, "calls": int, "covered": bool,
+                   "conflict": {...} or None, "escalation": {...} or None}
+        """
+        if self.is_covered(txn_id, resource, mode):
+            return {"granted": True, "calls": 0, "covered": True, "conflict": None, "escalation": None}
+        
+        escalation = None
+        is_new_row = len(resource) == 3 and self.held_mode(txn_id, resource) is None
+        if is_new_row and self.max_entries is not None and self.entries >= self.max_entries:
+            # Out of lock memory: trade this transaction's row locks for a table lock
+            escalation = self.escalate(txn_id, resource[:2], mode, reason="memory")
+            if escalation is None:
+                return {
+                    "granted": False, "calls": 0, "covered": False, "escalation": None,
+                    "conflict": {"resource": resource, "holder": None, "mode": None,
+                                 "requested": mode, "reason": "lock memory exhausted"}
+                }
+            return {"granted": True, "calls": 0, "covered": True, "conflict": None, "escalation": escalation}
+        
+        # Intention locks top-down, then the requested mode on the node itself
+        plan = [(resource[:depth], self.INTENTION[mode]) for depth in range(1, len(resource))]
+        plan.append((resource, mode))
+        
+        calls = 0
+        for node, node_mode in plan:
+            calls += 1
+            self.lock_calls += 1
+            conflict = self._lock_node(txn_id, node, node_mode)
+            if conflict:
+                if (conflict["holder"], node) in self.escalated:
+                    self.escalation_conflicts += 1
+                    conflict["escalated"] = True
+                return {"granted": False, "calls": calls, "covered": False, "conflict": conflict, "escalation": None}
+        
+        if is_new_row and self.escalation_threshold is not None:
+            key = (txn_id, resource[:2])
+            if self.row_counts.get(key, 0) >= self.escalation_retry.get(key, self.escalation_threshold + 1):
+                escalation = self.escalate(txn_id, resource[:2], mode, reason="threshold")
+                if escalation is None:
+                    # Refused: try again after another threshold's worth of row locks
+                    self.escalation_retry[key] = self.row_counts[key] + self.escalation_threshold
+        
+        return {"granted": True, "calls": calls, "covered": False, "conflict": None, "escalation": escalation}
+    
+    def escalate(self, txn_id, table, mode="S", reason="threshold"):
+        """
+        Replace a transaction's row locks on a table with one table lock.
+        
+        The table lock is X if any of the row locks (or the pending request)
+        is X, otherwise S. Like any other lock, it is taken only after the
+        matching intention lock on every ancestor (taken or upgraded here,
+        since the memory-budget path escalates before the request's own
+        intention locks). If another transaction's lock on an ancestor or
+        on the table is incompatible, escalation fails and the row locks
+        are kept.
+        
+        Returns:
+            dict: Escalation event, or None if escalation was refused.
+        """
+        rows = [
+            resource for resource in self.txn_locks.get(txn_id, {})
+            if len(resource) == 3 and resource[:2] == table
+        ]
+        modes = {self.held_mode(txn_id, resource) for resource in rows} | {mode}
+        table_mode = "X" if "X" in modes else "S"
+        
+        plan = [(table[:depth], self.INTENTION[table_mode]) for depth in range(1, len(table))]
+        plan.append((table, table_mode))
+        for node, node_mode in plan:
+            self.lock_calls += 1
+            if self._lock_node(txn_id, node, node_mode):
+                self.escalation_failures += 1
+                return None
+        
+        for resource in rows:
+            self.release(txn_id, resource)
+        self.escalated.add((txn_id, table))
+        
+        event = {
+            "txn_id": txn_id,
+            "table": table[-1],
+            "mode": self.held_mode(txn_id, table),
+            "rows_released": len(rows),
+            "reason": reason
+        }
+        self.escalations.append(event)
+        return event
+    
+    def _lock_node(self, txn_id, node, mode):
+        """Grant a single node lock, returning conflict details when refused."""
+        holders = self.table.get(node, {})
+        held = holders.get(txn_id)
+        wanted = mode if held is None else self.combine(held, mode)
+        
+        if held == wanted:
+            return None
+        
+        for other_txn, other_mode in holders.items():
+            if other_txn != txn_id and other_mode not in self.COMPATIBLE[wanted]:
+                return {"resource": node, "holder": other_txn, "mode": other_mode, "requested": wanted}
+        
+        self.table.setdefault(node, {})[txn_id] = wanted
+        if held is None:
+            self.txn_locks.setdefault(txn_id, {})[node] = None
+            self.entries += 1
+            self.peak_entries = max(self.peak_entries, self.entries)
+            if len(node) == 3:
+                key = (txn_id, node[:2])
+                self.row_counts[key] = self.row_counts.get(key, 0) + 1
+        return None
+    
+    def release(self, txn_id, resource):
+        """Release one lock held by a transaction."""
+        holders = self.table.get(resource)
+        if not holders or txn_id not in holders:
+            return False
+        del holders[txn_id]
+        if not holders:
+            del self.table[resource]
+        del self.txn_locks[txn_id][resource]
+        self.entries -= 1
+        if len(resource) == 3:
+            self.row_counts[(txn_id, resource[:2])] -= 1
+        return True
+    
+    def release_all(self, txn_id):
+        """
+        Release every lock held by a transaction, leaves before ancestors.
+        
+        Returns:
+            list: Released resource paths, in release order.
+        """
+        released = []
+        for resource in sorted(self.txn_locks.get(txn_id, {}), key=len, reverse=True):
+            self.release(txn_id, resource)
+            released.append(resource)
+        self.txn_locks.pop(txn_id, None)
+        for key in [key for key in self.row_counts if key[0] == txn_id]:
+            del self.row_counts[key]
+            self.escalation_retry.pop(key, None)
+        self.escalated = {key for key in self.escalated if key[0] != txn_id}
+        return released
+    
+    def export_state(self):
+        """
+        Lock table as plain data, for checkpoints.
+        
+        Returns:
+            dict: Held locks per transaction (resource paths as lists, in
+            acquisition order) and escalated tables.
+        """
+        return {
+            "locks": [
+                [txn_id, [[list(resource), self.table[resource][txn_id]] for resource in resources]]
+                for txn_id, resources in self.txn_locks.items()
+            ],
+            "escalated": [[txn_id, list(table)] for txn_id, table in self.escalated]
+        }
+    
+    def import_state(self, state):
+        """Replace the lock table with one produced by export_state()."""
+        self.table = {}
+        self.txn_locks = {}
+        self.row_counts = {}
+        self.entries = 0
+        for txn_id, held in state["locks"]:
+            for resource, mode in held:
+                resource = tuple(resource)
+                self.table.setdefault(resource, {})[txn_id] = mode
+                self.txn_locks.setdefault(txn_id, {})[resource] = None
+                self.entries += 1
+                if len(resource) == 3:
+                    key = (txn_id, resource[:2])
+                    self.row_counts[key] = self.row_counts.get(key, 0) + 1
+        self.peak_entries = max(self.peak_entries, self.entries)
+        self.escalated = {(txn_id, tuple(table)) for txn_id, table in state["escalated"]}
+    
+    def stats(self):
+        """Lock-table size and call counters for reporting."""
+        return {
+            "lock_calls": self.lock_calls,
+            "lock_table_entries": self.entries,
+            "lock_table_peak": self.peak_entries,
+            "lock_memory_bytes": self.entries * self.ENTRY_BYTES,
+            "lock_memory_peak_bytes": self.peak_entries * self.ENTRY_BYTES,
+            "escalations": len(self.escalations),
+            "escalation_failures": self.escalation_failures,
+            "escalation_conflicts": self.escalation_conflicts
+        }
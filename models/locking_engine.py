@@ -0,0 +1,258 @@
+from models.lock_manager import LockManager
+from models.event_log import EventLog
+from models.range_locks import RangeLockManager
+from models.scheduler import DATA_OPS, UndoLogEngine
+from models.workload import written_value
+
+# Timeline events of the 2PL engine
+LOCK_WAIT = EventLog.define("{} - Waiting for {} lock on {} ({} held by T{})", conflict=True)
+LOCK_MEMORY_EXHAUSTED = EventLog.define("{} - No lock memory for {} lock on {}: aborting", conflict=True)
+LOCK_SET_ACQUIRED = EventLog.define("{} - Acquired predeclared lock set on {} items")
+ITEM_READ = EventLog.define("{} - Read {} = {}")
+ITEM_WRITTEN = EventLog.define("{} - Write {} = {} (changed by {})")
+LOCK_POINT = EventLog.define("{} - Lock point reached, released {} locks before commit")
+RANGE_LOCK_WAIT = EventLog.define("{} - Waiting for {} range lock on value {}..{} ({} held by T{} on {}..{})", conflict=True)
+RANGE_READ = EventLog.define("{} - Range read value {}..{}: {} rows, sum {}")
+PHANTOM_READ = EventLog.define("{} - Phantom: range {}..{} now has {} rows, sum {} (was {} rows, sum {})")
+ITEM_INSERTED = EventLog.define("{} - Insert {} = {}")
+
+
+class TwoPhaseLockingEngine(UndoLogEngine):
+    """
+    Two-Phase Locking engine for the interleaved scheduler.
+    
+    Requests that conflict with another transaction's lock wait (rather than
+    abort) until the lock is released; deadlocks are broken by the scheduler.
+    The variants differ only in when locks are acquired and released:
+    
+    - basic: locks are released at the lock point, after the transaction's
+      last read or write but before it commits. Other transactions can then
+      read its uncommitted writes, so its abort cascades to them.
+    - strict: shared locks are released at the lock point, exclusive locks
+      are held until commit or abort. No cascading aborts.
+    - rigorous: all locks are held until commit or abort.
+    - conservative: the whole lock set is predeclared and acquired
+      atomically before the first operation (all or nothing, so it never
+      deadlocks); locks are released at the lock point as in basic 2PL.
+    
+    Writes go straight to the items table through the undo log of
+    UndoLogEngine, so rolling back a transaction restores the before-images
+    of everything it wrote and aborts transactions that read its writes.
+    
+    Besides reads and writes of named items, transactions can read a range
+    of values ("range_read": the items with value between low and high)
+    and insert items. Row locks alone cover only the rows a range read
+    returned, so a row inserted or updated into the range by another
+    transaction shows up if the range is read again (a phantom). With
+    range_locking, a range read also takes an S predicate lock on
+    [low, high] in a RangeLockManager, and inserts and writes take X locks
+    on the values they create or change, so they wait for the reader
+    instead. Range locks follow the same release rules as row locks, and
+    repeated range reads that see different rows are counted as phantoms.
+    Under the conservative variant, range reads and inserts lock when they
+    run rather than up front, as their rows are not known in advance.
+    """
+    
+    VARIANTS = ("basic", "strict", "rigorous", "conservative")
+    
+    supported_ops = DATA_OPS
+    
+    def __init__(self, cursor, variant="strict", escalation_threshold=None, lock_memory_budget=None,
+                 range_locking=False):
+        super().__init__(cursor)
+        if variant not in self.VARIANTS:
+            raise ValueError(f"Unknown 2PL variant: {variant}")
+        self.variant = variant
+        self.name = f"2PL, {variant}"
+        self.lock_manager = LockManager(escalation_threshold, lock_memory_budget)
+        self.range_locks = RangeLockManager() if range_locking else None
+        self.range_results = {}  # txn_id -> {(low, high): (rows, sum)} seen by its range reads
+        self.lock_waits = 0
+        self.memory_aborts = 0
+        self.phantom_reads = 0
+    
+    def _lock(self, txn, item, mode):
+        """Request a row lock, returning "ok", "wait" or "abort"."""
+        grant = self.lock_manager.acquire(txn["id"], LockManager.path("items", item), mode)
+        if grant["granted"]:
+            return "ok"
+        
+        holder = grant["conflict"]["holder"]
+        if holder is None:
+            # Out of lock memory and escalation failed: no transaction to
+            # wait for, so waiting could never end (no-wait)
+            self.memory_aborts += 1
+            self.waiting_for.pop(txn["id"], None)
+            self.log(txn, LOCK_MEMORY_EXHAUSTED, mode, item)
+            return "abort"
+        
+        if self.waiting_for.get(txn["id"]) != {holder}:
+            self.lock_waits += 1
+            self.log(txn, LOCK_WAIT, mode, item, grant["conflict"]["mode"], holder)
+        self.waiting_for[txn["id"]] = {holder}
+        return "wait"
+    
+    def _lock_range(self, txn, low, high, mode):
+        """Take a predicate lock on [low, high] (always granted without range locking)."""
+        if self.range_locks is None:
+            return True
+        grant = self.range_locks.acquire(txn["id"], low, high, mode)
+        if grant["granted"]:
+            return True
+        
+        conflict = grant["conflict"]
+        if self.waiting_for.get(txn["id"]) != {conflict["holder"]}:
+            self.lock_waits += 1
+            self.log(txn, RANGE_LOCK_WAIT, mode, low, high, conflict["mode"], conflict["holder"], *conflict["range"])
+        self.waiting_for[txn["id"]] = {conflict["holder"]}
+        return False
+    
+    def _range_read(self, txn, op):
+        low, high = op["low"], op["high"]
+        if not self._lock_range(txn, low, high, "S"):
+            return "wait"
+        
+        self.cursor.execute("SELECT name, value FROM items WHERE value BETWEEN ? AND ? ORDER BY name", (low, high))
+        rows = self.cursor.fetchall()
+        # Lock the rows found, as a scan with row locks only would
+        for name, _ in rows:
+            status = self._lock(txn, name, "S")
+            if status != "ok":
+                return status
+        self.waiting_for.pop(txn["id"], None)
+        
+        for name, _ in rows:
+            writers = self.uncommitted_writers.get(name)
+            if writers and writers[-1] != txn["id"]:
+                self.depends_on[txn["id"]].add(writers[-1])
+        
+        result = (len(rows), sum(value for _, value in rows))
+        seen = self.range_results.setdefault(txn["id"], {})
+        previous = seen.setdefault((low, high), result)
+        if previous != result:
+            self.phantom_reads += 1
+            self.log(txn, PHANTOM_READ, low, high, *result, *previous)
+            seen[(low, high)] = result
+        self.log(txn, RANGE_READ, low, high, *result,
+                 data={"low": low, "high": high, "rows": result[0], "sum": result[1]})
+        return "ok"
+    
+    def _insert(self, txn, op):
+        item, value = op["item"], op["value"]
+        status = self._lock(txn, item, "X")
+        if status != "ok":
+            return status
+        if not self._lock_range(txn, value, value, "X"):
+            return "wait"
+        self.waiting_for.pop(txn["id"], None)
+        
+        self._insert_value(txn, item, value)
+        self.log(txn, ITEM_INSERTED, item, value, data={"item": item, "new_value": value})
+        return "ok"
+    
+    def _lock_set(self, txn):
+        """Predeclared lock set: the strongest mode needed on each item."""
+        lock_set = {}
+        for op in txn["ops"]:
+            if op["type"] == "write":
+                lock_set[op["item"]] = "X"
+            elif op["type"] == "read":
+                lock_set.setdefault(op["item"], "S")
+        return lock_set
+    
+    def begin(self, txn):
+        self._start(txn)
+        
+        if self.variant != "conservative":
+            return "ok"
+        
+        # Static 2PL: take every lock up front, or none at all
+        for item, mode in self._lock_set(txn).items():
+            status = self._lock(txn, item, mode)
+            if status != "ok":
+                self.lock_manager.release_all(txn["id"])
+                return status
+        
+        self.waiting_for.pop(txn["id"], None)
+        self.log(txn, LOCK_SET_ACQUIRED, len(self._lock_set(txn)))
+        return "ok"
+    
+    def execute(self, txn, op):
+        if op["type"] == "range_read":
+            return self._range_read(txn, op)
+        if op["type"] == "insert":
+            return self._insert(txn, op)
+        
+        item = op["item"]
+        mode = "S" if op["type"] == "read" else "X"
+        
+        if self.variant != "conservative":
+            status = self._lock(txn, item, mode)
+            if status != "ok":
+                return status
+        
+        value = self._read_value(txn, item)
+        
+        if op["type"] == "read":
+            self.waiting_for.pop(txn["id"], None)
+            self.log(txn, ITEM_READ, item, value, data={"item": item, "value": value})
+            return "ok"
+        
+        new_value = written_value(op, value)
+        # The row leaves one value and enters another: both may be in a locked range
+        if not (self._lock_range(txn, value, value, "X") and self._lock_range(txn, new_value, new_value, "X")):
+            return "wait"
+        self.waiting_for.pop(txn["id"], None)
+        self._write_value(txn, item, value, new_value)
+        
+        self.log(txn, ITEM_WRITTEN, item, new_value, new_value - value,
+                 data={"item": item, "old_value": value, "new_value": new_value})
+        return "ok"
+    
+    def end_of_ops(self, txn):
+        if self.variant in ("basic", "conservative"):
+            released = len(self.lock_manager.release_all(txn["id"]))
+            if self.range_locks is not None:
+                released += self.range_locks.release_all(txn["id"])
+        elif self.variant == "strict":
+            shared = [
+                resource for resource in list(self.lock_manager.txn_locks.get(txn["id"], {}))
+                if len(resource) == 3 and self.lock_manager.held_mode(txn["id"], resource) == "S"
+            ]
+            for resource in shared:
+                self.lock_manager.release(txn["id"], resource)
+            released = len(shared)
+            if self.range_locks is not None:
+                released += self.range_locks.release_all(txn["id"], "S")
+        else:
+            released = 0
+        
+        if released:
+            self.log(txn, LOCK_POINT, released)
+    
+    def commit(self, txn):
+        status = super().commit(txn)
+        if status == "ok":
+            self._release(txn["id"])
+        return status
+    
+    def abort(self, txn):
+        # Cascaded victims go through this method too and drop their own locks
+        cascaded = super().abort(txn)
+        self._release(txn["id"])
+        return cascaded
+    
+    def _release(self, txn_id):
+        self.lock_manager.release_all(txn_id)
+        if self.range_locks is not None:
+            self.range_locks.release_all(txn_id)
+        self.range_results.pop(txn_id, None)
+    
+    def stats(self):
+        stats = self.lock_manager.stats()
+        stats["lock_waits"] = self.lock_waits
+        stats["memory_aborts"] = self.memory_aborts
+        stats["phantom_reads"] = self.phantom_reads
+        if self.range_locks is not None:
+            stats.update(self.range_locks.stats())
+        return stats
@@ -1,7 +1,108 @@
-import sqlite3
+import os
+import random
+import tempfile
 import time
 import datetime
 import json
+from models.batching import BatchWriter, connect
+from models.bulk_load import bulk_load_accounts
+from models.event_log import EventLog
+from models.histogram import LatencyHistogram
+from models.visibility import FROZEN_XID, TransactionManager
+
+# Timeline events of the MVCC simulation
+INITIAL_STATE = EventLog.define("Initial state")
+FINAL_STATE = EventLog.define("Final state")
+TXN_STARTED = EventLog.define("Transaction T{} started")
+TXN_RETRY_STARTED = EventLog.define("Transaction T{} started (retry of T{})")
+BALANCE_READ = EventLog.define("T{} reads {}'s balance")
+SNAPSHOT_READ = EventLog.define("T{} reads {}'s balance (snapshot isolation)")
+BALANCES_REREAD = EventLog.define("T{} reads Alice's and Bob's balances")
+VERSION_CREATED = EventLog.define("T{} creates new version of {}'s account")
+WRITE_CONFLICT_ABORT = EventLog.define(
+    "T{} aborts: write-write conflict on {} (first committer wins)", conflict=True, abort=True
+)
+TXN_COMMITS = EventLog.define("T{} commits", commit=True)
+READ_ONLY_SNAPSHOT = EventLog.define("Read-only transaction reads Alice = {} and Bob = {} (snapshot xmax {}, nothing logged)")
+
+
+class ReadOnlySnapshot:
+    """
+    Snapshot of a declared read-only transaction.
+    
+    It takes a Snapshot without being assigned a transaction id, so it has
+    no transaction_log row and never takes part in commit-time validation.
+    Balances it resolves are memoized, and the snapshot is shared by every
+    read-only transaction that begins before the next commit, since they
+    all see the same state.
+    
+    Commits write the new balance to accounts, so while no commit has
+    happened since the snapshot was taken the accounts row is the visible
+    version and a primary-key lookup suffices; only older snapshots walk
+    the account's version chain.
+    """
+    
+    def __init__(self, cache, snapshot, generation):
+        self.cache = cache
+        self.snapshot = snapshot
+        self.generation = generation
+        self.balances = {}  # account_id -> visible balance
+        self.hits = 0
+        self.misses = 0
+    
+    def read(self, account_id):
+        """Balance of an account as of the snapshot."""
+        balance = self.balances.get(account_id)
+        if balance is not None:
+            self.hits += 1
+            return balance
+        
+        self.misses += 1
+        if self.cache.generation != self.generation:
+            balance = self.cache.txns.read(account_id, self.snapshot)
+        if balance is None:
+            # Current snapshot, or no version yet: the stored balance is the visible one
+            cursor = self.cache.txns.cursor
+            cursor.execute("SELECT balance FROM accounts WHERE id = ?", (account_id,))
+            balance = cursor.fetchone()[0]
+        self.balances[account_id] = balance
+        return balance
+
+
+class SnapshotCache:
+    """
+    Hands out read-only snapshots.
+    
+    Writers call note_commit() after each commit, which only bumps a
+    counter; the next read-only transaction then starts a fresh snapshot.
+    Until then, read-only transactions reuse the current one, so a stream
+    of analytics reads costs no writes and, once warm, no queries.
+    """
+    
+    def __init__(self, txns):
+        self.txns = txns
+        self.generation = 0
+        self.snapshot = None
+        self.snapshots_taken = 0
+        self.transactions = 0
+    
+    def note_commit(self):
+        self.generation += 1
+    
+    def begin(self):
+        """Start a read-only transaction and return its snapshot."""
+        self.transactions += 1
+        if self.snapshot is None or self.snapshot.generation != self.generation:
+            self.snapshot = ReadOnlySnapshot(self, self.txns.snapshot(), self.generation)
+            self.snapshots_taken += 1
+        return self.snapshot
+    
+    def stats(self):
+        return {
+            "read_only_transactions": self.transactions,
+            "snapshots_taken": self.snapshots_taken
+        }
+
 
 class MVCCSimulation:
     """
@@ -12,9 +113,27 @@ class MVCCSimulation:
     was when the transaction started.
     """
     
-    def __init__(self, db_path):
+    # Write statements reused across the run (SQLite prepares each SQL text once)
+    INSERT_VERSION_SQL = "INSERT INTO account_versions (account_id, balance, txn_id, timestamp) VALUES (?, ?, ?, ?)"
+    UPDATE_BALANCE_SQL = "UPDATE accounts SET balance = ? WHERE name = ?"
+    # Keep the stored balance as a frozen version before an account's first new version
+    BASE_VERSION_SQL = """
+        INSERT INTO account_versions (account_id, balance, txn_id, timestamp)
+        SELECT id, balance, 0, ? FROM accounts
+        WHERE id = ? AND NOT EXISTS (SELECT 1 FROM account_versions WHERE account_id = ?)
+    """
+    # Stamp the newest version of an account as deleted (superseded) by a transaction
+    SUPERSEDE_VERSION_SQL = """
+        UPDATE account_versions SET xmax = ?
+        WHERE version_id = (SELECT MAX(version_id) FROM account_versions WHERE account_id = ?)
+    """
+    
+    def __init__(self, db_path, max_retries=3, retry_backoff=0.05):
         self.db_path = db_path
-        
+        # Retry policy for transactions aborted by commit-time validation
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+    
     def _get_timestamp(self):
         """Generate a timestamp string for versioning"""
         return datetime.datetime.now().isoformat()
@@ -28,222 +147,220 @@ class MVCCSimulation:
             "explanation": "MVCC Simulation demonstrates how databases handle concurrent transactions by maintaining different versions of data.",
             "timeline": [],
             "transactions": [],
-            "versions": []
+            "versions": [],
+            "retries": 0,
+            "wasted_ops": 0,
+            "sql": {}
         }
         
+        # Events are formatted into results["timeline"] at the end
+        timeline = EventLog()
+        
         # Connect to the database
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = connect(self.db_path)
         cursor = conn.cursor()
+        writer = BatchWriter(cursor)
         
         # Clear previous simulation data if any
         cursor.execute("DELETE FROM transaction_log")
         cursor.execute("DELETE FROM account_versions")
         
         # Reset accounts to initial state
-        cursor.execute("UPDATE accounts SET balance = 1000.00 WHERE name = 'Alice'")
-        cursor.execute("UPDATE accounts SET balance = 2000.00 WHERE name = 'Bob'")
+        cursor.executemany(self.UPDATE_BALANCE_SQL, [(1000.00, "Alice"), (2000.00, "Bob")])
         conn.commit()
         
         # Fetch initial account states
         cursor.execute("SELECT * FROM accounts WHERE name IN ('Alice', 'Bob')")
         initial_accounts = [dict(row) for row in cursor.fetchall()]
-        results["timeline"].append({
-            "time": self._get_timestamp(),
-            "action": "Initial state",
-            "data": initial_accounts
-        })
+        timeline.append(INITIAL_STATE, None, data=initial_accounts)
+        
+        # The initial balances are the first versions, created by the frozen id
+        timestamp = self._get_timestamp()
+        cursor.executemany(self.INSERT_VERSION_SQL, [
+            (account["id"], account["balance"], FROZEN_XID, timestamp) for account in initial_accounts
+        ])
+        conn.commit()
+        
+        # Transaction ids, snapshots and the commit-status bitmap
+        txns = TransactionManager(cursor)
+        
+        # Snapshots for read-only (analytics) transactions
+        snapshots = SnapshotCache(txns)
         
         # Create Transaction 1 (T1) - Transfer from Alice to Bob
         t1_start = self._get_timestamp()
-        cursor.execute(
-            "INSERT INTO transaction_log (start_timestamp, status) VALUES (?, ?)",
-            (t1_start, "STARTED")
-        )
-        t1_id = cursor.lastrowid
+        t1_id = txns.begin(t1_start)
+        t1_snapshot = txns.snapshot()
         
-        results["timeline"].append({
-            "time": t1_start,
-            "action": f"Transaction T{t1_id} started",
-            "data": {"transaction_id": t1_id}
-        })
+        timeline.append(TXN_STARTED, None, t1_id, data={"transaction_id": t1_id, "snapshot": t1_snapshot.to_dict()})
         
         # T1 reads Alice's balance
         cursor.execute("SELECT * FROM accounts WHERE name = 'Alice'")
         alice_account = dict(cursor.fetchone())
-        alice_initial_balance = alice_account["balance"]
+        alice_initial_balance = txns.read(alice_account["id"], t1_snapshot, t1_id)
         
-        results["timeline"].append({
-            "time": self._get_timestamp(),
-            "action": f"T{t1_id} reads Alice's balance",
-            "data": {"balance": alice_initial_balance}
-        })
+        timeline.append(BALANCE_READ, None, t1_id, "Alice", data={"balance": alice_initial_balance})
         
         # Create Transaction 2 (T2) - Independent update to Bob's account
         time.sleep(0.1)  # Small delay to clearly separate transaction times
         t2_start = self._get_timestamp()
-        cursor.execute(
-            "INSERT INTO transaction_log (start_timestamp, status) VALUES (?, ?)",
-            (t2_start, "STARTED")
-        )
-        t2_id = cursor.lastrowid
+        t2_id = txns.begin(t2_start)
+        t2_snapshot = txns.snapshot()
         
-        results["timeline"].append({
-            "time": t2_start,
-            "action": f"Transaction T{t2_id} started",
-            "data": {"transaction_id": t2_id}
-        })
+        timeline.append(TXN_STARTED, None, t2_id, data={"transaction_id": t2_id, "snapshot": t2_snapshot.to_dict()})
         
         # T2 reads Bob's balance
         cursor.execute("SELECT * FROM accounts WHERE name = 'Bob'")
         bob_account = dict(cursor.fetchone())
-        bob_initial_balance = bob_account["balance"]
+        bob_initial_balance = txns.read(bob_account["id"], t2_snapshot, t2_id)
         
-        results["timeline"].append({
-            "time": self._get_timestamp(),
-            "action": f"T{t2_id} reads Bob's balance",
-            "data": {"balance": bob_initial_balance}
-        })
+        timeline.append(BALANCE_READ, None, t2_id, "Bob", data={"balance": bob_initial_balance})
         
         # T2 updates Bob's balance (adding 500)
         new_bob_balance = bob_initial_balance + 500
         timestamp = self._get_timestamp()
         
-        # Create a new version for Bob's account
+        # Create a new version for Bob's account, superseding the current one
+        cursor.execute(self.SUPERSEDE_VERSION_SQL, (t2_id, bob_account["id"]))
         cursor.execute(
-            """
-            INSERT INTO account_versions (account_id, balance, txn_id, timestamp)
-            VALUES (?, ?, ?, ?)
-            """,
+            self.INSERT_VERSION_SQL,
             (bob_account["id"], new_bob_balance, t2_id, timestamp)
         )
         
-        results["timeline"].append({
-            "time": timestamp,
-            "action": f"T{t2_id} creates new version of Bob's account",
-            "data": {"new_balance": new_bob_balance}
-        })
+        timeline.append(VERSION_CREATED, None, t2_id, "Bob", data={"new_balance": new_bob_balance})
         
         # T2 commits
         t2_commit = self._get_timestamp()
-        cursor.execute(
-            "UPDATE transaction_log SET commit_timestamp = ?, status = ? WHERE txn_id = ?",
-            (t2_commit, "COMMITTED", t2_id)
-        )
+        txns.commit(t2_id, t2_commit)
         
         # Update the actual account record
-        cursor.execute(
-            "UPDATE accounts SET balance = ? WHERE name = ?",
-            (new_bob_balance, "Bob")
-        )
+        cursor.execute(self.UPDATE_BALANCE_SQL, (new_bob_balance, "Bob"))
         
         conn.commit()
+        snapshots.note_commit()
         
-        results["timeline"].append({
-            "time": t2_commit,
-            "action": f"T{t2_id} commits",
-            "data": {"new_bob_balance": new_bob_balance}
-        })
-        
-        # Now T1 continues and tries to read Bob's balance
-        # Note: In true MVCC, T1 would see Bob's balance as it was when T1 started
-        # We'll simulate this by fetching the version visible to T1
-        cursor.execute("""
-            SELECT v.balance
-            FROM account_versions v
-            JOIN transaction_log t ON v.txn_id = t.txn_id
-            WHERE v.account_id = ? AND t.start_timestamp < ?
-            ORDER BY t.start_timestamp DESC
-            LIMIT 1
-        """, (bob_account["id"], t1_start))
-        
-        # If no version exists prior to T1's start, use the initial balance
-        bob_balance_t1_sees = bob_initial_balance
-        row = cursor.fetchone()
-        if row:
-            bob_balance_t1_sees = row[0]
-        
-        results["timeline"].append({
-            "time": self._get_timestamp(),
-            "action": f"T{t1_id} reads Bob's balance (snapshot isolation)",
-            "data": {
-                "balance_t1_sees": bob_balance_t1_sees,
-                "actual_current_balance": new_bob_balance,
-                "note": "T1 sees the version of data as it existed when T1 started"
-            }
-        })
-        
-        # T1 updates Alice's balance (subtract 200)
-        new_alice_balance = alice_initial_balance - 200
-        timestamp = self._get_timestamp()
-        
-        # Create a new version for Alice's account
-        cursor.execute(
-            """
-            INSERT INTO account_versions (account_id, balance, txn_id, timestamp)
-            VALUES (?, ?, ?, ?)
-            """,
-            (alice_account["id"], new_alice_balance, t1_id, timestamp)
-        )
-        
-        results["timeline"].append({
-            "time": timestamp,
-            "action": f"T{t1_id} creates new version of Alice's account",
-            "data": {"new_balance": new_alice_balance}
-        })
+        timeline.append(TXN_COMMITS, None, t2_id, data={"new_bob_balance": new_bob_balance})
         
-        # T1 updates Bob's balance (add 200)
-        new_bob_balance_t1 = bob_balance_t1_sees + 200
-        timestamp = self._get_timestamp()
+        # A read-only report runs alongside T1: no log row, no validation
+        report = snapshots.begin()
+        report_balances = {"Alice": report.read(alice_account["id"]), "Bob": report.read(bob_account["id"])}
+        timeline.append(READ_ONLY_SNAPSHOT, None, report_balances["Alice"], report_balances["Bob"],
+                        report.snapshot.xmax, data=dict(report_balances, snapshot=report.snapshot.to_dict()))
         
-        # Create a new version for Bob's account
-        cursor.execute(
-            """
-            INSERT INTO account_versions (account_id, balance, txn_id, timestamp)
-            VALUES (?, ?, ?, ?)
-            """,
-            (bob_account["id"], new_bob_balance_t1, t1_id, timestamp)
-        )
+        # Now T1 continues and tries to read Bob's balance. T2 was not
+        # finished when T1's snapshot was taken, so T2's version is not
+        # visible and T1 still sees the version T2 superseded
+        bob_balance_t1_sees = txns.read(bob_account["id"], t1_snapshot, t1_id)
         
-        results["timeline"].append({
-            "time": timestamp,
-            "action": f"T{t1_id} creates new version of Bob's account",
-            "data": {"new_balance": new_bob_balance_t1}
+        timeline.append(SNAPSHOT_READ, None, t1_id, "Bob", data={
+            "balance_t1_sees": bob_balance_t1_sees,
+            "actual_current_balance": new_bob_balance,
+            "note": "T1 sees the version of data as it existed when T1 started"
         })
         
-        # T1 commits
-        t1_commit = self._get_timestamp()
-        cursor.execute(
-            "UPDATE transaction_log SET commit_timestamp = ?, status = ? WHERE txn_id = ?",
-            (t1_commit, "COMMITTED", t1_id)
-        )
-        
-        # Update the actual account records
-        cursor.execute(
-            "UPDATE accounts SET balance = ? WHERE name = ?",
-            (new_alice_balance, "Alice")
-        )
-        
-        # For Bob's balance, we need to handle the conflict
-        # In a real MVCC system, this might cause a serialization failure
-        # For simulation, we'll apply T1's changes on top of T2's changes
-        final_bob_balance = new_bob_balance + 200  # T2's changes + T1's transfer
-        cursor.execute(
-            "UPDATE accounts SET balance = ? WHERE name = ?",
-            (final_bob_balance, "Bob")
-        )
-        
-        conn.commit()
-        
-        results["timeline"].append({
-            "time": t1_commit,
-            "action": f"T{t1_id} commits with conflict resolution",
-            "data": {
-                "new_alice_balance": new_alice_balance,
-                "final_bob_balance": final_bob_balance,
-                "note": "Bob's final balance combines both T1 and T2's changes"
+        # T1 transfers 200 from Alice to Bob. Its writes are validated at commit
+        # time (first committer wins): T2 committed a newer version of Bob after
+        # T1's snapshot, so T1 must abort and retry on a fresh snapshot.
+        txn_id = t1_id
+        snapshot = t1_snapshot
+        alice_balance_seen = alice_initial_balance
+        bob_balance_seen = bob_balance_t1_sees
+        attempt = 0
+        
+        while True:
+            new_alice_balance = alice_balance_seen - 200
+            new_bob_balance_t1 = bob_balance_seen + 200
+            write_set = {
+                alice_account["id"]: ("Alice", new_alice_balance),
+                bob_account["id"]: ("Bob", new_bob_balance_t1)
             }
-        })
+            
+            # Create new versions for both accounts: one batch closes the
+            # current versions, a second inserts the new ones
+            for account_id in write_set:
+                writer.add(self.SUPERSEDE_VERSION_SQL, (txn_id, account_id))
+            for account_id, (account_name, new_balance) in write_set.items():
+                timestamp = self._get_timestamp()
+                writer.add(self.INSERT_VERSION_SQL, (account_id, new_balance, txn_id, timestamp))
+                
+                timeline.append(
+                    VERSION_CREATED, None, txn_id, account_name,
+                    data={"new_balance": new_balance}
+                )
+            
+            writer.flush()
+            
+            # Commit-time validation against the snapshot: a committed version
+            # by a writer the snapshot does not see means that writer won
+            conflicting = [
+                account_name for account_id, (account_name, _) in write_set.items()
+                if txns.write_conflict(account_id, snapshot, txn_id) is not None
+            ]
+            
+            if not conflicting:
+                break
+            
+            # Abort: roll back T1's versions and mark it aborted. The xmax it
+            # stamped on the versions it superseded stays, but an aborted
+            # deleter does not hide a version
+            cursor.execute("DELETE FROM account_versions WHERE txn_id = ?", (txn_id,))
+            txns.abort(txn_id)
+            conn.commit()
+            
+            results["retries"] += 1
+            results["wasted_ops"] += len(write_set)
+            backoff = self.retry_backoff * (2 ** attempt)
+            attempt += 1
+            
+            timeline.append(WRITE_CONFLICT_ABORT, None, txn_id, ", ".join(conflicting), data={
+                "transaction_id": txn_id,
+                "conflicting_accounts": conflicting,
+                "retry": attempt,
+                "backoff": backoff
+            })
+            
+            if attempt > self.max_retries:
+                new_alice_balance = None
+                break
+            
+            time.sleep(backoff)
+            
+            # Retry as a new transaction with a fresh snapshot
+            txn_id = txns.begin(self._get_timestamp())
+            snapshot = txns.snapshot()
+            
+            timeline.append(
+                TXN_RETRY_STARTED, None, txn_id, t1_id,
+                data={"transaction_id": txn_id, "retry_of": t1_id, "snapshot": snapshot.to_dict()}
+            )
+            
+            alice_balance_seen = txns.read(alice_account["id"], snapshot, txn_id)
+            bob_balance_seen = txns.read(bob_account["id"], snapshot, txn_id)
+            
+            timeline.append(
+                BALANCES_REREAD, None, txn_id,
+                data={"alice_balance": alice_balance_seen, "bob_balance": bob_balance_seen}
+            )
+        
+        if new_alice_balance is not None:
+            # T1 (or its retry) commits
+            t1_commit = self._get_timestamp()
+            txns.commit(txn_id, t1_commit)
+            
+            # Update the actual account records
+            for account_id, (account_name, new_balance) in write_set.items():
+                writer.add(self.UPDATE_BALANCE_SQL, (new_balance, account_name))
+            
+            writer.flush()
+            conn.commit()
+            snapshots.note_commit()
+            
+            timeline.append(TXN_COMMITS, None, txn_id, data={
+                "new_alice_balance": new_alice_balance,
+                "final_bob_balance": new_bob_balance_t1,
+                "note": "The transfer was re-executed on a snapshot that includes T2's update"
+            })
+        
         
         # Fetch all transactions for the result
         cursor.execute("SELECT * FROM transaction_log")
@@ -254,19 +371,139 @@ class MVCCSimulation:
             SELECT v.*, a.name as account_name 
             FROM account_versions v
             JOIN accounts a ON v.account_id = a.id
-            ORDER BY v.timestamp
+            ORDER BY v.version_id
         """)
         results["versions"] = [dict(row) for row in cursor.fetchall()]
         
         # Fetch final state
         cursor.execute("SELECT * FROM accounts WHERE name IN ('Alice', 'Bob')")
         final_accounts = [dict(row) for row in cursor.fetchall()]
-        results["timeline"].append({
-            "time": self._get_timestamp(),
-            "action": "Final state",
-            "data": final_accounts
-        })
+        timeline.append(FINAL_STATE, None, data=final_accounts)
+        
+        results["read_only"] = snapshots.stats()
+        results["visibility"] = {"version_checks": txns.version_checks, "clog_bytes": len(txns.clog.bits)}
+        
+        # Statements sent to SQLite (executemany counts once)
+        results["sql"] = conn.sql_stats()
+        results["timeline"] = timeline.serialize()
         
         conn.close()
         
-        return results
\ No newline at end of file
+        return results
+    
+    def benchmark_read_only(self, num_accounts=10000, read_txns=5000, reads_per_txn=4, write_every=50,
+                            seed=44, work_dir=None):
+        """
+        Compare read-only transactions on the logged path with the
+        declared read-only fast path.
+        
+        Both paths run the same stream of read transactions against a
+        bulk-loaded database in which a transfer commits every write_every
+        reads. On the logged path every reader inserts and completes a
+        transaction_log row and reads through the start-timestamp join; on
+        the fast path readers share a SnapshotCache snapshot.
+        
+        Args:
+            num_accounts: Accounts to bulk-load
+            read_txns: Read-only transactions per path
+            reads_per_txn: Account balances read by each
+            write_every: Read transactions between committed transfers
+            seed: Random seed for accounts, reads and transfers
+            work_dir: Directory for the temporary database
+        
+        Returns:
+            dict: Throughput, read latency and log rows written per path,
+            and the fast path's speedup.
+        """
+        results = {"explanation": "Read-only transactions: logged snapshot reads vs the read-only fast path",
+                   "read_txns": read_txns, "reads_per_txn": reads_per_txn, "paths": {}}
+        
+        for path in ("logged", "read_only"):
+            fd, db_path = tempfile.mkstemp(suffix=".db", dir=work_dir)
+            os.close(fd)
+            conn = connect(db_path)
+            try:
+                cursor = conn.cursor()
+                bulk_load_accounts(cursor, num_accounts, seed=seed)
+                results["paths"][path] = self._run_readers(cursor, path, num_accounts, read_txns,
+                                                           reads_per_txn, write_every, seed)
+            finally:
+                conn.close()
+                os.remove(db_path)
+        
+        logged, fast = results["paths"]["logged"], results["paths"]["read_only"]
+        results["speedup"] = fast["txns_per_second"] / logged["txns_per_second"] if logged["txns_per_second"] else 0
+        return results
+    
+    def _run_readers(self, cursor, path, num_accounts, read_txns, reads_per_txn, write_every, seed):
+        """Run the read stream of benchmark_read_only on one path."""
+        rng = random.Random(seed)
+        txns = TransactionManager(cursor)
+        snapshots = SnapshotCache(txns)
+        read_latency = LatencyHistogram()
+        log_rows = 0
+        start_time = time.perf_counter()
+        
+        for n in range(1, read_txns + 1):
+            accounts = rng.sample(range(1, num_accounts + 1), reads_per_txn)
+            
+            if path == "logged":
+                txn_start = self._get_timestamp()
+                cursor.execute("INSERT INTO transaction_log (start_timestamp, status) VALUES (?, ?)",
+                               (txn_start, "STARTED"))
+                txn_id = cursor.lastrowid
+                for account_id in accounts:
+                    read_start = time.perf_counter()
+                    cursor.execute("""
+                        SELECT v.balance
+                        FROM account_versions v
+                        JOIN transaction_log t ON v.txn_id = t.txn_id
+                        WHERE v.account_id = ? AND t.start_timestamp < ?
+                        ORDER BY t.start_timestamp DESC
+                        LIMIT 1
+                    """, (account_id, txn_start))
+                    if cursor.fetchone() is None:
+                        cursor.execute("SELECT balance FROM accounts WHERE id = ?", (account_id,))
+                        cursor.fetchone()
+                    read_latency.record(time.perf_counter() - read_start)
+                cursor.execute("UPDATE transaction_log SET commit_timestamp = ?, status = ? WHERE txn_id = ?",
+                               (self._get_timestamp(), "COMMITTED", txn_id))
+                log_rows += 1
+            else:
+                snapshot = snapshots.begin()
+                for account_id in accounts:
+                    read_start = time.perf_counter()
+                    snapshot.read(account_id)
+                    read_latency.record(time.perf_counter() - read_start)
+            
+            if n % write_every == 0:
+                self._commit_transfer(txns, rng, num_accounts)
+                snapshots.note_commit()
+        
+        cursor.connection.commit()
+        duration = time.perf_counter() - start_time
+        return {
+            "duration": duration,
+            "txns_per_second": read_txns / duration if duration > 0 else 0,
+            "read_latency": read_latency.summary(),
+            "transaction_log_rows": log_rows,
+            "snapshots_taken": snapshots.snapshots_taken
+        }
+    
+    def _commit_transfer(self, txns, rng, num_accounts):
+        """Commit a transfer between two random accounts, versions included."""
+        cursor = txns.cursor
+        source, target = rng.sample(range(1, num_accounts + 1), 2)
+        txn_id = txns.begin(self._get_timestamp())
+        writes = []
+        for account_id, change in ((source, -10.0), (target, 10.0)):
+            cursor.execute("SELECT balance FROM accounts WHERE id = ?", (account_id,))
+            writes.append((account_id, cursor.fetchone()[0] + change))
+        
+        timestamp = self._get_timestamp()
+        cursor.executemany(self.BASE_VERSION_SQL, [(timestamp, account_id, account_id) for account_id, _ in writes])
+        cursor.executemany(self.SUPERSEDE_VERSION_SQL, [(txn_id, account_id) for account_id, _ in writes])
+        cursor.executemany(self.INSERT_VERSION_SQL, [(account_id, balance, txn_id, timestamp) for account_id, balance in writes])
+        cursor.executemany("UPDATE accounts SET balance = ? WHERE id = ?", [(balance, account_id) for account_id, balance in writes])
+        txns.commit(txn_id, timestamp)
+        cursor.connection.commit()
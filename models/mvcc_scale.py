@@ -0,0 +1,169 @@
+import os
+import random
+import tempfile
+import time
+import datetime
+from models.batching import connect
+from models.bulk_load import account_name, bulk_load_accounts
+from models.histogram import LatencyHistogram
+
+
+class MVCCScaleBenchmark:
+    """
+    Runs an MVCC random-transfer workload on bulk-loaded account tables of
+    increasing size.
+    
+    Each size gets its own temporary database, filled by the streaming bulk
+    loader. Transfers pick two random accounts by name, read both balances
+    from their snapshot through the account_versions(account_id, txn_id)
+    index, and commit a new version of each. Transfers run one after
+    another, so a transfer's snapshot is every transaction with a smaller
+    txn_id.
+    """
+    
+    # Newest version of an account visible to a snapshot
+    SNAPSHOT_READ_SQL = """
+        SELECT balance FROM account_versions
+        WHERE account_id = ? AND txn_id < ?
+        ORDER BY txn_id DESC
+        LIMIT 1
+    """
+    INSERT_VERSION_SQL = "INSERT INTO account_versions (account_id, balance, txn_id, timestamp) VALUES (?, ?, ?, ?)"
+    UPDATE_BALANCE_SQL = "UPDATE accounts SET balance = ? WHERE id = ?"
+    
+    def __init__(self, sizes=(10000, 100000, 1000000), transfers=2000, chunk_size=50000,
+                 commit_every=100, growth_samples=5, seed=34, work_dir=None):
+        # Account-table sizes to run the workload on
+        self.sizes = sizes
+        self.transfers = transfers
+        # Rows per bulk-load chunk, and transfers per SQLite commit
+        self.chunk_size = chunk_size
+        self.commit_every = commit_every
+        # Number of points at which version-table growth is sampled
+        self.growth_samples = growth_samples
+        self.seed = seed
+        # Directory for the temporary databases (defaults to the system temp dir)
+        self.work_dir = work_dir
+    
+    def _get_timestamp(self):
+        """Generate a timestamp string"""
+        return datetime.datetime.now().isoformat()
+    
+    def run_benchmark(self):
+        """
+        Load each data size and run the transfer workload on it.
+        
+        Returns:
+            dict: Per-size load statistics, snapshot-read latency percentiles
+            and version-table growth.
+        """
+        results = {
+            "explanation": "MVCC random transfers on bulk-loaded account tables of increasing size",
+            "transfers": self.transfers,
+            "sizes": []
+        }
+        
+        for size in self.sizes:
+            fd, db_path = tempfile.mkstemp(suffix=".db", dir=self.work_dir)
+            os.close(fd)
+            conn = connect(db_path)
+            
+            try:
+                cursor = conn.cursor()
+                load = bulk_load_accounts(cursor, size, self.chunk_size, self.seed)
+                run = self._run_transfers(cursor, size)
+                run["db_bytes"] = os.path.getsize(db_path)
+            finally:
+                conn.close()
+                os.remove(db_path)
+            
+            results["sizes"].append(dict(run, accounts=size, load=load))
+        
+        return results
+    
+    def _snapshot_read(self, cursor, account_id, txn_id):
+        """Read the balance an account had in the snapshot of txn_id."""
+        cursor.execute(self.SNAPSHOT_READ_SQL, (account_id, txn_id))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+        
+        # No committed version yet: the loaded balance is the visible one
+        cursor.execute("SELECT balance FROM accounts WHERE id = ?", (account_id,))
+        return cursor.fetchone()[0]
+    
+    def _run_transfers(self, cursor, size):
+        """
+        Run the transfer workload on a loaded database.
+        
+        Returns:
+            dict: Snapshot-read latency percentiles, transfer throughput and
+            version-table growth samples.
+        """
+        rng = random.Random(self.seed)
+        read_latency = LatencyHistogram()
+        growth = []
+        sample_every = max(1, self.transfers // self.growth_samples)
+        segment_latency = LatencyHistogram()
+        start_time = time.time()
+        
+        for done in range(1, self.transfers + 1):
+            source, target = rng.sample(range(1, size + 1), 2)
+            amount = float(rng.randint(1, 100))
+            
+            cursor.execute(
+                "INSERT INTO transaction_log (start_timestamp, status) VALUES (?, ?)",
+                (self._get_timestamp(), "STARTED")
+            )
+            txn_id = cursor.lastrowid
+            
+            # Look the accounts up by name, as a client would
+            balances = {}
+            for number in (source, target):
+                cursor.execute("SELECT id FROM accounts WHERE name = ?", (account_name(number),))
+                account_id = cursor.fetchone()[0]
+                
+                read_start = time.perf_counter()
+                balances[account_id] = self._snapshot_read(cursor, account_id, txn_id)
+                latency = time.perf_counter() - read_start
+                read_latency.record(latency)
+                segment_latency.record(latency)
+            
+            (source_id, source_balance), (target_id, target_balance) = balances.items()
+            writes = [(source_id, source_balance - amount), (target_id, target_balance + amount)]
+            
+            timestamp = self._get_timestamp()
+            cursor.executemany(
+                self.INSERT_VERSION_SQL,
+                [(account_id, balance, txn_id, timestamp) for account_id, balance in writes]
+            )
+            cursor.executemany(self.UPDATE_BALANCE_SQL, [(balance, account_id) for account_id, balance in writes])
+            cursor.execute(
+                "UPDATE transaction_log SET commit_timestamp = ?, status = ? WHERE txn_id = ?",
+                (timestamp, "COMMITTED", txn_id)
+            )
+            
+            if done % self.commit_every == 0:
+                cursor.connection.commit()
+            
+            if done % sample_every == 0 or done == self.transfers:
+                cursor.execute("SELECT COUNT(*) FROM account_versions")
+                versions = cursor.fetchone()[0]
+                growth.append({
+                    "transfers": done,
+                    "versions": versions,
+                    "versions_per_account": versions / size,
+                    "snapshot_read_latency": segment_latency.summary()
+                })
+                segment_latency = LatencyHistogram()
+        
+        cursor.connection.commit()
+        duration = time.time() - start_time
+        
+        return {
+            "duration": duration,
+            "transfers_per_second": self.transfers / duration if duration > 0 else 0,
+            "snapshot_read_latency": read_latency.summary(),
+            "versions": growth[-1]["versions"] if growth else 0,
+            "version_growth": growth
+        }
@@ -0,0 +1,119 @@
+import time
+from models.event_log import EventLog
+from models.histogram import LatencyHistogram
+from models.scheduler import ProtocolEngine
+from models.workload import written_value
+
+# Timeline events of the OCC engine
+VERSIONED_READ = EventLog.define("{} - Read {} = {} (version {})")
+WRITE_BUFFERED = EventLog.define("{} - Buffer write {} = {} (changed by {})")
+VALIDATION_CONFLICT = EventLog.define("{} - Validation conflict: {} changed since read", conflict=True)
+VALIDATED = EventLog.define("{} - Validated {} reads, installed {} writes")
+
+
+class OptimisticEngine(ProtocolEngine):
+    """
+    Optimistic Concurrency Control (OCC) engine for the interleaved scheduler.
+    
+    Transactions run in three phases:
+    1. Read phase: reads go to the database (or the transaction's own private
+       write set); writes are buffered in the private write set. The version
+       of every key read is remembered in the read set.
+    2. Validation phase (backward validation): at commit, every key in the
+       read set is checked against the per-key committed version counter. If
+       any key was overwritten by a transaction that committed in the
+       meantime, the transaction aborts. The check costs O(read-set).
+    3. Write phase: the write set is installed and the version counters of
+       the written keys are bumped.
+    
+    Validation and write happen in one scheduler step, so they are atomic
+    with respect to other transactions. OCC never blocks and never
+    deadlocks; conflicts surface only as validation failures.
+    """
+    
+    name = "OCC"
+    
+    def __init__(self, cursor):
+        super().__init__(cursor)
+        self.versions = {}  # item -> committed version counter
+        self.read_sets = {}  # txn_id -> {item: version seen}
+        self.write_sets = {}  # txn_id -> {item: new value}
+        self.validations = 0
+        self.validation_failures = 0
+        self.validation_time = 0.0
+        self.keys_validated = 0
+        self.latency["validation"] = LatencyHistogram()
+    
+    def begin(self, txn):
+        self.read_sets[txn["id"]] = {}
+        self.write_sets[txn["id"]] = {}
+        return "ok"
+    
+    def _read(self, txn, item):
+        write_set = self.write_sets[txn["id"]]
+        if item in write_set:
+            return write_set[item]
+        
+        self.cursor.execute("SELECT value FROM items WHERE name = ?", (item,))
+        value = self.cursor.fetchone()[0]
+        self.read_sets[txn["id"]].setdefault(item, self.versions.get(item, 0))
+        return value
+    
+    def execute(self, txn, op):
+        item = op["item"]
+        value = self._read(txn, item)
+        
+        if op["type"] == "read":
+            self.log(txn, VERSIONED_READ, item, value, self.versions.get(item, 0),
+                     data={"item": item, "value": value})
+            return "ok"
+        
+        new_value = written_value(op, value)
+        self.write_sets[txn["id"]][item] = new_value
+        self.log(txn, WRITE_BUFFERED, item, new_value, new_value - value,
+                 data={"item": item, "old_value": value, "new_value": new_value})
+        return "ok"
+    
+    def commit(self, txn):
+        read_set = self.read_sets[txn["id"]]
+        
+        # Backward validation against committed version counters
+        start = time.perf_counter()
+        stale = [item for item, version in read_set.items() if self.versions.get(item, 0) != version]
+        elapsed = time.perf_counter() - start
+        self.validation_time += elapsed
+        self.latency["validation"].record(elapsed)
+        self.validations += 1
+        self.keys_validated += len(read_set)
+        
+        if stale:
+            self.validation_failures += 1
+            self.log(txn, VALIDATION_CONFLICT, ", ".join(stale))
+            return "abort"
+        
+        # Write phase
+        for item, value in self.write_sets[txn["id"]].items():
+            self.cursor.execute("UPDATE items SET value = ? WHERE name = ?", (value, item))
+            self.versions[item] = self.versions.get(item, 0) + 1
+        self.persist()
+        
+        self.log(txn, VALIDATED, len(read_set), len(self.write_sets[txn["id"]]))
+        self._forget(txn["id"])
+        return "ok"
+    
+    def abort(self, txn):
+        # Nothing was written to the database, so dropping private state is enough
+        self._forget(txn["id"])
+        return []
+    
+    def _forget(self, txn_id):
+        self.read_sets.pop(txn_id, None)
+        self.write_sets.pop(txn_id, None)
+    
+    def stats(self):
+        return {
+            "validations": self.validations,
+            "validation_failures": self.validation_failures,
+            "validation_time": self.validation_time,
+            "keys_validated": self.keys_validated
+        }
@@ -0,0 +1,169 @@
+import threading
+import time
+import base64
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+# Set non-interactive backend before importing pyplot
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import networkx as nx
+
+
+def _draw_bar(ax, spec):
+    """Grouped bars: one group per category, one bar per series."""
+    categories = spec["categories"]
+    series = spec["series"]
+    x = range(len(categories))
+    width = spec.get("width", 0.8 / max(len(series), 1))
+    
+    for offset, entry in enumerate(series):
+        ax.bar([i + (offset - (len(series) - 1) / 2) * width for i in x], entry["values"], width, label=entry["label"])
+    
+    ax.set_xticks(x)
+    ax.set_xticklabels(categories)
+
+
+def _draw_line(ax, spec):
+    """One line with markers per series."""
+    for entry in spec["series"]:
+        ax.plot(entry["x"], entry["y"], marker='o', label=entry["label"])
+
+
+def _draw_graph(ax, spec):
+    """Directed graph (e.g. a wait-for graph) with a spring layout."""
+    graph = nx.DiGraph()
+    graph.add_nodes_from(spec["nodes"])
+    graph.add_edges_from(spec["edges"])
+    pos = nx.spring_layout(graph, seed=spec.get("seed"))
+    nx.draw(graph, pos, ax=ax, with_labels=True, node_color='lightblue',
+            node_size=500, arrows=True, arrowsize=20)
+
+
+DRAWERS = {"bar": _draw_bar, "line": _draw_line, "graph": _draw_graph}
+
+
+def render_chart(spec):
+    """
+    Render a plot spec to a base64-encoded PNG.
+    
+    Runs in a RenderService worker process, so it takes and returns plain
+    data and pyplot's global state is never shared between threads.
+    
+    Args:
+        spec: {"kind": "bar" | "line" | "graph", plus the kind's data and
+            optional "title", "xlabel", "ylabel", "legend", "figsize"}
+    
+    Returns:
+        dict: {"image": base64 PNG, "render_time": seconds spent drawing}
+    """
+    start = time.perf_counter()
+    fig, ax = plt.subplots(figsize=spec.get("figsize", (10, 6)))
+    
+    DRAWERS[spec["kind"]](ax, spec)
+    if "title" in spec:
+        ax.set_title(spec["title"])
+    if "xlabel" in spec:
+        ax.set_xlabel(spec["xlabel"])
+    if "ylabel" in spec:
+        ax.set_ylabel(spec["ylabel"])
+    if spec.get("legend"):
+        ax.legend()
+    
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png')
+    plt.close(fig)
+    buffer.seek(0)
+    image_data = base64.b64encode(buffer.read()).decode()
+    
+    return {"image": image_data, "render_time": time.perf_counter() - start}
+
+
+class RenderService:
+    """
+    Renders charts in a small pool of worker processes.
+    
+    Models build a plot spec (plain data, see render_chart) and submit it;
+    the chart is drawn in another process while the caller carries on, and
+    the caller collects the image from the returned future when it needs
+    it. Charts of concurrent requests render in parallel on separate cores,
+    and pyplot is never used from the serving threads.
+    """
+    
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
+        self.executor = None
+        self.lock = threading.Lock()
+        self.charts_rendered = 0
+        self.render_time = 0.0
+    
+    def _pool(self):
+        # Workers are started on first use, not at import time
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self.executor
+    
+    def submit(self, spec):
+        """
+        Queue a plot spec for rendering.
+        
+        Returns:
+            Future: Resolves to render_chart's {"image", "render_time"}.
+        """
+        future = self._pool().submit(render_chart, spec)
+        future.add_done_callback(self._record)
+        return future
+    
+    def render(self, spec):
+        """Render a plot spec and wait for the result."""
+        return self.submit(spec).result()
+    
+    def _record(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self.lock:
+            self.charts_rendered += 1
+            self.render_time += future.result()["render_time"]
+    
+    def stats(self):
+        """Charts rendered so far and the worker time spent on them."""
+        with self.lock:
+            return {"charts_rendered": self.charts_rendered, "render_time": self.render_time}
+    
+    def shutdown(self):
+        """Stop the worker processes."""
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+
+def collect_chart(results, key):
+    """
+    Wait for a chart a simulation left pending and put it in its results.
+    
+    Simulations run with wait_for_chart=False store the render Future under
+    key instead of the image, so the caller can release the simulation
+    lease first and only then wait for the render service.
+    
+    Returns:
+        dict: results, with the base64 image under key and render_time set.
+    """
+    rendered = results[key].result()
+    results[key] = rendered["image"]
+    results["render_time"] = rendered["render_time"]
+    return results
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def render_service():
+    """Return the process-wide RenderService, creating it on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = RenderService()
+        return _service
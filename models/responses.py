@@ -0,0 +1,379 @@
+import base64
+import bisect
+import gzip
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:  # optional fast encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+ENCODER = "orjson" if orjson is not None else "json"
+
+# Page sizes for paginated lists (timelines, versions)
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+
+def dumps(obj):
+    """
+    Serialize a result payload to JSON bytes.
+    
+    Uses orjson when it is installed (several times faster on large
+    timelines) and falls back to the standard library encoder otherwise.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def supported_encodings():
+    """Content codings this server can produce, in order of preference."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Pick a content coding from an Accept-Encoding header.
+    
+    Codings are ranked by their q-value; ties are broken by server
+    preference (brotli before gzip). A q-value of 0 refuses a coding.
+    
+    Args:
+        accept_encoding: Raw Accept-Encoding header value (may be empty)
+    
+    Returns:
+        str: "br", "gzip", or None for an uncompressed response.
+    """
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+    
+    best = None
+    for coding in supported_encodings():
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > 0 and (best is None or q > best[0]):
+            best = (q, coding)
+    return best[1] if best else None
+
+
+def compress(body, encoding):
+    """Compress a response body with the negotiated content coding."""
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def parse_fields(value):
+    """Split a comma-separated ?fields= parameter into dotted paths."""
+    if not value:
+        return None
+    return [field.strip() for field in value.split(",") if field.strip()]
+
+
+def select_fields(obj, fields):
+    """
+    Keep only the requested fields of a result payload.
+    
+    Fields are dotted paths ("benchmarks.2pl.duration"). Lists are mapped
+    element-wise, so "timeline.action" keeps only the action of every
+    event. Unknown fields are ignored.
+    
+    Args:
+        obj: Result dict (or list of dicts)
+        fields: List of dotted paths, or None to keep everything
+    
+    Returns:
+        The pruned copy of obj.
+    """
+    if not fields:
+        return obj
+    
+    tree = {}
+    for field in fields:
+        node = tree
+        for part in field.split("."):
+            node = node.setdefault(part, {})
+    return _prune(obj, tree)
+
+
+def _prune(obj, tree):
+    if not tree:
+        return obj
+    if isinstance(obj, list):
+        return [_prune(item, tree) for item in obj]
+    if not isinstance(obj, dict):
+        return obj
+    return {key: _prune(obj[key], subtree) for key, subtree in tree.items() if key in obj}
+
+
+def expand_paths(obj, pattern):
+    """
+    Resolve a dotted path pattern against a payload.
+    
+    A "*" segment matches every key of a dict, e.g. "benchmarks.*.timeline".
+    
+    Returns:
+        list: (path, value) pairs for every existing match.
+    """
+    matches = [((), obj)]
+    for part in pattern.split("."):
+        expanded = []
+        for path, node in matches:
+            if not isinstance(node, dict):
+                continue
+            keys = list(node) if part == "*" else [part] if part in node else []
+            expanded.extend((path + (key,), node[key]) for key in keys)
+        matches = expanded
+    return [(".".join(path), value) for path, value in matches if isinstance(value, list)]
+
+
+def encode_cursor(state):
+    """Encode pagination state as an opaque URL-safe token."""
+    raw = json.dumps(state, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """
+    Decode a token produced by encode_cursor.
+    
+    Raises:
+        ValueError: If the token is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        state = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(state, dict) or "run" not in state or "path" not in state:
+        raise ValueError("Invalid cursor: missing run or path")
+    return state
+
+
+def page_size(value):
+    """Clamp a ?limit= parameter to 1..MAX_PAGE_SIZE (DEFAULT_PAGE_SIZE if absent)."""
+    if value in (None, ""):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid limit: {value}")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def paginate(items, limit, after=None, key=None):
+    """
+    Return one page of a list.
+    
+    With a key, pagination is keyset-based: items must be sorted by that
+    field and the page starts after the item whose key equals `after`, so
+    a cursor stays valid even if earlier items are added or removed. Without
+    a key, `after` is the number of items already returned.
+    
+    Args:
+        items: Full list
+        limit: Page size
+        after: Cursor position from the previous page (None for the first)
+        key: Field to keyset-paginate on, e.g. "version_id"
+    
+    Returns:
+        tuple: (page, next_after), next_after being None on the last page.
+    """
+    if key is not None:
+        start = 0 if after is None else bisect.bisect_right(items, after, key=lambda item: item[key])
+    else:
+        start = after or 0
+    
+    page = items[start:start + limit]
+    if start + limit >= len(items):
+        return page, None
+    return page, page[-1][key] if key is not None else start + limit
+
+
+class ResultStore:
+    """
+    Bounded in-memory cache of recent simulation results.
+    
+    Paginated responses only carry the first page of every long list; the
+    full result stays here under a run id so that later pages can be served
+    from the same run instead of re-running the simulation. The oldest runs
+    are evicted once max_runs is exceeded.
+    
+    Each process has its own cache, so this only suits a single-process
+    server; coordination.SQLiteResultStore shares the runs between worker
+    processes.
+    """
+    
+    def __init__(self, max_runs=8):
+        self.max_runs = max_runs
+        self.runs = OrderedDict()
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+    
+    def put(self, results):
+        """Store a result and return its run id."""
+        with self.lock:
+            run_id = f"{int(time.time())}-{next(self.ids)}"
+            self.runs[run_id] = results
+            while len(self.runs) > self.max_runs:
+                self.runs.popitem(last=False)
+        return run_id
+    
+    def get(self, run_id):
+        """Return a stored result, or None if it was evicted."""
+        with self.lock:
+            return self.runs.get(run_id)
+
+
+def paginate_results(results, run_id, paged, limit, fields=None):
+    """
+    Build a response payload holding the first page of every long list.
+    
+    The stored result is left untouched: containers along the paged paths
+    are copied before their lists are replaced by a page. Pages are cut
+    from the unpruned lists, so the keyset field is available for the
+    cursor even when the field selection leaves it out.
+    
+    Args:
+        results: Full result dict, as kept in the ResultStore
+        run_id: Id under which the full result is stored
+        paged: {path pattern: keyset field or None}, e.g.
+               {"timeline": None, "versions": "version_id"}
+        limit: Page size
+        fields: Optional dotted paths to keep (see select_fields)
+    
+    Returns:
+        dict: The payload with a "pagination" entry per paged list holding
+        its total length and the cursor of the next page.
+    """
+    payload = dict(select_fields(results, fields))
+    pagination = {}
+    for pattern, key in paged.items():
+        for path, _ in expand_paths(payload, pattern):
+            items = _lookup(results, path)
+            page, after = paginate(items, limit, key=key)
+            # Field selections below the list carry over to its later pages
+            item_fields = [field[len(path) + 1:] for field in fields or () if field.startswith(path + ".")]
+            _assign(payload, path, select_fields(page, item_fields))
+            pagination[path] = {
+                "total": len(items),
+                "limit": limit,
+                "next_cursor": None if after is None else encode_cursor({
+                    "run": run_id, "path": path, "key": key, "after": after,
+                    "fields": item_fields or None
+                })
+            }
+    payload["pagination"] = pagination
+    return payload
+
+
+def next_page(store, token, limit, fields=None):
+    """
+    Serve the page of a stored result that a cursor points to.
+    
+    Args:
+        store: ResultStore holding the run
+        token: Cursor from a previous response's pagination entry
+        limit: Page size
+        fields: Dotted paths to keep on each item (defaults to the
+                selection the cursor was created with)
+    
+    Raises:
+        ValueError: If the cursor is malformed.
+        KeyError: If the run has been evicted or the path does not exist.
+    
+    Returns:
+        dict: {"items", "total", "limit", "next_cursor"}
+    """
+    state = decode_cursor(token)
+    results = store.get(state["run"])
+    if results is None:
+        raise KeyError(f"Run {state['run']} is no longer available")
+    
+    items = _lookup(results, state["path"])
+    page, after = paginate(items, limit, state.get("after"), state.get("key"))
+    return {
+        "items": select_fields(page, fields or state.get("fields")),
+        "total": len(items),
+        "limit": limit,
+        "next_cursor": None if after is None else encode_cursor(dict(state, after=after))
+    }
+
+
+def _lookup(obj, path):
+    """Get a dotted path, raising KeyError if it does not exist."""
+    for part in path.split("."):
+        if not isinstance(obj, dict) or part not in obj:
+            raise KeyError(f"Unknown result path: {path}")
+        obj = obj[part]
+    return obj
+
+
+def _assign(obj, path, value):
+    """Set a dotted path, copying the dicts on the way down."""
+    parts = path.split(".")
+    for part in parts[:-1]:
+        obj[part] = dict(obj[part])
+        obj = obj[part]
+    obj[parts[-1]] = value
+
+
+def render(payload, accept_encoding=""):
+    """
+    Serialize and, if worthwhile, compress a response payload.
+    
+    Args:
+        payload: JSON-serializable result
+        accept_encoding: The request's Accept-Encoding header
+    
+    Returns:
+        tuple: (body bytes, headers dict). The headers include the content
+        coding plus the serialization time and uncompressed size, so the
+        cost of large results is visible to clients.
+    """
+    start = time.perf_counter()
+    body = dumps(payload)
+    serialize_time = time.perf_counter() - start
+    
+    headers = {
+        "Content-Type": "application/json",
+        "Vary": "Accept-Encoding",
+        "X-JSON-Encoder": ENCODER,
+        "X-Uncompressed-Length": str(len(body)),
+        "X-Serialization-Time": f"{serialize_time:.6f}"
+    }
+    
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding:
+        start = time.perf_counter()
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+        headers["X-Compression-Time"] = f"{time.perf_counter() - start:.6f}"
+    
+    return body, headers
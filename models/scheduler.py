@@ -0,0 +1,525 @@
+import time
+import datetime
+from models.event_log import EventLog
+from models.histogram import LatencyHistogram, summarize
+
+# Timeline events of the interleaved scheduler
+TXN_STARTED = EventLog.define("Transaction {} started ({})")
+TXN_COMMITTED = EventLog.define("Transaction {} committed", commit=True)
+TXN_ABORTED = EventLog.define("Transaction {} {}", abort=True)
+TXN_CASCADE_ABORTED = EventLog.define("Transaction {} aborted in cascade (read uncommitted data of {})", abort=True)
+TXN_RESTARTED = EventLog.define("Transaction {} restarted (attempt {})")
+DEADLOCK_DETECTED = EventLog.define("Deadlock detected: {1}; aborting {0}", conflict=True)
+GROUP_FLUSHED = EventLog.define("Group commit: flushed {} commit records (durable LSN {})")
+COMMIT_WAITS = EventLog.define("{} - Commit waits for {}")
+
+# Operation types that touch data (as opposed to "think" and "abort");
+# range reads and inserts are only understood by the 2PL engine
+DATA_OPS = ("read", "write", "range_read", "insert")
+
+
+class ProtocolEngine:
+    """
+    Base class for concurrency-control engines driven by InterleavedScheduler.
+    
+    An engine decides, operation by operation, whether a transaction may
+    proceed. Every hook returns a status string:
+    
+    - "ok": the step completed
+    - "wait": the step is blocked and will be retried on a later tick
+    - "abort": the transaction must be rolled back and restarted
+    """
+    
+    name = "engine"
+    
+    # Data operation types the engine's execute() understands
+    supported_ops = ("read", "write")
+    
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.timeline = None
+        self.wal = None  # set by the scheduler when commits go through a WAL
+        self.latency = {}  # engine-specific latency histograms, e.g. validation
+    
+    def log(self, txn, code, *args, **extra):
+        """
+        Record an event in the run's EventLog, if one is being kept.
+        
+        The event's template is filled with the transaction name first,
+        then args.
+        """
+        if self.timeline is None:
+            return
+        self.timeline.append(code, txn["id"], txn["name"], *args, **extra)
+    
+    def persist(self):
+        """
+        Commit the engine's changes to SQLite.
+        
+        With a write-ahead log attached, the scheduler commits SQLite once
+        per flushed group instead; the data is durable through that commit,
+        as the log only holds commit markers.
+        """
+        if self.wal is None:
+            self.cursor.connection.commit()
+    
+    def begin(self, txn):
+        """Start a transaction."""
+        return "ok"
+    
+    def execute(self, txn, op):
+        """Execute one read or write operation."""
+        raise NotImplementedError
+    
+    def end_of_ops(self, txn):
+        """Called once after the transaction's last read or write."""
+    
+    def commit(self, txn):
+        """Try to commit a transaction."""
+        return "ok"
+    
+    def abort(self, txn):
+        """
+        Roll back a transaction.
+        
+        Returns:
+            list: Transactions that had to be aborted in cascade.
+        """
+        return []
+    
+    def blockers(self, txn):
+        """Transactions the (waiting) transaction is waiting for."""
+        return set()
+    
+    def stats(self):
+        """Engine-specific statistics to merge into the run results."""
+        return {}
+
+
+class UndoLogEngine(ProtocolEngine):
+    """
+    ProtocolEngine that writes to the items table in place.
+    
+    Before-images are kept in a per-transaction undo log. Reads of another
+    transaction's uncommitted write are tracked as commit dependencies: the
+    reader may only commit after the writer has (recoverability), and if the
+    writer aborts, the reader is aborted in cascade.
+    """
+    
+    def __init__(self, cursor):
+        super().__init__(cursor)
+        self.undo = {}  # txn_id -> [(item, before-image)]
+        self.uncommitted_writers = {}  # item -> uncommitted writer txn ids, oldest first
+        self.depends_on = {}  # txn_id -> writers whose uncommitted data it used
+        self.waiting_for = {}  # txn_id -> txn ids blocking it
+    
+    def _start(self, txn):
+        self.undo[txn["id"]] = []
+        self.depends_on[txn["id"]] = set()
+    
+    def _read_value(self, txn, item):
+        """Read the current (possibly uncommitted) value of an item."""
+        writers = self.uncommitted_writers.get(item)
+        if writers and writers[-1] != txn["id"]:
+            self.depends_on[txn["id"]].add(writers[-1])
+        self.cursor.execute("SELECT value FROM items WHERE name = ?", (item,))
+        return self.cursor.fetchone()[0]
+    
+    def _write_value(self, txn, item, before, value):
+        """Write an item in place, remembering its before-image."""
+        self.cursor.execute("UPDATE items SET value = ? WHERE name = ?", (value, item))
+        self.undo[txn["id"]].append((item, before))
+        writers = self.uncommitted_writers.setdefault(item, [])
+        if txn["id"] not in writers:
+            writers.append(txn["id"])
+    
+    def _insert_value(self, txn, item, value):
+        """Insert a new item; rolling back deletes it again."""
+        self.cursor.execute("INSERT INTO items (name, value) VALUES (?, ?)", (item, value))
+        self.undo[txn["id"]].append((item, None))
+        writers = self.uncommitted_writers.setdefault(item, [])
+        if txn["id"] not in writers:
+            writers.append(txn["id"])
+    
+    def _pending_dependencies(self, txn):
+        """Writers this transaction read from that have not committed yet."""
+        return {writer for writer in self.depends_on[txn["id"]] if writer in self.undo}
+    
+    def commit(self, txn):
+        # A transaction that used uncommitted data may only commit after its
+        # writers did (recoverability)
+        pending = self._pending_dependencies(txn)
+        if pending:
+            if self.waiting_for.get(txn["id"]) != pending:
+                self.log(txn, COMMIT_WAITS, ", ".join(f"T{writer}" for writer in sorted(pending)))
+            self.waiting_for[txn["id"]] = pending
+            return "wait"
+        
+        self._forget(txn["id"])
+        self.persist()
+        return "ok"
+    
+    def abort(self, txn):
+        cascaded = []
+        
+        # Transactions that used this transaction's uncommitted writes go first,
+        # so before-images are restored newest to oldest
+        for other_id, writers in list(self.depends_on.items()):
+            if txn["id"] in writers and other_id in self.undo:
+                cascaded.extend(self.abort({"id": other_id, "name": f"T{other_id}"}))
+                cascaded.append(other_id)
+        
+        for item, before in reversed(self.undo.get(txn["id"], [])):
+            if before is None:
+                # Inserted by this transaction
+                self.cursor.execute("DELETE FROM items WHERE name = ?", (item,))
+            else:
+                self.cursor.execute("UPDATE items SET value = ? WHERE name = ?", (before, item))
+        
+        self._forget(txn["id"])
+        self.persist()
+        return cascaded
+    
+    def _forget(self, txn_id):
+        self.undo.pop(txn_id, None)
+        self.depends_on.pop(txn_id, None)
+        self.waiting_for.pop(txn_id, None)
+        for item in list(self.uncommitted_writers):
+            writers = self.uncommitted_writers[item]
+            if txn_id in writers:
+                writers.remove(txn_id)
+            if not writers:
+                del self.uncommitted_writers[item]
+    
+    def blockers(self, txn):
+        return self.waiting_for.get(txn["id"], set())
+
+
+class InterleavedScheduler:
+    """
+    Runs a transaction set concurrently against a ProtocolEngine.
+    
+    Up to `concurrency` transactions are active at a time. Each tick, every
+    active transaction attempts its next step (begin, one operation, or
+    commit) in round-robin order, so operations of different transactions
+    interleave the way they would on concurrent connections. Blocked steps
+    are retried on the next tick; a cycle in the wait-for graph is resolved
+    by aborting its youngest transaction. Aborted transactions restart after
+    an exponential backoff (in ticks), except for voluntary aborts.
+    
+    think_time adds a real delay after every commit, matching the pause the
+    sequential simulations leave between transactions. Latencies and
+    blocking time are measured on a clock that excludes these pauses, so
+    they only reflect time spent in the protocol.
+    
+    Transactions are pulled from the input one at a time as slots free up,
+    so a generator (e.g. a TraceReplayer streaming a trace file) is never
+    materialized. With a TraceRecorder, every transaction is recorded as it
+    is first admitted.
+    
+    With a WriteAheadLog, a transaction that passed the engine's commit
+    writes a commit record and is acknowledged only once the log has been
+    flushed past it; until then it keeps its slot. The log is flushed
+    (group commit) when its group is full, its window expired, or every
+    active transaction is waiting for the flush, and SQLite is committed
+    once per flushed group. Commit records carry no redo data (items or
+    after-images): the log measures the cost of forcing commits one by
+    one or in groups, while durability of the data itself comes from the
+    per-group SQLite commit.
+    """
+    
+    def __init__(self, engine, concurrency=4, max_restarts=5, timeline=None, think_time=0, wal=None, trace=None):
+        self.engine = engine
+        self.trace = trace
+        self.wal = wal
+        engine.wal = wal
+        self.think_time = think_time
+        self.paused = 0.0  # total think_time slept so far
+        self.concurrency = concurrency
+        self.max_restarts = max_restarts
+        self.timeline = timeline
+        engine.timeline = timeline
+        
+        self.tick = 0
+        self.sequence = 0
+        self.active = {}  # txn_id -> transaction state, oldest first
+        self.metrics = {
+            "committed": 0,
+            "aborted": 0,
+            "restarts": 0,
+            "conflicts": 0,
+            "deadlocks": 0,
+            "cascading_aborts": 0,
+            "blocked_ticks": 0,
+            "blocking_time": 0.0
+        }
+        # Latency histograms: whole transactions (first admission to commit,
+        # restarts included), single operations (first attempt to completion),
+        # lock waits (one sample per blocked episode) and commits
+        self.latency = {
+            "transaction": LatencyHistogram(),
+            "operation": LatencyHistogram(),
+            "lock_wait": LatencyHistogram(),
+            "commit": LatencyHistogram()
+        }
+    
+    def _get_timestamp(self):
+        """Generate a timestamp string"""
+        return datetime.datetime.now().isoformat()
+    
+    def _clock(self):
+        """Monotonic time in seconds, not counting think_time pauses."""
+        return time.perf_counter() - self.paused
+    
+    def _log(self, txn, code, *args):
+        if self.timeline is not None:
+            self.timeline.append(code, txn["id"], txn["name"], *args)
+    
+    def _admit(self, txn, restarts=0, started_at=None):
+        self.sequence += 1
+        self.active[txn["id"]] = {
+            "txn": txn,
+            "phase": "begin",
+            "pc": 0,
+            "sequence": self.sequence,
+            "restarts": restarts,
+            "resume_at": self.tick,
+            "wait_since": None,
+            "started_at": started_at or self._clock(),
+            "op_start": None
+        }
+    
+    def run(self, transactions):
+        """
+        Execute all transactions to completion.
+        
+        Returns:
+            dict: Commit/abort counts, blocking, deadlock and cascade metrics,
+            duration and throughput.
+        """
+        pending = iter(transactions)
+        txn = next(pending, None)
+        start_time = time.time()
+        
+        while txn is not None or self.active:
+            while txn is not None and len(self.active) < self.concurrency:
+                self._admit(txn)
+                self._log(txn, TXN_STARTED, self.engine.name)
+                if self.trace is not None:
+                    self.trace.record_transaction(txn)
+                txn = next(pending, None)
+            
+            self.tick += 1
+            waiting = []
+            
+            for txn_id in list(self.active):
+                state = self.active.get(txn_id)
+                if state is None or state["resume_at"] > self.tick:
+                    continue
+                
+                status = self._step(state)
+                
+                if status == "wait":
+                    if state["wait_since"] is None:
+                        state["wait_since"] = self._clock()
+                        self.metrics["conflicts"] += 1
+                    self.metrics["blocked_ticks"] += 1
+                    waiting.append(txn_id)
+                    continue
+                
+                if state["wait_since"] is not None:
+                    self._end_wait(state)
+                
+                if status == "abort":
+                    self._abort(state, "aborted by the protocol", restart=True)
+            
+            if waiting:
+                self._resolve_deadlock([txn_id for txn_id in waiting if txn_id in self.active])
+            
+            if self.wal is not None:
+                self._group_commit()
+        
+        if self.wal is not None:
+            self.wal.flush()
+            self.engine.cursor.connection.commit()
+        
+        duration = time.time() - start_time
+        self.metrics["duration"] = duration
+        self.metrics["ticks"] = self.tick
+        self.metrics["throughput"] = self.metrics["committed"] / duration if duration > 0 else 0
+        self.metrics["commit_latency"] = self.latency["commit"].summary()
+        self.metrics["latency"] = summarize(dict(self.latency, **self.engine.latency))
+        self.metrics.update(self.engine.stats())
+        if self.wal is not None:
+            self.metrics.update(self.wal.stats())
+        return self.metrics
+    
+    def _step(self, state):
+        txn = state["txn"]
+        ops = txn["ops"]
+        
+        if state["phase"] == "begin":
+            status = self.engine.begin(txn)
+            if status == "ok":
+                state["phase"] = "ops" if ops else "commit"
+            return status
+        
+        if state["phase"] == "ops":
+            op = ops[state["pc"]]
+            
+            if op["type"] == "abort":
+                self._abort(state, "rolled back by the application", restart=False)
+                return "ok"
+            
+            if op["type"] == "think":
+                # Application work between statements: idle without touching data
+                state.setdefault("think_until", self.tick + op["ticks"])
+                if self.tick < state["think_until"]:
+                    return "ok"
+                del state["think_until"]
+                status = "ok"
+            else:
+                if op["type"] not in self.engine.supported_ops:
+                    raise ValueError(f"{self.engine.name} does not support {op['type']} operations")
+                if state["op_start"] is None:
+                    state["op_start"] = self._clock()
+                status = self.engine.execute(txn, op)
+                if status == "ok":
+                    self.latency["operation"].record(self._clock() - state["op_start"])
+                    state["op_start"] = None
+            
+            if status == "ok":
+                state["pc"] += 1
+                if op["type"] in DATA_OPS and not any(
+                        later["type"] in DATA_OPS for later in ops[state["pc"]:]):
+                    self.engine.end_of_ops(txn)
+                if state["pc"] == len(ops):
+                    state["phase"] = "commit"
+            return status
+        
+        if state["phase"] == "durable":
+            # Already committed by the engine; waiting for the group flush
+            return "ok"
+        
+        commit_start = self._clock()
+        status = self.engine.commit(txn)
+        if status != "ok":
+            return status
+        
+        if self.wal is None:
+            self._finish_commit(state, commit_start)
+            return status
+        
+        state["phase"] = "durable"
+        state["commit_start"] = commit_start
+        state["lsn"] = self.wal.append({"txn_id": txn["id"], "name": txn["name"], "time": self._get_timestamp()})
+        self._group_commit()
+        return status
+    
+    def _finish_commit(self, state, commit_start):
+        """Acknowledge a commit to the client."""
+        txn = state["txn"]
+        del self.active[txn["id"]]
+        self.metrics["committed"] += 1
+        now = self._clock()
+        self.latency["commit"].record(now - commit_start)
+        self.latency["transaction"].record(now - state["started_at"])
+        self._log(txn, TXN_COMMITTED)
+        if self.think_time:
+            pause_start = time.perf_counter()
+            time.sleep(self.think_time)
+            self.paused += time.perf_counter() - pause_start
+    
+    def _group_commit(self):
+        """Flush the log when the group is ready, then acknowledge its transactions."""
+        idle = all(state["phase"] == "durable" for state in self.active.values())
+        if not (self.wal.should_flush() or (self.wal.buffer and idle)):
+            return
+        
+        group = self.wal.flush()
+        self.engine.cursor.connection.commit()
+        if self.timeline is not None:
+            self.timeline.append(GROUP_FLUSHED, None, group, self.wal.durable_lsn)
+        
+        for state in list(self.active.values()):
+            if state["phase"] == "durable" and self.wal.is_durable(state["lsn"]):
+                self._finish_commit(state, state["commit_start"])
+    
+    def _abort(self, state, reason, restart):
+        """Abort a transaction, restart it if allowed, and restart its cascade victims."""
+        txn = state["txn"]
+        cascaded = self.engine.abort(txn)
+        self._log(txn, TXN_ABORTED, reason)
+        self._finish_abort(state, restart)
+        
+        for victim_id in cascaded:
+            victim = self.active.get(victim_id)
+            if victim is None:
+                continue
+            self.metrics["cascading_aborts"] += 1
+            self._log(victim["txn"], TXN_CASCADE_ABORTED, txn["name"])
+            self._finish_abort(victim, restart=True)
+    
+    def _finish_abort(self, state, restart):
+        txn = state["txn"]
+        del self.active[txn["id"]]
+        
+        if state["wait_since"] is not None:
+            self._end_wait(state)
+        
+        if not restart or state["restarts"] >= self.max_restarts:
+            self.metrics["aborted"] += 1
+            return
+        
+        self.metrics["restarts"] += 1
+        self._admit(txn, state["restarts"] + 1, state["started_at"])
+        # Back off exponentially (in ticks) before running again
+        self.active[txn["id"]]["resume_at"] = self.tick + 2 ** state["restarts"]
+        self._log(txn, TXN_RESTARTED, state["restarts"] + 2)
+    
+    def _end_wait(self, state):
+        """Account for a finished blocked episode (granted, or aborted while waiting)."""
+        waited = self._clock() - state["wait_since"]
+        self.metrics["blocking_time"] += waited
+        self.latency["lock_wait"].record(waited)
+        state["wait_since"] = None
+    
+    def _resolve_deadlock(self, waiting):
+        """Abort the youngest transaction of a cycle in the wait-for graph."""
+        graph = {txn_id: self.engine.blockers(self.active[txn_id]["txn"]) for txn_id in waiting}
+        cycle = self._find_cycle(graph)
+        if not cycle:
+            return
+        
+        self.metrics["deadlocks"] += 1
+        victim_id = max(cycle, key=lambda txn_id: self.active[txn_id]["sequence"])
+        victim = self.active[victim_id]
+        names = " → ".join(self.active[txn_id]["txn"]["name"] for txn_id in cycle)
+        self._log(victim["txn"], DEADLOCK_DETECTED, names)
+        self._abort(victim, "aborted as deadlock victim", restart=True)
+    
+    @staticmethod
+    def _find_cycle(graph):
+        """Return one cycle of a wait-for graph as a list of txn ids, or None."""
+        state = {}
+        for root in graph:
+            if root in state:
+                continue
+            state[root] = "open"
+            path = [root]
+            stack = [iter(graph[root])]
+            while stack:
+                for successor in stack[-1]:
+                    if successor not in graph:
+                        continue
+                    if state.get(successor) == "open":
+                        return path[path.index(successor):]
+                    if successor not in state:
+                        state[successor] = "open"
+                        path.append(successor)
+                        stack.append(iter(graph[successor]))
+                        break
+                else:
+                    state[path.pop()] = "done"
+                    stack.pop()
+        return None
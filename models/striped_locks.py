@@ -0,0 +1,261 @@
+import random
+import threading
+import time
+from collections import deque
+
+
+class LockShard:
+    """One stripe of the lock table: its own latch, lock entries and wait queues."""
+    
+    __slots__ = ("latch", "table", "queues", "latch_acquires", "latch_contended", "waits", "timeouts")
+    
+    def __init__(self):
+        self.latch = threading.Lock()
+        self.table = {}  # resource -> {txn_id: mode}
+        self.queues = {}  # resource -> deque of waiting LockRequests, FIFO
+        self.latch_acquires = 0
+        self.latch_contended = 0
+        self.waits = 0
+        self.timeouts = 0
+    
+    def enter(self):
+        """Take the latch, counting how often another thread held it."""
+        if not self.latch.acquire(blocking=False):
+            self.latch.acquire()
+            self.latch_contended += 1
+        self.latch_acquires += 1
+
+
+class LockRequest:
+    """A queued lock request; the releasing thread grants it and sets the event."""
+    
+    __slots__ = ("txn_id", "mode", "granted", "event")
+    
+    def __init__(self, txn_id, mode):
+        self.txn_id = txn_id
+        self.mode = mode
+        self.granted = False
+        self.event = threading.Event()
+
+
+class StripedLockManager:
+    """
+    Row lock table partitioned into hash-striped shards for threaded use.
+    
+    A resource lives in shard hash(resource) % shards. Each shard has its
+    own latch, so threads locking resources in different shards never
+    serialize on a common mutex; with shards=1 this is the single
+    dict-plus-mutex lock table of the sequential simulations.
+    
+    Locks are S or X (S can be upgraded to X). An incompatible request waits
+    in the resource's FIFO queue, outside the latch, until a release grants
+    it or its timeout expires; a request also queues behind earlier waiters
+    so writers are not starved. Deadlocks between transactions are broken by
+    the timeout: acquire() returns False and the caller aborts.
+    
+    A transaction's locks are acquired and released by the thread running
+    it, so its held-lock list needs no latch. release_all() never holds two
+    shard latches at once and visits shards in ascending order, so releases
+    spanning many shards cannot deadlock with each other or with acquires.
+    """
+    
+    COMPATIBLE = {"S": {"S"}, "X": set()}
+    
+    def __init__(self, shards=16):
+        self.shards = [LockShard() for _ in range(shards)]
+        self.held = {}  # txn_id -> {resource: None}, touched only by the owning thread
+    
+    def shard_index(self, resource):
+        return hash(resource) % len(self.shards)
+    
+    def _compatible(self, holders, txn_id, mode):
+        return all(
+            other_mode in self.COMPATIBLE[mode]
+            for other_txn, other_mode in holders.items() if other_txn != txn_id
+        )
+    
+    def acquire(self, txn_id, resource, mode, timeout=1.0):
+        """
+        Lock a resource in S or X mode, waiting up to timeout seconds.
+        
+        Args:
+            txn_id: Requesting transaction
+            resource: Any hashable resource id
+            mode: "S" or "X"
+            timeout: Seconds to wait (0 for no-wait, None to wait forever)
+        
+        Returns:
+            bool: True if granted, False if the wait timed out.
+        """
+        shard = self.shards[self.shard_index(resource)]
+        shard.enter()
+        try:
+            holders = shard.table.setdefault(resource, {})
+            held = holders.get(txn_id)
+            if held == mode or held == "X":
+                return True
+            
+            # Grant at once only if compatible and nobody is queued ahead
+            if not shard.queues.get(resource) and self._compatible(holders, txn_id, mode):
+                holders[txn_id] = mode
+                self.held.setdefault(txn_id, {})[resource] = None
+                return True
+            
+            if timeout == 0:
+                if not holders:
+                    del shard.table[resource]
+                return False
+            
+            request = LockRequest(txn_id, mode)
+            shard.queues.setdefault(resource, deque()).append(request)
+            shard.waits += 1
+        finally:
+            shard.latch.release()
+        
+        if request.event.wait(timeout):
+            self.held.setdefault(txn_id, {})[resource] = None
+            return True
+        
+        # Timed out: withdraw the request unless a release granted it meanwhile
+        shard.enter()
+        try:
+            if request.granted:
+                self.held.setdefault(txn_id, {})[resource] = None
+                return True
+            shard.queues[resource].remove(request)
+            self._grant_waiters(shard, resource)
+            shard.timeouts += 1
+            return False
+        finally:
+            shard.latch.release()
+    
+    def _grant_waiters(self, shard, resource):
+        """Grant queued requests from the head of a resource's queue (latch held)."""
+        queue = shard.queues.get(resource)
+        holders = shard.table.setdefault(resource, {})
+        while queue and self._compatible(holders, queue[0].txn_id, queue[0].mode):
+            request = queue.popleft()
+            holders[request.txn_id] = request.mode
+            request.granted = True
+            request.event.set()
+        if queue is not None and not queue:
+            del shard.queues[resource]
+        if not holders and resource not in shard.queues:
+            del shard.table[resource]
+    
+    def release_all(self, txn_id):
+        """
+        Release every lock of a transaction and grant the waiters behind them.
+        
+        Returns:
+            int: Number of locks released.
+        """
+        resources = self.held.pop(txn_id, {})
+        by_shard = {}
+        for resource in resources:
+            by_shard.setdefault(self.shard_index(resource), []).append(resource)
+        
+        # One latch at a time, in shard order
+        for index in sorted(by_shard):
+            shard = self.shards[index]
+            shard.enter()
+            try:
+                for resource in by_shard[index]:
+                    shard.table.get(resource, {}).pop(txn_id, None)
+                    self._grant_waiters(shard, resource)
+            finally:
+                shard.latch.release()
+        return len(resources)
+    
+    def stats(self):
+        """Latch traffic and lock-wait counters."""
+        acquires = sum(shard.latch_acquires for shard in self.shards)
+        contended = sum(shard.latch_contended for shard in self.shards)
+        return {
+            "shards": len(self.shards),
+            "latch_acquires": acquires,
+            "latch_contended": contended,
+            "latch_contention": contended / acquires if acquires else 0,
+            "lock_waits": sum(shard.waits for shard in self.shards),
+            "lock_timeouts": sum(shard.timeouts for shard in self.shards),
+            "lock_table_entries": sum(len(shard.table) for shard in self.shards)
+        }
+
+
+def run_lock_worker(manager, worker_id, txns, locks_per_txn, key_space, write_ratio, seed):
+    """
+    Run lock-only transactions on one thread: take locks_per_txn row locks
+    in key order (so transactions cannot deadlock), then release them all.
+    
+    Returns:
+        dict: Locks acquired and transactions that timed out.
+    """
+    rng = random.Random(seed)
+    acquired = timed_out = 0
+    for n in range(txns):
+        txn_id = worker_id * txns + n + 1
+        keys = sorted(rng.sample(range(key_space), locks_per_txn))
+        for key in keys:
+            mode = "X" if rng.random() < write_ratio else "S"
+            if not manager.acquire(txn_id, ("items", key), mode):
+                timed_out += 1
+                break
+            acquired += 1
+        manager.release_all(txn_id)
+    return {"acquired": acquired, "timed_out": timed_out}
+
+
+def benchmark_lock_table(shard_counts=(1, 4, 16, 64), thread_counts=(1, 2, 4, 8), txns_per_thread=2000,
+                         locks_per_txn=8, key_space=10000, write_ratio=0.2, seed=41):
+    """
+    Measure lock-acquire throughput against shard and thread count.
+    
+    Every combination runs the same per-thread workload on a fresh
+    StripedLockManager; threads start together behind a barrier.
+    
+    Returns:
+        dict: One row per (shards, threads) with acquires per second and
+        latch contention, plus the speedup of each shard count over a
+        single latch at the same thread count.
+    """
+    rows = []
+    for shards in shard_counts:
+        for threads in thread_counts:
+            manager = StripedLockManager(shards)
+            results = [None] * threads
+            barrier = threading.Barrier(threads + 1)
+            
+            def worker(worker_id):
+                barrier.wait()
+                results[worker_id] = run_lock_worker(
+                    manager, worker_id, txns_per_thread, locks_per_txn, key_space,
+                    write_ratio, seed * 1000 + worker_id
+                )
+            
+            pool = [threading.Thread(target=worker, args=(worker_id,)) for worker_id in range(threads)]
+            for thread in pool:
+                thread.start()
+            barrier.wait()
+            start = time.perf_counter()
+            for thread in pool:
+                thread.join()
+            duration = time.perf_counter() - start
+            
+            acquired = sum(result["acquired"] for result in results)
+            row = {"shards": shards, "threads": threads, "duration": duration, "acquired": acquired,
+                   "timed_out": sum(result["timed_out"] for result in results),
+                   "acquires_per_second": acquired / duration if duration > 0 else 0}
+            row.update(manager.stats())
+            rows.append(row)
+    
+    baseline = {row["threads"]: row["acquires_per_second"] for row in rows if row["shards"] == min(shard_counts)}
+    for row in rows:
+        row["speedup_vs_fewest_shards"] = row["acquires_per_second"] / baseline[row["threads"]] if baseline[row["threads"]] else 0
+    
+    return {
+        "explanation": "Lock-acquire throughput of the striped lock table by shard and thread count",
+        "txns_per_thread": txns_per_thread,
+        "locks_per_txn": locks_per_txn,
+        "key_space": key_space,
+        "rows": rows
+    }
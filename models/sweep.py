@@ -0,0 +1,217 @@
+import os
+import sqlite3
+import tempfile
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from models.bulk_load import create_schema
+from models.hybrid import HybridEngine
+from models.locking_engine import TwoPhaseLockingEngine
+from models.rendering import render_service
+from models.occ import OptimisticEngine
+from models.scheduler import InterleavedScheduler
+from models.snapshot_isolation import SnapshotIsolationEngine
+from models.timestamp_ordering import TimestampOrderingEngine
+from models.workload import generate_workload, item_name
+
+
+# Engines a sweep can run, by protocol name
+ENGINES = {
+    "2pl-basic": lambda cursor: TwoPhaseLockingEngine(cursor, "basic"),
+    "2pl-strict": lambda cursor: TwoPhaseLockingEngine(cursor, "strict"),
+    "2pl-rigorous": lambda cursor: TwoPhaseLockingEngine(cursor, "rigorous"),
+    "2pl-conservative": lambda cursor: TwoPhaseLockingEngine(cursor, "conservative"),
+    "occ": OptimisticEngine,
+    "to": TimestampOrderingEngine,
+    "to-thomas": lambda cursor: TimestampOrderingEngine(cursor, thomas_write_rule=True),
+    "mvcc": SnapshotIsolationEngine,
+    "hybrid": HybridEngine
+}
+
+
+def run_sweep_point(point):
+    """
+    Run one grid point in a private, temporary database.
+    
+    This runs in a worker process, so it takes and returns plain dicts.
+    
+    Args:
+        point: Grid point with protocol, threads, key_space, skew and
+            read_ratio, plus the workload settings shared by all points
+    
+    Returns:
+        dict: The grid point with its run metrics added.
+    """
+    fd, db_path = tempfile.mkstemp(suffix=".db", dir=point.get("work_dir"))
+    os.close(fd)
+    conn = sqlite3.connect(db_path)
+    
+    try:
+        cursor = conn.cursor()
+        create_schema(cursor)
+        cursor.executemany(
+            "INSERT INTO items (name, value) VALUES (?, ?)",
+            [(item_name(key), key * 100) for key in range(1, point["key_space"] + 1)]
+        )
+        conn.commit()
+        
+        transactions = generate_workload(
+            num_txns=point["num_txns"], ops_per_txn=point["ops_per_txn"], key_space=point["key_space"],
+            skew=point["skew"], read_ratio=point["read_ratio"], think_ticks=point["think_ticks"],
+            blind_write_ratio=point["blind_write_ratio"], seed=point["seed"]
+        )
+        engine = ENGINES[point["protocol"]](cursor)
+        metrics = InterleavedScheduler(engine, concurrency=point["threads"]).run(transactions)
+    finally:
+        conn.close()
+        os.remove(db_path)
+    
+    attempts = metrics["committed"] + metrics["restarts"] + metrics["aborted"]
+    return dict(point, **{
+        "committed": metrics["committed"],
+        "aborted": metrics["aborted"],
+        "restarts": metrics["restarts"],
+        "deadlocks": metrics["deadlocks"],
+        "ticks": metrics["ticks"],
+        "duration": metrics["duration"],
+        "throughput": metrics["throughput"],
+        "committed_per_tick": metrics["committed"] / metrics["ticks"] if metrics["ticks"] else 0,
+        "abort_rate": (metrics["restarts"] + metrics["aborted"]) / attempts if attempts else 0
+    })
+
+
+class ParameterSweep:
+    """
+    Runs the protocol engines over a parameter grid on a process pool.
+    
+    The grid axes are protocol, thread count (transactions active at a
+    time), key-space size, key skew and read ratio. Every grid point is an
+    independent run in its own temporary database, so points run in
+    parallel on all cores without sharing SQLite files or locks.
+    
+    Throughput is reported per scheduler tick, which is deterministic and
+    does not depend on how busy the other workers are, and per second.
+    """
+    
+    # Workload settings shared by every grid point
+    DEFAULT_WORKLOAD = {
+        "num_txns": 40,
+        "ops_per_txn": 4,
+        "think_ticks": 2,
+        "blind_write_ratio": 0.2,
+        "seed": 35
+    }
+    
+    def __init__(self, protocols=None, threads=(1, 2, 4, 8), key_spaces=(16, 256),
+                 skews=(0.0, 0.5, 1.0, 1.5), read_ratios=(0.5, 0.9), workload=None,
+                 max_workers=None, work_dir=None):
+        for protocol in protocols or ():
+            if protocol not in ENGINES:
+                raise ValueError(f"Unknown protocol: {protocol}")
+        self.protocols = tuple(protocols or ENGINES)
+        self.threads = threads
+        self.key_spaces = key_spaces
+        self.skews = skews
+        self.read_ratios = read_ratios
+        self.workload = dict(self.DEFAULT_WORKLOAD, **(workload or {}))
+        # Worker processes (defaults to one per core)
+        self.max_workers = max_workers or os.cpu_count()
+        # Directory for the per-point databases (defaults to the system temp dir)
+        self.work_dir = work_dir
+    
+    def grid(self):
+        """All grid points, as dicts ready to send to a worker."""
+        return [
+            dict(self.workload, protocol=protocol, threads=threads, key_space=key_space,
+                 skew=skew, read_ratio=read_ratio, work_dir=self.work_dir)
+            for protocol, threads, key_space, skew, read_ratio in itertools.product(
+                self.protocols, self.threads, self.key_spaces, self.skews, self.read_ratios)
+        ]
+    
+    def run_sweep(self):
+        """
+        Run every grid point and aggregate the results.
+        
+        Returns:
+            dict: Raw points, throughput-vs-contention and abort-rate-vs-skew
+            tables and charts, the sweep's wall time and the charts' render time.
+        """
+        grid = self.grid()
+        start_time = time.time()
+        
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            chunksize = max(1, len(grid) // (self.max_workers * 4))
+            points = list(executor.map(run_sweep_point, grid, chunksize=chunksize))
+        
+        duration = time.time() - start_time
+        for point in points:
+            point.pop("work_dir", None)
+        
+        throughput = self._aggregate(points, ("threads", "key_space"), "committed_per_tick")
+        abort_rate = self._aggregate(points, ("skew",), "abort_rate")
+        
+        # Both charts render in parallel in the render service's workers
+        charts = {
+            "throughput_vs_contention": render_service().submit(self._throughput_chart(throughput)),
+            "abort_rate_vs_skew": render_service().submit(self._abort_rate_chart(abort_rate))
+        }
+        charts = {name: chart.result() for name, chart in charts.items()}
+        
+        return {
+            "explanation": "Protocol engines swept over threads, key space, skew and read ratio",
+            "grid_points": len(points),
+            "workers": self.max_workers,
+            "duration": duration,
+            "points": points,
+            "throughput_vs_contention": throughput,
+            "abort_rate_vs_skew": abort_rate,
+            "charts": {name: chart["image"] for name, chart in charts.items()},
+            "render_time": sum(chart["render_time"] for chart in charts.values())
+        }
+    
+    def _aggregate(self, points, axes, metric):
+        """
+        Average a metric per protocol over every axis not in `axes`.
+        
+        Returns:
+            dict: protocol -> "axis=value, ..." -> mean metric.
+        """
+        groups = {}
+        for point in points:
+            label = ", ".join(f"{axis}={point[axis]}" for axis in axes)
+            groups.setdefault(point["protocol"], {}).setdefault(label, []).append(point[metric])
+        
+        return {
+            protocol: {label: sum(values) / len(values) for label, values in rows.items()}
+            for protocol, rows in groups.items()
+        }
+    
+    def _throughput_chart(self, table):
+        """Plot spec: one line per protocol and key space; fewer keys means more contention."""
+        return {
+            "kind": "line",
+            "series": [
+                {"label": f"{protocol} ({key_space} keys)", "x": list(self.threads),
+                 "y": [rows[f"threads={threads}, key_space={key_space}"] for threads in self.threads]}
+                for protocol, rows in table.items()
+                for key_space in self.key_spaces
+            ],
+            "xlabel": 'Threads',
+            "ylabel": 'Committed transactions per tick',
+            "title": 'Throughput vs Contention',
+            "legend": True
+        }
+    
+    def _abort_rate_chart(self, table):
+        """Plot spec: abort rate against skew, one line per protocol."""
+        return {
+            "kind": "line",
+            "series": [
+                {"label": protocol, "x": list(self.skews), "y": [rows[f"skew={skew}"] for skew in self.skews]}
+                for protocol, rows in table.items()
+            ],
+            "xlabel": 'Zipfian skew',
+            "ylabel": 'Aborted attempts / all attempts',
+            "title": 'Abort Rate vs Skew',
+            "legend": True
+        }
@@ -0,0 +1,129 @@
+from models.event_log import EventLog
+from models.scheduler import UndoLogEngine
+from models.workload import written_value
+
+# Timeline events of the timestamp-ordering engine
+TIMESTAMP_ASSIGNED = EventLog.define("{} - Assigned timestamp {}")
+READ_REJECTED = EventLog.define("{} - Read of {} rejected: written by younger timestamp {}", conflict=True)
+WRITE_REJECTED = EventLog.define("{} - Write of {} rejected: {} by younger timestamp {}", conflict=True)
+WRITE_SKIPPED = EventLog.define("{} - Obsolete write of {} skipped (Thomas write rule)")
+TIMESTAMPED_READ = EventLog.define("{} - Read {} = {} (ts {})")
+TIMESTAMPED_WRITE = EventLog.define("{} - Write {} = {} (changed by {}, ts {})")
+
+
+class TimestampOrderingEngine(UndoLogEngine):
+    """
+    Basic Timestamp Ordering (TO) engine for the interleaved scheduler.
+    
+    Every transaction gets a unique timestamp when it begins (a restarted
+    transaction gets a new, younger one). Each item keeps the largest
+    timestamp that read it and the largest that wrote it, and conflicting
+    operations must happen in timestamp order:
+    
+    - read(x) by T: rejected if a younger transaction already wrote x
+      (ts(T) < write_ts(x)); otherwise read_ts(x) = max(read_ts(x), ts(T)).
+    - write(x) by T: rejected if a younger transaction already read x
+      (ts(T) < read_ts(x)). If only a younger write exists
+      (ts(T) < write_ts(x)), the write is rejected too, unless the Thomas
+      write rule is on and the write is blind (sets an absolute value):
+      then it is obsolete and is simply skipped. A read-modify-write
+      (a value_change) is still rejected, since skipping it would lose
+      its change.
+    
+    A rejected operation aborts the transaction, which the scheduler
+    restarts. Operations never wait for locks, so TO never deadlocks. Writes
+    go to the items table in place through the undo log of UndoLogEngine;
+    a transaction that read another's uncommitted write only waits for it
+    at commit, and since that writer is always older, these waits cannot
+    form a cycle.
+    """
+    
+    # Estimated footprint of one timestamp-table entry (key, read ts, write ts)
+    ENTRY_BYTES = 32
+    
+    def __init__(self, cursor, thomas_write_rule=False):
+        super().__init__(cursor)
+        self.thomas_write_rule = thomas_write_rule
+        self.name = "TO, Thomas write rule" if thomas_write_rule else "TO"
+        self.clock = 0
+        self.timestamps = {}  # txn_id -> timestamp of the current attempt
+        self.read_ts = {}  # item -> largest timestamp that read it
+        self.write_ts = {}  # item -> largest timestamp that wrote it
+        self.peak_entries = 0
+        self.rejected_reads = 0
+        self.rejected_writes = 0
+        self.skipped_writes = 0
+    
+    def begin(self, txn):
+        self._start(txn)
+        self.clock += 1
+        self.timestamps[txn["id"]] = self.clock
+        self.log(txn, TIMESTAMP_ASSIGNED, self.clock)
+        return "ok"
+    
+    def _touch(self, item):
+        """Keep the peak size of the timestamp table up to date."""
+        if item not in self.read_ts and item not in self.write_ts:
+            self.peak_entries = max(self.peak_entries, self.entries() + 1)
+    
+    def entries(self):
+        """Number of items that have a timestamp-table entry."""
+        return len(self.read_ts.keys() | self.write_ts.keys())
+    
+    def execute(self, txn, op):
+        item = op["item"]
+        ts = self.timestamps[txn["id"]]
+        
+        if op["type"] == "read":
+            if ts < self.write_ts.get(item, 0):
+                self.rejected_reads += 1
+                self.log(txn, READ_REJECTED, item, self.write_ts[item])
+                return "abort"
+            
+            value = self._read_value(txn, item)
+            self._touch(item)
+            self.read_ts[item] = max(self.read_ts.get(item, 0), ts)
+            self.log(txn, TIMESTAMPED_READ, item, value, ts, data={"item": item, "value": value})
+            return "ok"
+        
+        if ts < self.read_ts.get(item, 0):
+            self.rejected_writes += 1
+            self.log(txn, WRITE_REJECTED, item, "read", self.read_ts[item])
+            return "abort"
+        
+        if ts < self.write_ts.get(item, 0):
+            if not (self.thomas_write_rule and "value" in op):
+                self.rejected_writes += 1
+                self.log(txn, WRITE_REJECTED, item, "written", self.write_ts[item])
+                return "abort"
+            
+            # Thomas write rule: a younger write already superseded this one
+            self.skipped_writes += 1
+            self.log(txn, WRITE_SKIPPED, item)
+            return "ok"
+        
+        value = self._read_value(txn, item)
+        new_value = written_value(op, value)
+        self._write_value(txn, item, value, new_value)
+        self._touch(item)
+        self.write_ts[item] = ts
+        
+        self.log(txn, TIMESTAMPED_WRITE, item, new_value, new_value - value, ts,
+                 data={"item": item, "old_value": value, "new_value": new_value})
+        return "ok"
+    
+    def _forget(self, txn_id):
+        super()._forget(txn_id)
+        self.timestamps.pop(txn_id, None)
+    
+    def stats(self):
+        entries = self.entries()
+        return {
+            "rejected_reads": self.rejected_reads,
+            "rejected_writes": self.rejected_writes,
+            "skipped_writes": self.skipped_writes,
+            "timestamp_table_entries": entries,
+            "timestamp_table_peak": self.peak_entries,
+            "timestamp_table_bytes": entries * self.ENTRY_BYTES,
+            "timestamp_table_peak_bytes": self.peak_entries * self.ENTRY_BYTES
+        }
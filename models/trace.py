@@ -0,0 +1,242 @@
+import mmap
+import os
+import struct
+import time
+from contextlib import closing
+from models.scheduler import InterleavedScheduler
+from models.workload import item_key, item_name
+
+# File header: magic, format version, record size, record count,
+# transaction count, largest key
+MAGIC = b"TXNTRACE"
+VERSION = 2
+HEADER = struct.Struct("<8sHHQQI4x")
+
+# One operation: timestamp, transaction id, key, value delta, second
+# argument, op type
+RECORD = struct.Struct("<dIIiiB3x")
+
+# Op type codes. An "end" record closes a transaction; think ops keep their
+# tick count in the delta field, range reads their bounds in delta and arg,
+# and inserts and blind writes ("set") their value in delta.
+OP_CODES = {"read": 0, "write": 1, "think": 2, "abort": 3, "end": 4, "range_read": 5, "insert": 6, "set": 7}
+OP_TYPES = {code: op_type for op_type, code in OP_CODES.items()}
+
+
+class TraceRecorder:
+    """
+    Writes transaction operation streams to a compact binary trace.
+    
+    Every operation is one fixed-size record (RECORD.size bytes) holding the
+    transaction id, op type, key, value delta, a second argument and a
+    timestamp; each transaction is closed by an "end" record. Records are
+    buffered and written in blocks, and the header is completed on close(),
+    so a trace can be captured from a running simulation (see
+    InterleavedScheduler's trace argument) without holding it in memory.
+    
+    Range reads name no keys, so a workload of range reads and inserts
+    (see generate_phantom_workload) should pass the key_space its items
+    were generated for.
+    """
+    
+    def __init__(self, path, buffer_records=8192, key_space=0):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0, 0, 0))
+        self.buffer = bytearray(RECORD.size * buffer_records)
+        self.buffered = 0
+        self.records = 0
+        self.transactions = 0
+        self.max_key = key_space
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def record(self, txn_id, op_type, key=0, delta=0, arg=0, timestamp=None):
+        """
+        Append one operation record.
+        
+        Args:
+            txn_id: Transaction id
+            op_type: One of OP_CODES
+            key: Item key number (0 for ops without an item)
+            delta: Value change of a write, ticks of a think op, low bound
+                of a range read or value of an insert or set
+            arg: High bound of a range read (0 for other ops)
+            timestamp: Seconds since the epoch (defaults to now)
+        """
+        if op_type not in OP_CODES:
+            raise ValueError(f"Cannot record op type: {op_type}")
+        if timestamp is None:
+            timestamp = time.time()
+        RECORD.pack_into(self.buffer, self.buffered * RECORD.size,
+                         timestamp, txn_id, key, delta, arg, OP_CODES[op_type])
+        self.buffered += 1
+        self.records += 1
+        # Inserted items don't exist before the run, so they are not part
+        # of the key space a replay seeds
+        if op_type != "insert":
+            self.max_key = max(self.max_key, key)
+        if self.buffered * RECORD.size == len(self.buffer):
+            self.flush()
+    
+    def record_transaction(self, txn, timestamp=None):
+        """Append all operations of a transaction dict, then its end record."""
+        if timestamp is None:
+            timestamp = time.time()
+        for op in txn["ops"]:
+            if op["type"] == "write" and "value" in op:
+                self.record(txn["id"], "set", item_key(op["item"]), op["value"], timestamp=timestamp)
+            elif op["type"] in ("read", "write"):
+                self.record(txn["id"], op["type"], item_key(op["item"]), op.get("value_change", 0), timestamp=timestamp)
+            elif op["type"] == "insert":
+                self.record(txn["id"], "insert", item_key(op["item"]), op["value"], timestamp=timestamp)
+            elif op["type"] == "range_read":
+                self.record(txn["id"], "range_read", 0, op["low"], op["high"], timestamp)
+            elif op["type"] == "think":
+                self.record(txn["id"], "think", 0, op["ticks"], timestamp=timestamp)
+            else:
+                self.record(txn["id"], op["type"], timestamp=timestamp)
+        self.record(txn["id"], "end", timestamp=timestamp)
+        self.transactions += 1
+    
+    def record_workload(self, transactions):
+        """Append every transaction of a workload, returning how many were written."""
+        count = 0
+        for txn in transactions:
+            self.record_transaction(txn)
+            count += 1
+        return count
+    
+    def flush(self):
+        """Write buffered records to the file."""
+        if self.buffered:
+            self.file.write(memoryview(self.buffer)[:self.buffered * RECORD.size])
+            self.buffered = 0
+    
+    def close(self):
+        """Flush, complete the header and close the trace file."""
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, self.records, self.transactions, self.max_key))
+        self.file.close()
+
+
+class TraceReplayer:
+    """
+    Streams a recorded trace from a memory-mapped file.
+    
+    Records are decoded straight from the mapping one at a time, so a trace
+    far larger than RAM can be replayed: only the pages being read and the
+    transactions currently open are resident. Transactions are rebuilt in
+    the order their end records appear, which makes every replay of a trace
+    feed the engines the same transaction stream.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self.map, "madvise"):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+        
+        magic, version, record_size, records, transactions, max_key = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} transaction trace")
+        self.records = records
+        self.transactions = transactions
+        self.key_space = max_key
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def __len__(self):
+        return self.records
+    
+    def iter_records(self):
+        """Yield (timestamp, txn_id, op_type, key, delta, arg) for every record."""
+        end = HEADER.size + self.records * RECORD.size
+        # Both views export the mapping, which cannot be closed until they
+        # are released
+        mapping = memoryview(self.map)
+        view = mapping[HEADER.size:end]
+        try:
+            for timestamp, txn_id, key, delta, arg, code in RECORD.iter_unpack(view):
+                yield timestamp, txn_id, OP_TYPES[code], key, delta, arg
+        finally:
+            view.release()
+            mapping.release()
+    
+    def op_types(self):
+        """Op types that occur in the trace (one pass over the records)."""
+        with closing(self.iter_records()) as records:
+            return {op_type for _, _, op_type, _, _, _ in records}
+    
+    def iter_transactions(self):
+        """Yield transaction dicts in the format used by the simulations."""
+        open_txns = {}  # txn_id -> ops, for traces with interleaved transactions
+        with closing(self.iter_records()) as records:
+            for _, txn_id, op_type, key, delta, arg in records:
+                if op_type == "end":
+                    yield {"id": txn_id, "name": f"T{txn_id}", "ops": open_txns.pop(txn_id, [])}
+                    continue
+                
+                ops = open_txns.setdefault(txn_id, [])
+                if op_type == "read":
+                    ops.append({"type": "read", "item": item_name(key)})
+                elif op_type == "write":
+                    ops.append({"type": "write", "item": item_name(key), "value_change": delta})
+                elif op_type == "set":
+                    ops.append({"type": "write", "item": item_name(key), "value": delta})
+                elif op_type == "insert":
+                    ops.append({"type": "insert", "item": item_name(key), "value": delta})
+                elif op_type == "range_read":
+                    ops.append({"type": "range_read", "low": delta, "high": arg})
+                elif op_type == "think":
+                    ops.append({"type": "think", "ticks": delta})
+                else:
+                    ops.append({"type": op_type})
+    
+    def replay(self, engine, concurrency=4, **options):
+        """
+        Run the trace through a protocol engine.
+        
+        Args:
+            engine: ProtocolEngine whose cursor holds items 1..key_space
+            concurrency: Active transactions at a time
+            **options: Further InterleavedScheduler settings
+        
+        Returns:
+            dict: Scheduler metrics, plus the trace's record and
+            transaction counts.
+        """
+        # Closing the stream releases its views of the mapping even if the
+        # engine raises, so close() can still unmap the trace
+        with closing(self.iter_transactions()) as transactions:
+            metrics = InterleavedScheduler(engine, concurrency, **options).run(transactions)
+        metrics.update({"trace_records": self.records, "trace_transactions": self.transactions})
+        return metrics
+    
+    def close(self):
+        """Unmap and close the trace file."""
+        if not self.map.closed:
+            self.map.close()
+        self.file.close()
+    
+    def stats(self):
+        """Size of the trace for reporting."""
+        return {
+            "records": self.records,
+            "transactions": self.transactions,
+            "key_space": self.key_space,
+            "bytes": os.path.getsize(self.path)
+        }
@@ -0,0 +1,521 @@
+import os
+import json
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+import multiprocessing
+from collections import deque
+from models.bulk_load import create_schema
+from models.histogram import LatencyHistogram, summarize
+from models.wal import WriteAheadLog
+from models.workload import item_key, item_name
+
+
+def shard_of(key, shards):
+    """Shard that owns a key number."""
+    return key % shards
+
+
+def read_log(path):
+    """Records of a JSON-lines log written by WriteAheadLog (empty if missing)."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ShardParticipant:
+    """
+    One shard of a partitioned items table: its own SQLite file and prepare log.
+    
+    prepare() computes after-images, forces a prepare record holding them to
+    the log and keeps the written items locked until the decision arrives;
+    a conflicting prepare votes no instead of waiting, so prepares never
+    deadlock. commit() installs the after-images in one SQLite transaction,
+    then logs a commit record. On startup, recover() re-locks every prepared
+    transaction without a commit or abort record: those are in doubt and
+    must ask the coordinator for the outcome. Installing after-images is
+    idempotent, so a commit repeated after a crash is harmless.
+    """
+    
+    def __init__(self, shard_id, db_path, log_path):
+        self.shard_id = shard_id
+        self.log_path = log_path
+        self.conn = sqlite3.connect(db_path)
+        self.cursor = self.conn.cursor()
+        self.log = WriteAheadLog(log_path)
+        self.locks = {}  # item -> gtid holding it
+        self.prepared = {}  # gtid -> {item: after-image}
+        self.commits = 0
+        self.aborts = 0
+        self.no_votes = 0
+    
+    def recover(self):
+        """
+        Rebuild the prepared set from the log.
+        
+        Returns:
+            list: gtids of in-doubt transactions.
+        """
+        for record in read_log(self.log_path):
+            if record["type"] == "prepare":
+                self.prepared[record["gtid"]] = record["after"]
+            else:
+                self.prepared.pop(record["gtid"], None)
+        for gtid, after in self.prepared.items():
+            for item in after:
+                self.locks[item] = gtid
+        return list(self.prepared)
+    
+    def _after_images(self, gtid, writes):
+        if any(self.locks.get(item, gtid) != gtid for item in writes):
+            return None
+        after = {}
+        for item, delta in writes.items():
+            self.cursor.execute("SELECT value FROM items WHERE name = ?", (item,))
+            after[item] = self.cursor.fetchone()[0] + delta
+        return after
+    
+    def prepare(self, gtid, writes):
+        """Phase one: vote "yes" (prepared and durable) or "no"."""
+        after = self._after_images(gtid, writes)
+        if after is None:
+            self.no_votes += 1
+            return "no"
+        self.log.append({"type": "prepare", "gtid": gtid, "after": after})
+        self.log.flush()
+        self.prepared[gtid] = after
+        for item in after:
+            self.locks[item] = gtid
+        return "yes"
+    
+    def _install(self, after):
+        self.cursor.executemany(
+            "UPDATE items SET value = ? WHERE name = ?",
+            [(value, item) for item, value in after.items()]
+        )
+        self.conn.commit()
+    
+    def commit(self, gtid):
+        """Phase two: install the prepared after-images and release the locks."""
+        after = self.prepared.pop(gtid, None)
+        if after is None:
+            return  # already committed before a crash
+        self._install(after)
+        self.log.append({"type": "commit", "gtid": gtid})
+        self.log.flush()
+        self._unlock(gtid, after)
+        self.commits += 1
+    
+    def abort(self, gtid):
+        """Forget a prepared transaction (the abort record need not be forced)."""
+        after = self.prepared.pop(gtid, None)
+        if after is not None:
+            self.log.append({"type": "abort", "gtid": gtid})
+            self._unlock(gtid, after)
+            self.aborts += 1
+    
+    def commit_one_phase(self, gtid, writes):
+        """Commit a single-shard transaction locally, without a prepare round."""
+        after = self._after_images(gtid, writes)
+        if after is None:
+            self.no_votes += 1
+            return False
+        self._install(after)
+        self.commits += 1
+        return True
+    
+    def _unlock(self, gtid, after):
+        for item in after:
+            if self.locks.get(item) == gtid:
+                del self.locks[item]
+    
+    def close(self):
+        self.log.close()
+        self.conn.close()
+    
+    def stats(self):
+        return dict(self.log.stats(), commits=self.commits, aborts=self.aborts, no_votes=self.no_votes)
+
+
+def run_shard(shard_id, db_path, log_path, inbox, results):
+    """
+    Worker process of one shard: recover, report in-doubt transactions,
+    then serve coordinator messages until ("stop",). ("crash",) exits at
+    once without closing anything, as a power loss would.
+    """
+    participant = ShardParticipant(shard_id, db_path, log_path)
+    in_doubt = participant.recover()
+    for gtid in in_doubt:
+        results.put(("in_doubt", gtid, shard_id))
+    results.put(("ready", shard_id, len(in_doubt)))
+    
+    while True:
+        message = inbox.get()
+        kind = message[0]
+        if kind == "prepare":
+            results.put(("vote", message[1], shard_id, participant.prepare(message[1], message[2])))
+        elif kind == "commit":
+            participant.commit(message[1])
+            results.put(("ack", message[1], shard_id))
+        elif kind == "abort":
+            participant.abort(message[1])
+            results.put(("ack", message[1], shard_id))
+        elif kind == "commit_one":
+            results.put(("done", message[1], shard_id, participant.commit_one_phase(message[1], message[2])))
+        elif kind == "crash":
+            os._exit(1)
+        elif kind == "stop":
+            participant.close()
+            results.put(("stopped", shard_id, participant.stats()))
+            return
+
+
+def generate_transfers(num_txns, key_space, shards, cross_shard_ratio=0.5, seed=None):
+    """
+    Transfers between two items: cross-shard with probability
+    cross_shard_ratio (when there is more than one shard), otherwise both
+    items on the same shard.
+    
+    Returns:
+        list: {"id", "writes": {item name: value change}} dicts.
+    """
+    rng = random.Random(seed)
+    keys = range(1, key_space + 1)
+    transactions = []
+    for txn_id in range(1, num_txns + 1):
+        source = rng.choice(keys)
+        cross = shards > 1 and rng.random() < cross_shard_ratio
+        while True:
+            target = rng.choice(keys)
+            if target != source and (shard_of(target, shards) != shard_of(source, shards)) == cross:
+                break
+        amount = rng.randint(1, 50)
+        transactions.append({"id": txn_id, "writes": {item_name(source): -amount, item_name(target): amount}})
+    return transactions
+
+
+class TwoPhaseCommitCoordinator:
+    """
+    Coordinates transactions over items sharded across SQLite files.
+    
+    Each shard is served by its own worker process (see run_shard). A
+    transaction touching one shard commits there directly; one touching
+    several runs two-phase commit: prepare on every participant, then, if
+    all vote yes, force a commit decision to the coordinator's log before
+    telling the participants to commit. The protocol is presumed abort:
+    abort decisions are not logged, so an in-doubt transaction without a
+    commit record is aborted during recovery.
+    """
+    
+    def __init__(self, shards, work_dir, key_space=1000):
+        self.shards = shards
+        self.work_dir = work_dir
+        self.key_space = key_space
+        self.log_path = os.path.join(work_dir, "coordinator.log")
+        self.decisions = {record["gtid"] for record in read_log(self.log_path) if record["type"] == "commit"}
+        self.log = None
+        self.workers = []
+        self.inboxes = []
+        self.results = None
+        self.recovered = {"in_doubt": 0, "committed": 0, "aborted": 0}
+        self.messages = 0
+    
+    def db_path(self, shard_id):
+        return os.path.join(self.work_dir, f"shard{shard_id}.db")
+    
+    def create_shards(self):
+        """Create every shard's database holding the items it owns."""
+        for shard_id in range(self.shards):
+            conn = sqlite3.connect(self.db_path(shard_id))
+            cursor = conn.cursor()
+            create_schema(cursor)
+            cursor.execute("DELETE FROM items")
+            cursor.executemany(
+                "INSERT INTO items (name, value) VALUES (?, ?)",
+                [(item_name(key), key * 100) for key in range(1, self.key_space + 1)
+                 if shard_of(key, self.shards) == shard_id]
+            )
+            conn.commit()
+            conn.close()
+    
+    def start(self, timeout=10.0):
+        """Start the shard workers and resolve the transactions they report in doubt."""
+        context = multiprocessing.get_context()
+        self.log = WriteAheadLog(self.log_path)
+        self.results = context.Queue()
+        self.inboxes = [context.Queue() for _ in range(self.shards)]
+        self.workers = [
+            context.Process(target=run_shard, daemon=True, args=(
+                shard_id, self.db_path(shard_id), os.path.join(self.work_dir, f"shard{shard_id}.log"),
+                self.inboxes[shard_id], self.results))
+            for shard_id in range(self.shards)
+        ]
+        for worker in self.workers:
+            worker.start()
+        
+        ready = set()
+        pending_acks = 0
+        while len(ready) < self.shards or pending_acks:
+            message = self.results.get(timeout=timeout)
+            if message[0] == "ready":
+                ready.add(message[1])
+            elif message[0] == "in_doubt":
+                _, gtid, shard_id = message
+                outcome = "commit" if gtid in self.decisions else "abort"
+                self.recovered["in_doubt"] += 1
+                self.recovered["committed" if outcome == "commit" else "aborted"] += 1
+                self._send(shard_id, (outcome, gtid))
+                pending_acks += 1
+            elif message[0] == "ack":
+                pending_acks -= 1
+    
+    def _send(self, shard_id, message):
+        self.messages += 1
+        self.inboxes[shard_id].put(message)
+    
+    def _split(self, writes):
+        by_shard = {}
+        for item, delta in writes.items():
+            by_shard.setdefault(shard_of(item_key(item), self.shards), {})[item] = delta
+        return by_shard
+    
+    def _decide_commit(self, gtid):
+        # The decision must be durable before any participant hears it
+        self.log.append({"type": "commit", "gtid": gtid})
+        self.log.flush()
+        self.decisions.add(gtid)
+    
+    def run(self, transactions, concurrency=8, max_retries=5):
+        """
+        Commit transactions, keeping up to `concurrency` in flight.
+        
+        A transaction whose prepare (or one-phase commit) meets a locked
+        item is aborted and retried at the back of the queue.
+        
+        Returns:
+            dict: Commit counts, throughput, and commit-latency histograms
+            for single- and cross-shard transactions, plus the prepare
+            round and the decision-log force.
+        """
+        latency = {name: LatencyHistogram() for name in ("single_shard", "cross_shard", "prepare", "decision_log")}
+        waiting = deque((txn, 0) for txn in transactions)
+        active = {}
+        committed = {"single_shard": 0, "cross_shard": 0}
+        aborted = retries = 0
+        start_time = time.perf_counter()
+        
+        while waiting or active:
+            while waiting and len(active) < concurrency:
+                txn, attempt = waiting.popleft()
+                gtid = f"T{txn['id']}.{attempt}"
+                parts = self._split(txn["writes"])
+                state = {"txn": txn, "attempt": attempt, "parts": parts, "votes": set(),
+                         "acks": set(), "outcome": None, "start": time.perf_counter()}
+                active[gtid] = state
+                if len(parts) == 1:
+                    (shard_id, writes), = parts.items()
+                    self._send(shard_id, ("commit_one", gtid, writes))
+                else:
+                    for shard_id, writes in parts.items():
+                        self._send(shard_id, ("prepare", gtid, writes))
+            
+            message = self.results.get(timeout=30)
+            kind, gtid = message[0], message[1]
+            state = active.get(gtid)
+            if state is None:
+                continue
+            
+            if kind == "done":
+                if message[3]:
+                    latency["single_shard"].record(time.perf_counter() - state["start"])
+                    committed["single_shard"] += 1
+                    del active[gtid]
+                    continue
+                state["outcome"] = "abort"
+                state["acks"] = set(state["parts"])
+            
+            elif kind == "vote":
+                state["votes"].add(message[2])
+                if message[3] == "no" and state["outcome"] is None:
+                    # Abort on the first no; participants that already voted yes, or still will, are told to abort
+                    state["outcome"] = "abort"
+                    for shard_id in state["parts"]:
+                        self._send(shard_id, ("abort", gtid))
+                elif state["outcome"] is None and len(state["votes"]) == len(state["parts"]):
+                    latency["prepare"].record(time.perf_counter() - state["start"])
+                    decided = time.perf_counter()
+                    self._decide_commit(gtid)
+                    latency["decision_log"].record(time.perf_counter() - decided)
+                    state["outcome"] = "commit"
+                    for shard_id in state["parts"]:
+                        self._send(shard_id, ("commit", gtid))
+                continue
+            
+            elif kind == "ack":
+                state["acks"].add(message[2])
+            
+            if len(state["acks"]) < len(state["parts"]):
+                continue
+            del active[gtid]
+            if state["outcome"] == "commit":
+                latency["cross_shard"].record(time.perf_counter() - state["start"])
+                committed["cross_shard"] += 1
+            elif state["attempt"] < max_retries:
+                retries += 1
+                waiting.append((state["txn"], state["attempt"] + 1))
+            else:
+                aborted += 1
+        
+        duration = time.perf_counter() - start_time
+        total = sum(committed.values())
+        return {
+            "shards": self.shards,
+            "concurrency": concurrency,
+            "committed": total,
+            "committed_single_shard": committed["single_shard"],
+            "committed_cross_shard": committed["cross_shard"],
+            "aborted": aborted,
+            "retries": retries,
+            "duration": duration,
+            "throughput": total / duration if duration > 0 else 0,
+            "messages": self.messages,
+            "latency": summarize(latency)
+        }
+    
+    def crash(self):
+        """Kill every shard worker without a clean shutdown."""
+        for shard_id in range(self.shards):
+            self.inboxes[shard_id].put(("crash",))
+        for worker in self.workers:
+            worker.join(timeout=10)
+        self.log.file.close()
+    
+    def stop(self):
+        """
+        Shut the shard workers down.
+        
+        Returns:
+            dict: Per-shard participant counters.
+        """
+        for shard_id in range(self.shards):
+            self.inboxes[shard_id].put(("stop",))
+        stats = {}
+        while len(stats) < self.shards:
+            message = self.results.get(timeout=10)
+            if message[0] == "stopped":
+                stats[message[1]] = message[2]
+        for worker in self.workers:
+            worker.join(timeout=10)
+        self.log.close()
+        return stats
+    
+    def total_value(self):
+        """Sum of item values over all shards (transfers keep it constant)."""
+        total = 0
+        for shard_id in range(self.shards):
+            conn = sqlite3.connect(self.db_path(shard_id))
+            total += conn.execute("SELECT COALESCE(SUM(value), 0) FROM items").fetchone()[0]
+            conn.close()
+        return total
+    
+    def values(self, items):
+        """Current values of some items, read from their shards."""
+        found = {}
+        for item in items:
+            conn = sqlite3.connect(self.db_path(shard_of(item_key(item), self.shards)))
+            found[item] = conn.execute("SELECT value FROM items WHERE name = ?", (item,)).fetchone()[0]
+            conn.close()
+        return found
+
+
+def check_recovery(work_dir, key_space=100):
+    """
+    Crash a two-shard system with two prepared cross-shard transactions in
+    doubt, then restart it.
+    
+    The coordinator logs a commit decision for the first transaction and
+    crashes before it reaches either shard; the second never gets a
+    decision. After restart the shards report both as in doubt: the first
+    must commit (its decision is logged) and the second abort (presumed
+    abort), leaving the total value unchanged.
+    
+    Returns:
+        dict: In-doubt counts, how they were resolved, and whether the
+        shards ended in the expected state.
+    """
+    coordinator = TwoPhaseCommitCoordinator(2, work_dir, key_space)
+    coordinator.create_shards()
+    coordinator.start()
+    before = coordinator.total_value()
+    first = {item_name(1): -10, item_name(2): 10}
+    second = {item_name(3): -20, item_name(4): 20}
+    expected = coordinator.values(list(first) + list(second))
+    
+    for gtid, writes in (("R1", first), ("R2", second)):
+        for shard_id, part in coordinator._split(writes).items():
+            coordinator._send(shard_id, ("prepare", gtid, part))
+    votes = 0
+    while votes < 4:
+        if coordinator.results.get(timeout=10)[0] == "vote":
+            votes += 1
+    coordinator._decide_commit("R1")
+    coordinator.crash()
+    
+    restarted = TwoPhaseCommitCoordinator(2, work_dir, key_space)
+    restarted.start()
+    restarted.stop()
+    
+    for item, delta in first.items():
+        expected[item] += delta
+    values = restarted.values(list(expected))
+    return dict(restarted.recovered, consistent=values == expected and restarted.total_value() == before)
+
+
+def benchmark_two_phase_commit(shard_counts=(1, 2, 4, 8), num_txns=400, key_space=1000,
+                               cross_shard_ratio=0.5, concurrency=8, seed=43, work_dir=None):
+    """
+    Run the same transfer workload over growing shard counts, then check
+    crash recovery.
+    
+    Every run gets fresh shard files in a temporary directory.
+    
+    Returns:
+        dict: One row per shard count (throughput, single- vs cross-shard
+        commit latency, whether the total value was conserved) and the
+        recovery check.
+    """
+    base_dir = tempfile.mkdtemp(dir=work_dir)
+    rows = []
+    try:
+        for shards in shard_counts:
+            run_dir = os.path.join(base_dir, f"shards{shards}")
+            os.makedirs(run_dir)
+            coordinator = TwoPhaseCommitCoordinator(shards, run_dir, key_space)
+            coordinator.create_shards()
+            before = coordinator.total_value()
+            coordinator.start()
+            transactions = generate_transfers(num_txns, key_space, shards, cross_shard_ratio, seed)
+            try:
+                row = coordinator.run(transactions, concurrency)
+            finally:
+                participants = coordinator.stop()
+            row["consistent"] = coordinator.total_value() == before
+            row["fsyncs"] = coordinator.log.flushes + sum(stats["wal_flushes"] for stats in participants.values())
+            rows.append(row)
+        
+        recovery_dir = os.path.join(base_dir, "recovery")
+        os.makedirs(recovery_dir)
+        recovery = check_recovery(recovery_dir)
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+    
+    return {
+        "explanation": "Two-phase commit over items sharded across SQLite files",
+        "num_txns": num_txns,
+        "cross_shard_ratio": cross_shard_ratio,
+        "rows": rows,
+        "recovery": recovery
+    }
@@ -1,13 +1,54 @@
-import sqlite3
+import os
+import tempfile
 import time
 import datetime
 import random
-import matplotlib
-# Set non-interactive backend before importing pyplot
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import base64
-from io import BytesIO
+from contextlib import contextmanager
+from models.batching import BatchWriter, connect
+from models.bulk_load import create_schema
+from models.checkpoint import benchmark_restart
+from models.event_log import EventLog
+from models.histogram import LatencyHistogram, summarize
+from models.hybrid import HybridEngine
+from models.lock_manager import LockManager
+from models.locking_engine import TwoPhaseLockingEngine
+from models.occ import OptimisticEngine
+from models.range_locks import benchmark_range_locks
+from models.rendering import collect_chart, render_service
+from models.scheduler import DATA_OPS, InterleavedScheduler
+from models.striped_locks import benchmark_lock_table
+from models.sweep import ENGINES, ParameterSweep
+from models.timestamp_ordering import TimestampOrderingEngine
+from models.trace import TraceReplayer
+from models.two_phase_commit import benchmark_two_phase_commit
+from models.wal import WriteAheadLog
+from models.workload import generate_phantom_workload, generate_workload, item_name
+
+# Timeline events of the sequential 2PL simulation
+TXN_STARTED_2PL = EventLog.define("Transaction {} started (2PL)")
+LOCK_CONFLICT = EventLog.define("{} - Lock conflict on {}: {} holds {} lock", conflict=True)
+LOCK_UPGRADED = EventLog.define("{} - Upgraded {} lock to {} lock on {}")
+LOCK_ACQUIRED = EventLog.define("{} - Acquired {} lock on {}")
+LOCK_ESCALATED = EventLog.define("{} - Escalated {} row locks on {} to a {} table lock ({})")
+ITEM_READ = EventLog.define("{} - Read {} = {}")
+TABLE_SCANNED = EventLog.define("{} - Scanned {}: {} rows")
+TXN_ABORTED_CONFLICT = EventLog.define("Transaction {} aborted due to lock conflict", abort=True)
+ITEM_WRITTEN = EventLog.define("{} - Write {} = {} (changed by {})")
+LOCK_RELEASED = EventLog.define("{} - Released lock on {}")
+TXN_COMMITTED = EventLog.define("Transaction {} committed", commit=True)
+
+# Timeline events of the sequential MVCC simulation
+TXN_STARTED_MVCC = EventLog.define("Transaction {} started (MVCC, snapshot ts={})")
+NO_VISIBLE_VERSION = EventLog.define("{} - No visible version for {}")
+SNAPSHOT_READ = EventLog.define("{} - Read {} = {} (snapshot ts={})")
+VERSION_BUFFERED = EventLog.define("{} - Buffer new version of {} = {} (changed by {})")
+WRITE_WRITE_CONFLICT = EventLog.define(
+    "{} - Write-write conflict on {}: version committed at ts={} is newer than snapshot ts={}", conflict=True
+)
+TXN_GAVE_UP = EventLog.define("Transaction {} aborted after {} attempts (retry limit reached)", abort=True)
+TXN_ABORTED_FCW = EventLog.define("Transaction {} aborted (first-committer-wins), retry {} in {:.3f}s", abort=True)
+TXN_RESTARTED_MVCC = EventLog.define("Transaction {} restarted (MVCC, snapshot ts={})")
+TXN_COMMITTED_MVCC = EventLog.define("Transaction {} committed (commit ts={})", commit=True)
 
 class TwoPhaseLockingBenchmark:
     """
@@ -19,336 +60,1037 @@ class TwoPhaseLockingBenchmark:
     2. Shrinking phase (only release locks, never acquire)
     """
     
-    def __init__(self, db_path):
+    # Write statements reused across runs (SQLite prepares each SQL text once)
+    INSERT_VERSION_SQL = "INSERT INTO temp_item_versions (item_name, value, txn_id, commit_ts, timestamp) VALUES (?, ?, ?, ?, ?)"
+    UPDATE_ITEM_SQL = "UPDATE items SET value = ? WHERE name = ?"
+    
+    # Initial values of the items used by the standard workload
+    INITIAL_ITEMS = [(100, "Item 1"), (200, "Item 2"), (300, "Item 3"), (400, "Item 4")]
+    
+    # Column holding the mutable value of each simulated table
+    VALUE_COLUMNS = {"items": "value", "accounts": "balance"}
+    
+    # Shared workload for the interleaved protocol comparison: skewed, with
+    # some application rollbacks and think time before commit
+    DEFAULT_WORKLOAD = {
+        "num_txns": 12,
+        "ops_per_txn": 3,
+        "key_space": 8,
+        "skew": 0.8,
+        "read_ratio": 0.5,
+        "abort_ratio": 0.25,
+        "think_ticks": 3,
+        "seed": 29
+    }
+    
+    def __init__(self, db_path, max_retries=3, retry_backoff=0.05, lock_granularity="multi",
+                 escalation_threshold=None, lock_memory_budget=None, variants=None,
+                 concurrency=4, workload=None, thomas_write_rule=True,
+                 group_commit_size=8, group_commit_window=0.002):
         self.db_path = db_path
-        
+        # 2PL variants to compare on the interleaved workload
+        self.variants = variants or TwoPhaseLockingEngine.VARIANTS
+        # Concurrently active transactions and workload parameters for it
+        self.concurrency = concurrency
+        self.workload = dict(self.DEFAULT_WORKLOAD, **(workload or {}))
+        # Lock granularity for table scans: "multi" (table locks) or "row"
+        self.lock_granularity = lock_granularity
+        # Lock escalation: row locks per table before escalating, and a global
+        # lock-table memory budget in bytes (None disables either)
+        self.escalation_threshold = escalation_threshold
+        self.lock_memory_budget = lock_memory_budget
+        # Skip obsolete writes instead of aborting in timestamp ordering
+        self.thomas_write_rule = thomas_write_rule
+        # Group commit: commit records per WAL flush, and the longest a
+        # record waits for its group to fill (seconds)
+        self.group_commit_size = group_commit_size
+        self.group_commit_window = group_commit_window
+        # Retry policy for transactions aborted by MVCC commit validation
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+    
     def _get_timestamp(self):
         """Generate a timestamp string"""
         return datetime.datetime.now().isoformat()
     
-    def run_benchmark(self):
+    def _reset_items(self, cursor):
+        """Reset items to their initial values"""
+        cursor.executemany(self.UPDATE_ITEM_SQL, self.INITIAL_ITEMS)
+        cursor.connection.commit()
+    
+    def _standard_transactions(self, first_id):
+        """The three-transaction benchmark workload, numbered from first_id"""
+        return [
+            {"id": first_id, "name": f"T{first_id}", "ops": [
+                {"type": "read", "item": "Item 1"},
+                {"type": "read", "item": "Item 3"},
+                {"type": "write", "item": "Item 1", "value_change": 50},
+                {"type": "write", "item": "Item 3", "value_change": -30}
+            ]},
+            {"id": first_id + 1, "name": f"T{first_id + 1}", "ops": [
+                {"type": "read", "item": "Item 2"},
+                {"type": "read", "item": "Item 1"},
+                {"type": "write", "item": "Item 2", "value_change": -20},
+                {"type": "write", "item": "Item 1", "value_change": 10}
+            ]},
+            {"id": first_id + 2, "name": f"T{first_id + 2}", "ops": [
+                {"type": "read", "item": "Item 3"},
+                {"type": "read", "item": "Item 4"},
+                {"type": "write", "item": "Item 4", "value_change": 25},
+                {"type": "write", "item": "Item 3", "value_change": 15}
+            ]}
+        ]
+    
+    def _latency_histograms(self, *extra):
+        """Fresh transaction and operation latency histograms, plus any extra kinds"""
+        return {name: LatencyHistogram() for name in ("transaction", "operation") + extra}
+    
+    @contextmanager
+    def _scratch_database(self):
+        """
+        Cursor on a private, temporary database with the simulation schema.
+        
+        The interleaved comparisons seed their own items, so they run here
+        and leave the simulation database as they found it. The file is
+        removed on exit, as in models.sweep.run_sweep_point.
+        """
+        fd, db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        conn = connect(db_path)
+        try:
+            cursor = conn.cursor()
+            create_schema(cursor)
+            yield cursor
+        finally:
+            conn.close()
+            os.remove(db_path)
+    
+    def _seed_items(self, cursor, key_space):
+        """Make items 1..key_space the only items, each reset to key * 100"""
+        cursor.execute("SELECT name FROM items")
+        existing = {row[0] for row in cursor.fetchall()}
+        names = [(key * 100, item_name(key)) for key in range(1, key_space + 1)]
+        cursor.executemany(
+            "DELETE FROM items WHERE name = ?",
+            [(name,) for name in existing - {row[1] for row in names}]
+        )
+        cursor.executemany(
+            self.UPDATE_ITEM_SQL,
+            [row for row in names if row[1] in existing]
+        )
+        cursor.executemany(
+            "INSERT INTO items (value, name) VALUES (?, ?)",
+            [row for row in names if row[1] not in existing]
+        )
+        cursor.connection.commit()
+    
+    def run_benchmark(self, wait_for_chart=True):
         """
         Run a benchmark comparing 2PL with MVCC performance and characteristics.
         
+        Args:
+            wait_for_chart: Wait for the comparison chart; with False, "chart"
+                holds the pending render (see models.rendering.collect_chart)
+        
         Returns:
             dict: Results of the benchmark including timing, conflicts, and analysis.
         """
         results = {
-            "explanation": "Two-Phase Locking (2PL) simulation and comparison with MVCC",
+            "explanation": "Two-Phase Locking (2PL) simulation and comparison with MVCC, OCC and timestamp ordering",
             "benchmarks": {
                 "2pl": {"timeline": [], "conflicts": 0, "aborts": 0, "duration": 0},
-                "mvcc": {"timeline": [], "conflicts": 0, "aborts": 0, "duration": 0},
+                "mvcc": {"timeline": [], "conflicts": 0, "aborts": 0, "duration": 0,
+                         "retries": 0, "wasted_ops": 0, "wasted_time": 0},
+                "occ": {"timeline": [], "conflicts": 0, "aborts": 0, "duration": 0},
+                "to": {"timeline": [], "conflicts": 0, "aborts": 0, "duration": 0, "restarts": 0},
             },
             "comparison": {},
+            "lock_granularity": {},
+            "lock_escalation": {},
+            "variants": {},
+            "occ_crossover": {},
+            "hybrid": {},
+            "range_locking": {},
+            "timestamp_ordering": {},
+            "group_commit": {},
+            "sql": {},
             "chart": None
         }
         
+        # Event logs of the compared protocols, serialized into the results at the end
+        timelines = {key: EventLog() for key in results["benchmarks"]}
+        
         # Connect to the database
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = connect(self.db_path)
         cursor = conn.cursor()
         
         # Reset items to initial state
-        cursor.execute("UPDATE items SET value = 100 WHERE name = 'Item 1'")
-        cursor.execute("UPDATE items SET value = 200 WHERE name = 'Item 2'")
-        cursor.execute("UPDATE items SET value = 300 WHERE name = 'Item 3'")
-        cursor.execute("UPDATE items SET value = 400 WHERE name = 'Item 4'")
-        conn.commit()
+        self._reset_items(cursor)
         
         # Simulate 2PL protocol
+        latency = self._latency_histograms("lock_wait")
         start_time = time.time()
-        self._simulate_2pl(cursor, results["benchmarks"]["2pl"]["timeline"])
+        lock_stats = self._simulate_2pl(cursor, timelines["2pl"], latency=latency)
         end_time = time.time()
         results["benchmarks"]["2pl"]["duration"] = end_time - start_time
+        results["benchmarks"]["2pl"]["locks"] = lock_stats
+        results["benchmarks"]["2pl"]["latency"] = summarize(latency)
+        
+        # Compare row-only and multi-granularity locking on a scan workload
+        results["lock_granularity"] = self._compare_lock_granularity(cursor)
+        
+        # Measure lock escalation on wide transactions
+        results["lock_escalation"] = self._compare_lock_escalation()
+        
+        # The interleaved comparisons seed up to key_space items of their
+        # own, so they run in a scratch database rather than this one
+        with self._scratch_database() as scratch:
+            # Compare 2PL variants on the same interleaved workload
+            results["variants"] = self._compare_2pl_variants(scratch)
+            
+            # Show phantoms under row locking and their prevention by range locks
+            results["range_locking"] = self._compare_range_locking(scratch)
+            
+            # Find the key skew at which the better of 2PL and OCC changes
+            results["occ_crossover"] = self._find_occ_crossover(scratch)
+            
+            # Compare per-key adaptive locking/validation with the pure protocols
+            results["hybrid"] = self._compare_hybrid(scratch)
+            
+            # Compare basic TO with the Thomas write rule on the generated workload
+            results["timestamp_ordering"] = self._compare_timestamp_ordering(scratch)
+            
+            # Measure commit throughput and latency with and without group commit
+            results["group_commit"] = self._compare_group_commit(scratch)
+        
+        # Simulate OCC protocol, with all transactions running concurrently
+        self._reset_items(cursor)
+        occ_metrics = InterleavedScheduler(
+            OptimisticEngine(cursor), concurrency=3, timeline=timelines["occ"], think_time=0.1
+        ).run(self._standard_transactions(401))
+        results["benchmarks"]["occ"].update({
+            "duration": occ_metrics["duration"],
+            "conflicts": occ_metrics["validation_failures"],
+            "aborts": occ_metrics["restarts"] + occ_metrics["aborted"],
+            "validation_time": occ_metrics["validation_time"],
+            "keys_validated": occ_metrics["keys_validated"],
+            "latency": occ_metrics["latency"]
+        })
+        
+        # Simulate timestamp ordering, with the same concurrency as OCC
+        self._reset_items(cursor)
+        to_metrics = InterleavedScheduler(
+            TimestampOrderingEngine(cursor, self.thomas_write_rule), concurrency=3,
+            timeline=timelines["to"], think_time=0.1
+        ).run(self._standard_transactions(501))
+        results["benchmarks"]["to"].update({
+            "duration": to_metrics["duration"],
+            "conflicts": to_metrics["rejected_reads"] + to_metrics["rejected_writes"],
+            "aborts": to_metrics["restarts"] + to_metrics["aborted"],
+            "restarts": to_metrics["restarts"],
+            "skipped_writes": to_metrics["skipped_writes"],
+            "timestamp_table_entries": to_metrics["timestamp_table_entries"],
+            "timestamp_table_bytes": to_metrics["timestamp_table_bytes"],
+            "latency": to_metrics["latency"]
+        })
         
         # Reset items to initial state
-        cursor.execute("UPDATE items SET value = 100 WHERE name = 'Item 1'")
-        cursor.execute("UPDATE items SET value = 200 WHERE name = 'Item 2'")
-        cursor.execute("UPDATE items SET value = 300 WHERE name = 'Item 3'")
-        cursor.execute("UPDATE items SET value = 400 WHERE name = 'Item 4'")
-        conn.commit()
+        self._reset_items(cursor)
         
         # Simulate MVCC protocol
+        latency = self._latency_histograms("validation", "commit")
         start_time = time.time()
-        self._simulate_mvcc(cursor, results["benchmarks"]["mvcc"]["timeline"])
+        mvcc_stats = self._simulate_mvcc(cursor, timelines["mvcc"], latency=latency)
         end_time = time.time()
         results["benchmarks"]["mvcc"]["duration"] = end_time - start_time
+        results["benchmarks"]["mvcc"]["latency"] = summarize(latency)
+        results["benchmarks"]["mvcc"]["retries"] = mvcc_stats["retries"]
+        results["benchmarks"]["mvcc"]["wasted_ops"] = mvcc_stats["wasted_ops"]
+        results["benchmarks"]["mvcc"]["wasted_time"] = mvcc_stats["wasted_time"]
+        results["benchmarks"]["mvcc"]["sql_statements"] = mvcc_stats["sql_statements"]
         
-        # Count conflicts and aborts in 2PL simulation
-        for event in results["benchmarks"]["2pl"]["timeline"]:
-            if "conflict" in event.get("action", "").lower():
-                results["benchmarks"]["2pl"]["conflicts"] += 1
-            if "abort" in event.get("action", "").lower():
-                results["benchmarks"]["2pl"]["aborts"] += 1
-        
-        # Count conflicts and aborts in MVCC simulation
-        for event in results["benchmarks"]["mvcc"]["timeline"]:
-            if "conflict" in event.get("action", "").lower():
-                results["benchmarks"]["mvcc"]["conflicts"] += 1
-            if "abort" in event.get("action", "").lower():
-                results["benchmarks"]["mvcc"]["aborts"] += 1
+        # Conflicts and aborts of the sequential simulations, counted as they were logged
+        for key in ("2pl", "mvcc"):
+            results["benchmarks"][key]["conflicts"] = timelines[key].count("conflict")
+            results["benchmarks"][key]["aborts"] = timelines[key].count("abort")
         
         # Generate comparison analysis
+        protocols = {"2pl": "2PL", "mvcc": "MVCC", "occ": "OCC", "to": "TO"}
+        benchmarks = results["benchmarks"]
+        durations = {key: benchmarks[key]["duration"] for key in protocols}
+        ranked = sorted(durations, key=durations.get)
+        conflicts = {key: benchmarks[key]["conflicts"] for key in protocols}
+        aborts = {key: benchmarks[key]["aborts"] for key in protocols}
+        
         results["comparison"] = {
-            "speed": {
-                "2pl": results["benchmarks"]["2pl"]["duration"],
-                "mvcc": results["benchmarks"]["mvcc"]["duration"],
-                "faster": "MVCC" if results["benchmarks"]["mvcc"]["duration"] < results["benchmarks"]["2pl"]["duration"] else "2PL",
-                "difference_pct": abs(1 - (results["benchmarks"]["mvcc"]["duration"] / results["benchmarks"]["2pl"]["duration"])) * 100
-            },
-            "conflicts": {
-                "2pl": results["benchmarks"]["2pl"]["conflicts"],
-                "mvcc": results["benchmarks"]["mvcc"]["conflicts"],
-                "difference": abs(results["benchmarks"]["2pl"]["conflicts"] - results["benchmarks"]["mvcc"]["conflicts"])
+            "speed": dict(durations, **{
+                "faster": protocols[ranked[0]],
+                # How much faster the fastest protocol was than the runner-up
+                "difference_pct": abs(1 - (durations[ranked[0]] / durations[ranked[1]])) * 100
+            }),
+            "conflicts": dict(conflicts, difference=max(conflicts.values()) - min(conflicts.values())),
+            "aborts": dict(aborts, difference=max(aborts.values()) - min(aborts.values())),
+            # Transaction latency tails per protocol (sleeps between transactions excluded)
+            "latency": {
+                key: {stat: benchmarks[key]["latency"]["transaction"][stat] for stat in ("p50", "p95", "p99", "max")}
+                for key in protocols
             },
-            "aborts": {
-                "2pl": results["benchmarks"]["2pl"]["aborts"],
-                "mvcc": results["benchmarks"]["mvcc"]["aborts"],
-                "difference": abs(results["benchmarks"]["2pl"]["aborts"] - results["benchmarks"]["mvcc"]["aborts"])
+            "retries": {
+                "mvcc": benchmarks["mvcc"]["retries"],
+                "wasted_ops": benchmarks["mvcc"]["wasted_ops"],
+                "wasted_time": benchmarks["mvcc"]["wasted_time"]
             },
             "analysis": [
                 "MVCC generally provides better concurrency by allowing multiple versions of data.",
                 "2PL prevents conflicts by using strict locking but can lead to more waiting time.",
                 "MVCC performs better for read-heavy workloads, while 2PL may be better for write-intensive workloads with potential conflicts.",
                 "2PL has potential for deadlocks which MVCC largely avoids.",
-                "MVCC requires more storage space for maintaining multiple versions."
+                "MVCC requires more storage space for maintaining multiple versions.",
+                "OCC never blocks or deadlocks: it pays for conflicts only at validation, by re-running the transaction. See occ_crossover for the skew at which the better protocol changes.",
+                "The hybrid engine locks only the keys whose recent conflict or abort rate is high and validates the rest, so on skewed workloads it avoids both OCC's repeated restarts on hot keys and 2PL's locking of cold ones (see hybrid).",
+                "Timestamp ordering never waits for locks and never deadlocks, but restarts a transaction whenever it arrives too late for an item; the Thomas write rule avoids the restarts caused by obsolete writes."
             ]
         }
         
-        # Generate comparison chart
-        fig, ax = plt.subplots(figsize=(10, 6))
+        # Comparison chart, drawn by the render service while the rest of the
+        # response is assembled
+        chart = render_service().submit({
+            "kind": "bar",
+            "categories": ['Duration (s)', 'Conflicts', 'Aborts'],
+            "series": [
+                {"label": label, "values": [benchmarks[key]["duration"], benchmarks[key]["conflicts"], benchmarks[key]["aborts"]]}
+                for key, label in protocols.items()
+            ],
+            "width": 0.2,
+            "ylabel": 'Values',
+            "title": '2PL vs MVCC vs OCC vs TO Comparison',
+            "legend": True
+        })
         
-        metrics = ['Duration (s)', 'Conflicts', 'Aborts']
-        two_pl_values = [
-            results["benchmarks"]["2pl"]["duration"],
-            results["benchmarks"]["2pl"]["conflicts"],
-            results["benchmarks"]["2pl"]["aborts"]
-        ]
-        mvcc_values = [
-            results["benchmarks"]["mvcc"]["duration"],
-            results["benchmarks"]["mvcc"]["conflicts"],
-            results["benchmarks"]["mvcc"]["aborts"]
-        ]
+        # Statements sent to the simulation database (executemany counts once)
+        results["sql"] = conn.sql_stats()
         
-        x = range(len(metrics))
-        width = 0.35
+        # Format the timelines for the response
+        for key, timeline in timelines.items():
+            results["benchmarks"][key]["timeline"] = timeline.serialize()
         
-        ax.bar([i - width/2 for i in x], two_pl_values, width, label='2PL')
-        ax.bar([i + width/2 for i in x], mvcc_values, width, label='MVCC')
+        conn.close()
         
-        ax.set_ylabel('Values')
-        ax.set_title('2PL vs MVCC Comparison')
-        ax.set_xticks(x)
-        ax.set_xticklabels(metrics)
-        ax.legend()
+        results["chart"] = chart
+        return collect_chart(results, "chart") if wait_for_chart else results
+    
+    def run_sweep(self, protocols=None, **grid):
+        """
+        Run the selected 2PL variants, OCC and TO over a parameter grid in
+        parallel worker processes.
         
-        # Save the chart to a base64 encoded string
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        image_data = base64.b64encode(buffer.read()).decode()
-        results["chart"] = image_data
-        plt.close()
+        Args:
+            protocols: Protocol names from models.sweep.ENGINES (defaults to
+                the selected 2PL variants plus OCC and both TO modes)
+            **grid: ParameterSweep settings (threads, key_spaces, skews,
+                read_ratios, workload, max_workers)
         
-        conn.close()
+        Returns:
+            dict: Aggregated tables and charts, see ParameterSweep.run_sweep.
+        """
+        if protocols is None:
+            protocols = [f"2pl-{variant}" for variant in self.variants] + ["occ", "to", "to-thomas"]
+        return ParameterSweep(protocols=protocols, **grid).run_sweep()
+    
+    def run_lock_table_benchmark(self, **options):
+        """
+        Measure how lock-acquire throughput scales with lock-table shards
+        and threads (see models.striped_locks).
+        
+        Args:
+            **options: benchmark_lock_table settings (shard_counts,
+                thread_counts, txns_per_thread, locks_per_txn, key_space,
+                write_ratio, seed)
+        
+        Returns:
+            dict: Acquires per second and latch contention per shard and
+            thread count.
+        """
+        return benchmark_lock_table(**options)
+    
+    def run_range_lock_benchmark(self, **options):
+        """
+        Measure range-lock check cost as the number of held ranges grows,
+        for the interval tree and a linear scan (see models.range_locks).
+        
+        Args:
+            **options: benchmark_range_locks settings (sizes, checks,
+                linear_checks, value_space, max_width, seed)
+        
+        Returns:
+            dict: Microseconds and index nodes visited per check, per size.
+        """
+        return benchmark_range_locks(**options)
+    
+    def run_distributed_commit(self, **options):
+        """
+        Shard items across SQLite files served by worker processes and
+        commit cross-shard transactions with two-phase commit (see
+        models.two_phase_commit).
+        
+        Args:
+            **options: benchmark_two_phase_commit settings (shard_counts,
+                num_txns, key_space, cross_shard_ratio, concurrency, seed)
+        
+        Returns:
+            dict: Throughput and single- vs cross-shard commit latency per
+            shard count, and the crash-recovery check.
+        """
+        return benchmark_two_phase_commit(**options)
+    
+    def run_restart_benchmark(self, **options):
+        """
+        Compare the MVCC engine's time-to-ready after a cold load from
+        SQLite and after restoring a memory-mapped checkpoint of its version
+        store and a lock table (see models.checkpoint).
+        
+        Args:
+            **options: benchmark_restart settings (key_space, batches,
+                txns_per_batch, ops_per_txn, read_ratio, sample_reads,
+                held_locks, seed)
+        
+        Returns:
+            dict: Cold and restored time-to-ready, checkpoint sizes and
+            write times, and the verification of the restored state.
+        """
+        return benchmark_restart(**options)
+    
+    def replay_trace(self, trace_path, protocols=None, concurrency=None):
+        """
+        Replay a recorded trace (see models.trace) through several engines.
+        
+        The trace is memory-mapped and streamed once per protocol, so every
+        engine sees the same transaction stream without the trace being
+        loaded into memory. Items 1..key_space are reset in a scratch
+        database before each replay; deadlocks among 2PL transactions are
+        found by the scheduler's wait-for-graph detector and reported per
+        protocol.
+        
+        Only the 2PL engines support the range reads and inserts of a
+        phantom workload: for such a trace, the default protocols are
+        narrowed to those engines.
+        
+        Args:
+            trace_path: Trace file written by a TraceRecorder
+            protocols: Protocol names from models.sweep.ENGINES (defaults to
+                the selected 2PL variants plus OCC, TO and MVCC)
+            concurrency: Active transactions at a time (defaults to the
+                benchmark's concurrency)
+        
+        Raises:
+            ValueError: If a protocol is unknown, or was requested but does
+                not support the trace's operations.
+        
+        Returns:
+            dict: Trace statistics, the scheduler metrics of each protocol
+            and the default protocols skipped for unsupported operations.
+        """
+        requested = protocols is not None
+        if not requested:
+            protocols = [f"2pl-{variant}" for variant in self.variants] + ["occ", "to", "mvcc"]
+        unknown = [protocol for protocol in protocols if protocol not in ENGINES]
+        if unknown:
+            raise ValueError(f"Unknown protocol(s): {', '.join(unknown)}")
+        
+        results = {"protocols": {}, "skipped_protocols": []}
+        
+        with TraceReplayer(trace_path) as replayer, self._scratch_database() as cursor:
+            results["trace"] = replayer.stats()
+            data_ops = replayer.op_types() & set(DATA_OPS)
+            engines = {protocol: ENGINES[protocol](cursor) for protocol in protocols}
+            unsupported = [
+                protocol for protocol, engine in engines.items()
+                if not data_ops <= set(engine.supported_ops)
+            ]
+            if unsupported and requested:
+                raise ValueError(
+                    f"Protocol(s) {', '.join(unsupported)} cannot replay this trace "
+                    f"(it contains {', '.join(sorted(data_ops))} operations)"
+                )
+            results["skipped_protocols"] = unsupported
+            
+            for protocol, engine in engines.items():
+                if protocol in unsupported:
+                    continue
+                self._seed_items(cursor, replayer.key_space)
+                results["protocols"][protocol] = replayer.replay(engine, concurrency or self.concurrency)
         
         return results
     
-    def _simulate_2pl(self, cursor, timeline):
+    def _simulate_2pl(self, cursor, timeline, transactions=None, granularity=None, latency=None):
         """
         Simulate transactions using the Two-Phase Locking protocol.
         
+        Locks are taken through a multi-granularity lock manager: row reads and
+        writes take S/X row locks under IS/IX intention locks on the table and
+        database, while table scans take a single S (or SIX, if the transaction
+        also updates the table) table lock in "multi" granularity mode, or one
+        S lock per row in "row" mode.
+        
         Args:
             cursor: Database cursor
-            timeline: List to append events to
+            timeline: EventLog to record events in
+            transactions: Transaction set to run (defaults to the benchmark workload)
+            granularity: "multi" or "row" (defaults to self.lock_granularity)
+            latency: Histograms to record transaction, operation and
+                lock_wait latencies in (see _latency_histograms)
+        
+        Returns:
+            dict: Lock-call and lock-table size statistics for the run.
         """
         # Initialize lock table (in-memory for simulation)
-        locks = {}
+        lock_manager = LockManager(self.escalation_threshold, self.lock_memory_budget)
+        granularity = granularity or self.lock_granularity
+        if latency is None:
+            latency = self._latency_histograms("lock_wait")
         
         # Define transaction set
-        transactions = [
-            {"id": 201, "name": "T201", "ops": [
-                {"type": "read", "item": "Item 1"},
-                {"type": "read", "item": "Item 3"},
-                {"type": "write", "item": "Item 1", "value_change": 50},
-                {"type": "write", "item": "Item 3", "value_change": -30}
-            ]},
-            {"id": 202, "name": "T202", "ops": [
-                {"type": "read", "item": "Item 2"},
-                {"type": "read", "item": "Item 1"},
-                {"type": "write", "item": "Item 2", "value_change": -20},
-                {"type": "write", "item": "Item 1", "value_change": 10}
-            ]},
-            {"id": 203, "name": "T203", "ops": [
-                {"type": "read", "item": "Item 3"},
-                {"type": "read", "item": "Item 4"},
-                {"type": "write", "item": "Item 4", "value_change": 25},
-                {"type": "write", "item": "Item 3", "value_change": 15}
-            ]}
-        ]
+        if transactions is None:
+            transactions = self._standard_transactions(201)
         
         # Process transactions
         for txn in transactions:
-            timeline.append({
-                "time": self._get_timestamp(),
-                "action": f"Transaction {txn['name']} started (2PL)",
-                "txn_id": txn["id"]
-            })
+            timeline.append(TXN_STARTED_2PL, txn["id"], txn["name"])
+            txn_start = time.perf_counter()
             
-            txn_locks = []  # Track locks acquired by this transaction
             txn_conflict = False
             txn_data = {}  # Local transaction data
+            written_tables = {op.get("table", "items") for op in txn["ops"] if op["type"] == "write"}
             
             # Phase 1: Growing phase (acquire all locks needed)
             for op in txn["ops"]:
-                item = op["item"]
-                lock_type = "READ" if op["type"] == "read" else "WRITE"
+                table = op.get("table", "items")
+                op_start = time.perf_counter()
+                
+                if op["type"] == "scan":
+                    if granularity == "multi":
+                        # One coarse lock covers every row of the table
+                        requests = [(LockManager.path(table), "SIX" if table in written_tables else "S")]
+                    else:
+                        cursor.execute(f"SELECT name FROM {table}")
+                        requests = [(LockManager.path(table, row["name"]), "S") for row in cursor.fetchall()]
+                else:
+                    requests = [(LockManager.path(table, op["item"]), "S" if op["type"] == "read" else "X")]
                 
-                # Check if lock can be acquired
-                if item in locks:
-                    current_lock = locks[item]
+                for resource, lock_type in requests:
+                    name = resource[-1]
+                    held = lock_manager.held_mode(txn["id"], resource)
+                    # No-wait locking: a request is granted or refused at once, so
+                    # the lock wait is the time spent in the lock manager
+                    lock_start = time.perf_counter()
+                    grant = lock_manager.acquire(txn["id"], resource, lock_type)
+                    latency["lock_wait"].record(time.perf_counter() - lock_start)
                     
-                    # If another transaction has a WRITE lock, we have a conflict
-                    if current_lock["txn_id"] != txn["id"] and (current_lock["type"] == "WRITE" or lock_type == "WRITE"):
-                        timeline.append({
-                            "time": self._get_timestamp(),
-                            "action": f"{txn['name']} - Lock conflict on {item}: {current_lock['txn_id']} holds {current_lock['type']} lock",
-                            "txn_id": txn["id"],
-                            "conflict": True
-                        })
+                    # If another transaction holds an incompatible lock, we have a conflict
+                    if not grant["granted"]:
+                        conflict = grant["conflict"]
+                        timeline.append(
+                            LOCK_CONFLICT, txn["id"], txn["name"], conflict["resource"][-1],
+                            conflict["holder"], conflict["mode"]
+                        )
                         txn_conflict = True
                         break
                     
-                    # Upgrade READ lock to WRITE if needed by same transaction
-                    if current_lock["txn_id"] == txn["id"] and current_lock["type"] == "READ" and lock_type == "WRITE":
-                        locks[item] = {"txn_id": txn["id"], "type": "WRITE"}
-                        timeline.append({
-                            "time": self._get_timestamp(),
-                            "action": f"{txn['name']} - Upgraded READ lock to WRITE lock on {item}",
-                            "txn_id": txn["id"]
-                        })
-                else:
-                    # Acquire new lock
-                    locks[item] = {"txn_id": txn["id"], "type": lock_type}
-                    txn_locks.append(item)
+                    if not grant["covered"]:
+                        data = {"resource": list(resource), "lock_calls": grant["calls"]}
+                        mode = lock_manager.held_mode(txn["id"], resource)
+                        if held is not None and held != mode:
+                            timeline.append(LOCK_UPGRADED, txn["id"], txn["name"], held, mode, name, data=data)
+                        else:
+                            timeline.append(LOCK_ACQUIRED, txn["id"], txn["name"], lock_type, name, data=data)
                     
-                    timeline.append({
-                        "time": self._get_timestamp(),
-                        "action": f"{txn['name']} - Acquired {lock_type} lock on {item}",
-                        "txn_id": txn["id"]
-                    })
+                    if grant["escalation"]:
+                        escalation = grant["escalation"]
+                        timeline.append(
+                            LOCK_ESCALATED, txn["id"], txn["name"], escalation["rows_released"],
+                            escalation["table"], escalation["mode"], escalation["reason"], data=escalation
+                        )
+                
+                if txn_conflict:
+                    break
                 
                 # For READ operations, get the current value
                 if op["type"] == "read":
-                    cursor.execute(f"SELECT value FROM items WHERE name = ?", (item,))
-                    value = cursor.fetchone()["value"]
+                    item = op["item"]
+                    cursor.execute(f"SELECT {self.VALUE_COLUMNS[table]} FROM {table} WHERE name = ?", (item,))
+                    value = cursor.fetchone()[0]
                     txn_data[item] = value
                     
-                    timeline.append({
-                        "time": self._get_timestamp(),
-                        "action": f"{txn['name']} - Read {item} = {value}",
-                        "txn_id": txn["id"],
-                        "data": {"item": item, "value": value}
-                    })
+                    timeline.append(ITEM_READ, txn["id"], txn["name"], item, value, data={"item": item, "value": value})
+                
+                elif op["type"] == "scan":
+                    cursor.execute(f"SELECT name, {self.VALUE_COLUMNS[table]} FROM {table}")
+                    rows = cursor.fetchall()
+                    for row in rows:
+                        txn_data[row[0]] = row[1]
+                    
+                    timeline.append(
+                        TABLE_SCANNED, txn["id"], txn["name"], table, len(rows),
+                        data={"table": table, "rows": len(rows), "total": sum(row[1] for row in rows)}
+                    )
+                
+                if op["type"] != "write":
+                    latency["operation"].record(time.perf_counter() - op_start)
             
             # If conflict occurred, abort transaction
             if txn_conflict:
-                timeline.append({
-                    "time": self._get_timestamp(),
-                    "action": f"Transaction {txn['name']} aborted due to lock conflict",
-                    "txn_id": txn["id"],
-                    "abort": True
-                })
+                timeline.append(TXN_ABORTED_CONFLICT, txn["id"], txn["name"])
                 
                 # Release all locks held by this transaction
-                for item in txn_locks:
-                    if item in locks and locks[item]["txn_id"] == txn["id"]:
-                        del locks[item]
+                lock_manager.release_all(txn["id"])
                 
                 continue
             
             # Perform writes (still in phase 1 since we haven't released any locks)
             for op in txn["ops"]:
                 if op["type"] == "write":
+                    op_start = time.perf_counter()
                     item = op["item"]
+                    table = op.get("table", "items")
+                    column = self.VALUE_COLUMNS[table]
                     original_value = txn_data.get(item)
                     
                     # If we don't have the value in local data, fetch it
                     if original_value is None:
-                        cursor.execute(f"SELECT value FROM items WHERE name = ?", (item,))
-                        original_value = cursor.fetchone()["value"]
+                        cursor.execute(f"SELECT {column} FROM {table} WHERE name = ?", (item,))
+                        original_value = cursor.fetchone()[0]
                     
                     new_value = original_value + op["value_change"]
+                    txn_data[item] = new_value
                     
                     # Apply change to database (we don't actually commit until all operations are done)
-                    cursor.execute(f"UPDATE items SET value = ? WHERE name = ?", (new_value, item))
+                    cursor.execute(f"UPDATE {table} SET {column} = ? WHERE name = ?", (new_value, item))
                     
-                    timeline.append({
-                        "time": self._get_timestamp(),
-                        "action": f"{txn['name']} - Write {item} = {new_value} (changed by {op['value_change']})",
-                        "txn_id": txn["id"],
-                        "data": {"item": item, "old_value": original_value, "new_value": new_value}
-                    })
+                    timeline.append(
+                        ITEM_WRITTEN, txn["id"], txn["name"], item, new_value, op["value_change"],
+                        data={"item": item, "old_value": original_value, "new_value": new_value}
+                    )
+                    latency["operation"].record(time.perf_counter() - op_start)
             
-            # Phase 2: Shrinking phase (release all locks)
-            for item in txn_locks:
-                if item in locks and locks[item]["txn_id"] == txn["id"]:
-                    del locks[item]
-                    
-                    timeline.append({
-                        "time": self._get_timestamp(),
-                        "action": f"{txn['name']} - Released lock on {item}",
-                        "txn_id": txn["id"]
-                    })
+            # Phase 2: Shrinking phase (release all locks, rows before tables)
+            for resource in lock_manager.release_all(txn["id"]):
+                timeline.append(LOCK_RELEASED, txn["id"], txn["name"], resource[-1])
             
             # Commit the transaction
-            timeline.append({
-                "time": self._get_timestamp(),
-                "action": f"Transaction {txn['name']} committed",
-                "txn_id": txn["id"],
-                "commit": True
-            })
+            timeline.append(TXN_COMMITTED, txn["id"], txn["name"])
             
             cursor.connection.commit()
+            latency["transaction"].record(time.perf_counter() - txn_start)
             
             # Add some delay between transactions for more realistic simulation
+            # (outside the transaction latency)
             time.sleep(0.1)
+        
+        return lock_manager.stats()
     
-    def _simulate_mvcc(self, cursor, timeline):
+    def _compare_lock_granularity(self, cursor):
         """
-        Simulate transactions using MVCC protocol for comparison.
+        Run a scan-plus-point-update workload under row-only and
+        multi-granularity locking and compare lock-manager costs.
         
         Args:
             cursor: Database cursor
-            timeline: List to append events to
+        
+        Returns:
+            dict: Lock statistics per granularity and the relative savings.
         """
-        # Define transaction set (same operations as 2PL for comparison)
         transactions = [
-            {"id": 301, "name": "T301", "ops": [
-                {"type": "read", "item": "Item 1"},
-                {"type": "read", "item": "Item 3"},
-                {"type": "write", "item": "Item 1", "value_change": 50},
-                {"type": "write", "item": "Item 3", "value_change": -30}
+            {"id": 211, "name": "T211", "ops": [
+                {"type": "scan", "table": "items"},
+                {"type": "write", "item": "Item 2", "value_change": 5}
             ]},
-            {"id": 302, "name": "T302", "ops": [
-                {"type": "read", "item": "Item 2"},
-                {"type": "read", "item": "Item 1"},
-                {"type": "write", "item": "Item 2", "value_change": -20},
-                {"type": "write", "item": "Item 1", "value_change": 10}
+            {"id": 212, "name": "T212", "ops": [
+                {"type": "scan", "table": "items"},
+                {"type": "read", "item": "Item 4"}
             ]},
-            {"id": 303, "name": "T303", "ops": [
-                {"type": "read", "item": "Item 3"},
-                {"type": "read", "item": "Item 4"},
-                {"type": "write", "item": "Item 4", "value_change": 25},
-                {"type": "write", "item": "Item 3", "value_change": 15}
+            {"id": 213, "name": "T213", "ops": [
+                {"type": "read", "item": "Item 1"},
+                {"type": "write", "item": "Item 1", "value_change": -5}
             ]}
         ]
         
-        # In-memory version store for MVCC simulation
-        version_store = {}
-        read_timestamps = {}  # Tracks read timestamps for each transaction
-        write_timestamps = {}  # Tracks write timestamps for each transaction
-        txn_start_times = {}  # Tracks start times for each transaction
+        comparison = {}
+        for granularity in ("row", "multi"):
+            self._reset_items(cursor)
+            comparison[granularity] = self._simulate_2pl(cursor, EventLog(), transactions, granularity)
+        
+        row_calls = comparison["row"]["lock_calls"]
+        comparison["lock_call_savings_pct"] = (
+            (1 - comparison["multi"]["lock_calls"] / row_calls) * 100 if row_calls else 0
+        )
+        return comparison
+    
+    def _compare_lock_escalation(self, num_txns=8, num_rows=5000, rows_per_txn=40, write_ratio=0.1, seed=42):
+        """
+        Replay wide transactions against the lock table with no escalation,
+        threshold-based escalation and a global lock-memory budget.
+        
+        Transactions alternate between the items and accounts tables and
+        arrive staggered, then run interleaved round-robin, one lock request
+        at a time, under the lock manager's no-wait policy (a refused request
+        aborts the transaction). Table locks taken by escalation therefore
+        show up as extra conflicts. Only the lock table is exercised; no rows
+        are touched.
+        
+        Returns:
+            dict: Lock statistics, commits and aborts per configuration.
+        """
+        rng = random.Random(seed)
+        workload = {}
+        for i in range(num_txns):
+            table = ("items", "accounts")[i % 2]
+            rows = rng.sample(range(1, num_rows + 1), rows_per_txn)
+            workload[1000 + i] = {
+                "arrival": i * rows_per_txn // 4,
+                "requests": [
+                    (LockManager.path(table, f"Row {row}"), "X" if rng.random() < write_ratio else "S")
+                    for row in rows
+                ]
+            }
+        
+        threshold = self.escalation_threshold or rows_per_txn // 2
+        configs = {
+            "none": {},
+            "threshold": {"escalation_threshold": threshold},
+            "memory_budget": {"memory_budget": self.lock_memory_budget or
+                              rows_per_txn * LockManager.ENTRY_BYTES}
+        }
+        
+        comparison = {"escalation_threshold": threshold}
+        for name, options in configs.items():
+            lock_manager = LockManager(**options)
+            positions = {txn_id: 0 for txn_id in workload}
+            committed = aborted = 0
+            tick = 0
+            
+            while positions:
+                for txn_id in list(positions):
+                    if workload[txn_id]["arrival"] > tick:
+                        continue
+                    
+                    requests = workload[txn_id]["requests"]
+                    if positions[txn_id] == len(requests):
+                        lock_manager.release_all(txn_id)
+                        del positions[txn_id]
+                        committed += 1
+                        continue
+                    
+                    resource, mode = requests[positions[txn_id]]
+                    if lock_manager.acquire(txn_id, resource, mode)["granted"]:
+                        positions[txn_id] += 1
+                    else:
+                        lock_manager.release_all(txn_id)
+                        del positions[txn_id]
+                        aborted += 1
+                tick += 1
+            
+            stats = lock_manager.stats()
+            stats.update({"committed": committed, "aborted": aborted, "memory_budget": options.get("memory_budget")})
+            comparison[name] = stats
+        
+        comparison["extra_conflicts"] = {
+            name: comparison[name]["aborted"] - comparison["none"]["aborted"]
+            for name in ("threshold", "memory_budget")
+        }
+        return comparison
+    
+    def _compare_2pl_variants(self, cursor, transactions=None):
+        """
+        Run one interleaved workload under each selected 2PL variant.
+        
+        Args:
+            cursor: Database cursor
+            transactions: Transaction set (defaults to the generated workload)
+        
+        Returns:
+            dict: Per-variant throughput, blocking time, deadlock and
+            cascading-abort metrics, plus each variant's timeline.
+        """
+        if transactions is None:
+            transactions = generate_workload(**self.workload)
+        
+        comparison = {}
+        for variant in self.variants:
+            self._seed_items(cursor, self.workload["key_space"])
+            engine = TwoPhaseLockingEngine(cursor, variant, self.escalation_threshold, self.lock_memory_budget)
+            timeline = EventLog()
+            metrics = InterleavedScheduler(engine, self.concurrency, timeline=timeline).run(transactions)
+            metrics["timeline"] = timeline.serialize()
+            comparison[variant] = metrics
+        
+        return comparison
+    
+    def _compare_timestamp_ordering(self, cursor, transactions=None):
+        """
+        Run one interleaved workload under basic TO, with and without the
+        Thomas write rule.
+        
+        The default workload turns half of the writes into blind writes,
+        which set an absolute value: the Thomas write rule only applies to
+        those, since skipping a read-modify-write would lose its change and
+        a read already orders the writer against younger writers.
+        
+        Args:
+            cursor: Database cursor
+            transactions: Transaction set (defaults to the generated workload)
+        
+        Returns:
+            dict: Restarts, rejected and skipped operations, and the size of
+            the per-item timestamp table for each mode.
+        """
+        if transactions is None:
+            transactions = generate_workload(**dict(self.workload, blind_write_ratio=0.5))
+        
+        comparison = {}
+        for key, thomas_write_rule in (("basic", False), ("thomas_write_rule", True)):
+            self._seed_items(cursor, self.workload["key_space"])
+            engine = TimestampOrderingEngine(cursor, thomas_write_rule)
+            metrics = InterleavedScheduler(engine, self.concurrency).run(transactions)
+            comparison[key] = {
+                "committed": metrics["committed"],
+                "aborted": metrics["aborted"],
+                "restarts": metrics["restarts"],
+                "cascading_aborts": metrics["cascading_aborts"],
+                "deadlocks": metrics["deadlocks"],
+                "rejected_reads": metrics["rejected_reads"],
+                "rejected_writes": metrics["rejected_writes"],
+                "skipped_writes": metrics["skipped_writes"],
+                "ticks": metrics["ticks"],
+                "throughput": metrics["throughput"],
+                "timestamp_table_peak": metrics["timestamp_table_peak"],
+                "timestamp_table_bytes": metrics["timestamp_table_bytes"],
+                "timestamp_table_peak_bytes": metrics["timestamp_table_peak_bytes"]
+            }
+        
+        return comparison
+    
+    def _compare_group_commit(self, cursor, num_txns=60, key_space=50, concurrency=8):
+        """
+        Run one low-contention workload under strict 2PL with commit records
+        going through a write-ahead log, flushing every commit on its own
+        (group size 1) and in groups of group_commit_size.
+        
+        Args:
+            cursor: Database cursor
+            num_txns: Transactions in the workload
+            key_space: Items rows the workload draws keys from
+            concurrency: Concurrently active transactions, the most that can
+                share one flush
+        
+        Returns:
+            dict: Commit throughput, commit-latency percentiles and WAL flush
+            counts for each group size.
+        """
+        transactions = generate_workload(
+            num_txns=num_txns, ops_per_txn=3, key_space=key_space,
+            read_ratio=self.workload["read_ratio"], seed=self.workload["seed"]
+        )
+        
+        comparison = {}
+        for group_size in (1, self.group_commit_size):
+            self._seed_items(cursor, key_space)
+            fd, wal_path = tempfile.mkstemp(suffix=".wal")
+            os.close(fd)
+            wal = WriteAheadLog(wal_path, group_size, self.group_commit_window)
+            
+            try:
+                metrics = InterleavedScheduler(
+                    TwoPhaseLockingEngine(cursor, "strict"), concurrency, wal=wal
+                ).run(transactions)
+            finally:
+                wal.close()
+                os.remove(wal_path)
+            
+            comparison[f"group_size_{group_size}"] = {
+                "group_size": group_size,
+                "group_window": self.group_commit_window,
+                "committed": metrics["committed"],
+                "duration": metrics["duration"],
+                "commit_throughput": metrics["throughput"],
+                "commit_latency": metrics["commit_latency"],
+                "wal_flushes": metrics["wal_flushes"],
+                "avg_group_size": metrics["avg_group_size"],
+                "wal_flush_time": metrics["wal_flush_time"]
+            }
+        
+        return comparison
+    
+    def _find_occ_crossover(self, cursor, skews=(0.0, 0.5, 1.0, 1.5, 2.0), key_space=50):
+        """
+        Run strict 2PL and OCC on workloads of increasing key skew.
+        
+        Throughput is reported both per second and per scheduler tick. The
+        winner at each skew is the protocol that finishes the workload in
+        fewer ticks (ticks are deterministic, wall time is not), and the
+        crossover is the first skew at which the winner changes.
+        
+        Returns:
+            dict: Per-skew metrics for both protocols and the crossover skew.
+        """
+        points = []
+        crossover = None
+        
+        for skew in skews:
+            transactions = generate_workload(
+                num_txns=30, ops_per_txn=4, key_space=key_space, skew=skew,
+                read_ratio=self.workload["read_ratio"], seed=self.workload["seed"]
+            )
+            point = {"skew": skew}
+            
+            for key, engine in (("2pl", TwoPhaseLockingEngine(cursor, "strict")), ("occ", OptimisticEngine(cursor))):
+                self._seed_items(cursor, key_space)
+                metrics = InterleavedScheduler(engine, self.concurrency).run(transactions)
+                point[key] = {
+                    "throughput": metrics["throughput"],
+                    "ticks": metrics["ticks"],
+                    "committed_per_tick": metrics["committed"] / metrics["ticks"],
+                    "restarts": metrics["restarts"],
+                    "aborted": metrics["aborted"]
+                }
+            
+            point["winner"] = "2PL" if point["2pl"]["ticks"] < point["occ"]["ticks"] else "OCC"
+            if crossover is None and points and point["winner"] != points[0]["winner"]:
+                crossover = skew
+            points.append(point)
+        
+        return {"key_space": key_space, "points": points, "crossover_skew": crossover}
+    
+    def _compare_range_locking(self, cursor, num_pairs=10, key_space=20):
+        """
+        Run the phantom workload under strict 2PL with row locks only and
+        with range locks.
+        
+        Args:
+            cursor: Database cursor
+            num_pairs: Reader / inserter transaction pairs in the workload
+            key_space: Items seeded (as key * 100) before each run
+        
+        Returns:
+            dict: Phantom reads, commits, lock waits, ticks and range-lock
+            counters per mode, plus the range-locked run's timeline.
+        """
+        transactions = generate_phantom_workload(num_pairs, key_space, seed=self.workload["seed"])
+        comparison = {"num_pairs": num_pairs}
+        
+        for key, range_locking in (("row_locks", False), ("range_locks", True)):
+            self._seed_items(cursor, key_space)
+            timeline = EventLog()
+            engine = TwoPhaseLockingEngine(cursor, "strict", range_locking=range_locking)
+            metrics = InterleavedScheduler(engine, self.concurrency, timeline=timeline).run(transactions)
+            comparison[key] = {
+                "phantom_reads": metrics["phantom_reads"],
+                "committed": metrics["committed"],
+                "lock_waits": metrics["lock_waits"],
+                "deadlocks": metrics["deadlocks"],
+                "ticks": metrics["ticks"],
+                "range_checks": metrics.get("range_checks", 0),
+                "range_conflicts": metrics.get("range_conflicts", 0),
+                "timeline": timeline.serialize()
+            }
+        
+        return comparison
+    
+    def _compare_hybrid(self, cursor, skews=(0.0, 0.8, 1.2, 1.6, 2.0), key_space=50, num_txns=60):
+        """
+        Run strict 2PL, OCC and the adaptive hybrid engine on workloads of
+        increasing key skew.
+        
+        As in _find_occ_crossover, the winner at each skew is the protocol
+        that finishes the workload in the fewest scheduler ticks. The
+        hybrid engine's timeline at the highest skew is kept, so its
+        per-key switching decisions can be inspected.
+        
+        Returns:
+            dict: Per-skew metrics of the three protocols, the hybrid
+            engine's switches and locked keys, and its timeline.
+        """
+        points = []
+        timeline = None
+        
+        for skew in skews:
+            transactions = generate_workload(
+                num_txns=num_txns, ops_per_txn=4, key_space=key_space, skew=skew,
+                read_ratio=self.workload["read_ratio"], seed=self.workload["seed"]
+            )
+            point = {"skew": skew}
+            engines = (
+                ("2pl", TwoPhaseLockingEngine(cursor, "strict")),
+                ("occ", OptimisticEngine(cursor)),
+                ("hybrid", HybridEngine(cursor))
+            )
+            
+            for key, engine in engines:
+                self._seed_items(cursor, key_space)
+                log = EventLog() if key == "hybrid" else None
+                metrics = InterleavedScheduler(engine, self.concurrency, timeline=log).run(transactions)
+                point[key] = {
+                    "throughput": metrics["throughput"],
+                    "ticks": metrics["ticks"],
+                    "committed": metrics["committed"],
+                    "committed_per_tick": metrics["committed"] / metrics["ticks"],
+                    "restarts": metrics["restarts"],
+                    "aborted": metrics["aborted"],
+                    "deadlocks": metrics["deadlocks"]
+                }
+                if key == "hybrid":
+                    timeline = log
+                    point[key].update({
+                        stat: metrics[stat] for stat in (
+                            "mode_switches", "locked_keys", "locked_ops", "optimistic_ops",
+                            "lock_waits", "validation_failures"
+                        )
+                    })
+            
+            point["winner"] = min(("2pl", "occ", "hybrid"), key=lambda key: point[key]["ticks"])
+            points.append(point)
+        
+        return {
+            "key_space": key_space,
+            "num_txns": num_txns,
+            "points": points,
+            "hybrid_wins": sum(1 for point in points if point["winner"] == "hybrid"),
+            "timeline": timeline.serialize()
+        }
+    
+    def _simulate_mvcc(self, cursor, timeline, latency=None):
+        """
+        Simulate transactions using MVCC protocol for comparison.
+        
+        Writes are buffered in a private write set and validated at commit time
+        with the first-committer-wins rule of snapshot isolation: if another
+        transaction committed a newer version of any key in the write set after
+        this transaction's snapshot was taken, the transaction aborts and is
+        retried with a fresh snapshot after an exponential backoff.
+        
+        Args:
+            cursor: Database cursor
+            timeline: EventLog to record events in
+            latency: Histograms to record transaction, operation, validation
+                and commit latencies in (see _latency_histograms)
+        
+        Returns:
+            dict: Retry and wasted-work statistics for the run.
+        """
+        # Define transaction set (same operations as 2PL for comparison)
+        transactions = self._standard_transactions(301)
+        if latency is None:
+            latency = self._latency_histograms("validation", "commit")
+        
+        stats = {"committed": 0, "retries": 0, "wasted_ops": 0, "wasted_time": 0.0, "gave_up": 0}
+        statements_before = cursor.connection.statements
+        
+        # Version inserts and item updates are buffered and sent with executemany
+        writer = BatchWriter(cursor)
+        
+        # Logical commit clock. A snapshot is the clock value at transaction start;
+        # a version is visible to a snapshot if it committed at or before it.
+        commit_clock = 0
+        last_commit_ts = {}  # item name -> commit timestamp of its newest version
         
         # Create a temporary version table for simulation
         cursor.execute("""
@@ -357,190 +1099,154 @@ class TwoPhaseLockingBenchmark:
             item_name TEXT NOT NULL,
             value INTEGER NOT NULL,
             txn_id INTEGER NOT NULL,
+            commit_ts INTEGER NOT NULL,
             timestamp TEXT NOT NULL
         )
         """)
-        cursor.connection.commit()
         
-        # Initialize version store with current values
+        # Initialize version store with current values, in the same transaction
         cursor.execute("SELECT * FROM items")
         items = cursor.fetchall()
         current_time = self._get_timestamp()
         
         for item in items:
-            item_name = item["name"]
-            value = item["value"]
-            
-            # Add initial version
-            cursor.execute(
-                "INSERT INTO temp_item_versions (item_name, value, txn_id, timestamp) VALUES (?, ?, ?, ?)",
-                (item_name, value, 0, current_time)
-            )
-            
-            version_store[item_name] = [{
-                "value": value,
-                "txn_id": 0,  # System transaction
-                "timestamp": current_time
-            }]
+            # Add initial version, committed by the system transaction at clock 0
+            writer.add(self.INSERT_VERSION_SQL, (item["name"], item["value"], 0, commit_clock, current_time))
+            last_commit_ts[item["name"]] = commit_clock
         
+        writer.flush()
         cursor.connection.commit()
         
+        # All transactions begin together, so their snapshots overlap the same way
+        # the concurrently running transactions of a real workload would.
+        snapshots = {}
+        for txn in transactions:
+            snapshots[txn["id"]] = commit_clock
+            timeline.append(TXN_STARTED_MVCC, txn["id"], txn["name"], commit_clock)
+        
         # Process transactions
         for txn in transactions:
-            # Start transaction
-            start_time = self._get_timestamp()
-            txn_start_times[txn["id"]] = start_time
-            read_timestamps[txn["id"]] = start_time
-            write_timestamps[txn["id"]] = start_time
-            
-            timeline.append({
-                "time": start_time,
-                "action": f"Transaction {txn['name']} started (MVCC)",
-                "txn_id": txn["id"]
-            })
+            attempt = 0
+            txn_start = time.perf_counter()
             
-            txn_data = {}  # Local transaction data
-            
-            # Process each operation
-            for op in txn["ops"]:
-                item = op["item"]
+            while True:
+                attempt_start = time.time()
+                snapshot_ts = snapshots[txn["id"]]
+                txn_data = {}  # Values read from the snapshot
+                write_set = {}  # Private write set, installed only on commit
+                ops_done = 0
                 
-                if op["type"] == "read":
-                    # In MVCC, read the most recent version visible to this transaction
-                    visible_versions = []
-                    
-                    # Get versions for this item
-                    cursor.execute("""
-                        SELECT * FROM temp_item_versions
-                        WHERE item_name = ? AND timestamp <= ?
-                        ORDER BY timestamp DESC
-                    """, (item, txn_start_times[txn["id"]]))
-                    
-                    item_versions = cursor.fetchall()
+                for op in txn["ops"]:
+                    item = op["item"]
+                    op_start = time.perf_counter()
                     
-                    if item_versions:
-                        latest_version = item_versions[0]
-                        value = latest_version["value"]
-                        txn_data[item] = value
-                        
-                        timeline.append({
-                            "time": self._get_timestamp(),
-                            "action": f"{txn['name']} - Read {item} = {value} (version from {latest_version['timestamp']})",
-                            "txn_id": txn["id"],
-                            "data": {"item": item, "value": value}
-                        })
+                    if item in write_set:
+                        # Read-your-own-writes from the private write set
+                        value = write_set[item]
                     else:
-                        # No visible version found (shouldn't happen with our setup)
-                        timeline.append({
-                            "time": self._get_timestamp(),
-                            "action": f"{txn['name']} - No visible version for {item}",
-                            "txn_id": txn["id"],
-                            "error": True
-                        })
-                
-                elif op["type"] == "write":
-                    # Get the most recent value
-                    original_value = txn_data.get(item)
-                    
-                    if original_value is None:
-                        # If we haven't read this item yet, find the visible version
                         cursor.execute("""
-                            SELECT * FROM temp_item_versions
-                            WHERE item_name = ? AND timestamp <= ?
-                            ORDER BY timestamp DESC
+                            SELECT value, commit_ts FROM temp_item_versions
+                            WHERE item_name = ? AND commit_ts <= ?
+                            ORDER BY commit_ts DESC
                             LIMIT 1
-                        """, (item, txn_start_times[txn["id"]]))
-                        
+                        """, (item, snapshot_ts))
                         version = cursor.fetchone()
-                        if version:
-                            original_value = version["value"]
-                        else:
+                        
+                        if not version:
                             # No visible version found (shouldn't happen with our setup)
-                            timeline.append({
-                                "time": self._get_timestamp(),
-                                "action": f"{txn['name']} - Cannot write to {item}: no visible version",
-                                "txn_id": txn["id"],
-                                "error": True
-                            })
+                            timeline.append(NO_VISIBLE_VERSION, txn["id"], txn["name"], item, error=True)
                             continue
+                        value = version["value"]
                     
-                    # Calculate new value
-                    new_value = original_value + op["value_change"]
-                    timestamp = self._get_timestamp()
-                    
-                    # Check for write conflicts - in MVCC, we need to ensure this transaction's
-                    # read set hasn't been modified by other transactions
-                    cursor.execute("""
-                        SELECT * FROM temp_item_versions
-                        WHERE item_name = ? AND timestamp > ? AND txn_id != ?
-                        ORDER BY timestamp DESC
-                        LIMIT 1
-                    """, (item, txn_start_times[txn["id"]], txn["id"]))
+                    ops_done += 1
                     
-                    conflict_version = cursor.fetchone()
+                    if op["type"] == "read":
+                        txn_data[item] = value
+                        timeline.append(
+                            SNAPSHOT_READ, txn["id"], txn["name"], item, value, snapshot_ts,
+                            data={"item": item, "value": value}
+                        )
                     
-                    if conflict_version:
-                        # Write conflict detected - in a real system, this would trigger abort
-                        timeline.append({
-                            "time": timestamp,
-                            "action": f"{txn['name']} - Write conflict on {item}: newer version exists",
-                            "txn_id": txn["id"],
-                            "conflict": True
-                        })
-                        continue
+                    elif op["type"] == "write":
+                        new_value = value + op["value_change"]
+                        write_set[item] = new_value
+                        timeline.append(
+                            VERSION_BUFFERED, txn["id"], txn["name"], item, new_value, op["value_change"],
+                            data={"item": item, "old_value": value, "new_value": new_value}
+                        )
                     
-                    # Create new version in MVCC
-                    cursor.execute(
-                        "INSERT INTO temp_item_versions (item_name, value, txn_id, timestamp) VALUES (?, ?, ?, ?)",
-                        (item, new_value, txn["id"], timestamp)
+                    latency["operation"].record(time.perf_counter() - op_start)
+                
+                # Commit-time validation: first committer wins
+                validation_start = time.perf_counter()
+                conflicting = [
+                    item for item in write_set
+                    if last_commit_ts.get(item, 0) > snapshot_ts
+                ]
+                latency["validation"].record(time.perf_counter() - validation_start)
+                
+                if not conflicting:
+                    break
+                
+                for item in conflicting:
+                    timeline.append(
+                        WRITE_WRITE_CONFLICT, txn["id"], txn["name"], item, last_commit_ts[item], snapshot_ts
                     )
-                    
-                    timeline.append({
-                        "time": timestamp,
-                        "action": f"{txn['name']} - Create new version of {item} = {new_value} (changed by {op['value_change']})",
-                        "txn_id": txn["id"],
-                        "data": {"item": item, "old_value": original_value, "new_value": new_value}
-                    })
+                
+                stats["wasted_ops"] += ops_done
+                stats["wasted_time"] += time.time() - attempt_start
+                
+                if attempt >= self.max_retries:
+                    timeline.append(TXN_GAVE_UP, txn["id"], txn["name"], attempt + 1)
+                    stats["gave_up"] += 1
+                    write_set = None
+                    break
+                
+                backoff = self.retry_backoff * (2 ** attempt)
+                attempt += 1
+                stats["retries"] += 1
+                
+                timeline.append(TXN_ABORTED_FCW, txn["id"], txn["name"], attempt, backoff)
+                
+                time.sleep(backoff)
+                
+                # Retry with a fresh snapshot that includes the winning commit
+                snapshots[txn["id"]] = commit_clock
+                timeline.append(TXN_RESTARTED_MVCC, txn["id"], txn["name"], commit_clock)
             
-            # Commit the transaction
-            commit_time = self._get_timestamp()
+            if write_set is None:
+                continue
             
-            timeline.append({
-                "time": commit_time,
-                "action": f"Transaction {txn['name']} committed",
-                "txn_id": txn["id"],
-                "commit": True
-            })
+            # Install the write set as new committed versions
+            commit_start = time.perf_counter()
+            commit_clock += 1
+            commit_time = self._get_timestamp()
             
-            cursor.connection.commit()
+            for item, new_value in write_set.items():
+                writer.add(self.INSERT_VERSION_SQL, (item, new_value, txn["id"], commit_clock, commit_time))
+                last_commit_ts[item] = commit_clock
             
-            # Update actual item values to reflect the final committed versions
-            for op in txn["ops"]:
-                if op["type"] == "write":
-                    item = op["item"]
-                    
-                    # Get the latest value this transaction wrote
-                    cursor.execute("""
-                        SELECT value FROM temp_item_versions
-                        WHERE item_name = ? AND txn_id = ?
-                        ORDER BY version_id DESC
-                        LIMIT 1
-                    """, (item, txn["id"]))
-                    
-                    latest_value = cursor.fetchone()
-                    
-                    if latest_value:
-                        # Update the actual item in the database
-                        cursor.execute(
-                            "UPDATE items SET value = ? WHERE name = ?",
-                            (latest_value["value"], item)
-                        )
+            # Update the actual items in the database
+            for item, new_value in write_set.items():
+                writer.add(self.UPDATE_ITEM_SQL, (new_value, item))
             
+            writer.flush()
             cursor.connection.commit()
+            stats["committed"] += 1
+            now = time.perf_counter()
+            latency["commit"].record(now - commit_start)
+            latency["transaction"].record(now - txn_start)
+            
+            timeline.append(TXN_COMMITTED_MVCC, txn["id"], txn["name"], commit_clock)
             
             # Add some delay between transactions for more realistic simulation
+            # (outside the transaction latency)
             time.sleep(0.1)
         
         # Clean up temporary table
         cursor.execute("DROP TABLE temp_item_versions")
-        cursor.connection.commit()
\ No newline at end of file
+        cursor.connection.commit()
+        
+        stats["sql_statements"] = cursor.connection.statements - statements_before
+        stats["batches"] = writer.batches
+        return stats
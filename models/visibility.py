@@ -0,0 +1,182 @@
+import bisect
+from array import array
+
+# Creator id of the versions holding the initial balances: committed and
+# visible to every snapshot, like PostgreSQL's frozen transaction id
+FROZEN_XID = 0
+
+IN_PROGRESS = 0
+COMMITTED = 1
+ABORTED = 2
+
+
+class CommitLog:
+    """
+    Commit status of every transaction id, two bits per id (like
+    PostgreSQL's CLOG).
+    
+    Ids with no status recorded are in progress. A status lookup is a
+    shift and a mask on a bytearray, so visibility checks never touch
+    transaction_log.
+    """
+    
+    def __init__(self):
+        self.bits = bytearray()
+    
+    def status(self, xid):
+        byte = xid >> 2
+        if byte >= len(self.bits):
+            return IN_PROGRESS
+        return (self.bits[byte] >> ((xid & 3) * 2)) & 3
+    
+    def set_status(self, xid, status):
+        byte = xid >> 2
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        shift = (xid & 3) * 2
+        self.bits[byte] = (self.bits[byte] & ~(3 << shift)) | (status << shift)
+    
+    def is_committed(self, xid):
+        return xid == FROZEN_XID or self.status(xid) == COMMITTED
+    
+    @classmethod
+    def load(cls, cursor):
+        """Build the bitmap from the statuses in transaction_log."""
+        clog = cls()
+        cursor.execute("SELECT txn_id, status FROM transaction_log WHERE status IN ('COMMITTED', 'ABORTED')")
+        for xid, status in cursor.fetchall():
+            clog.set_status(xid, COMMITTED if status == "COMMITTED" else ABORTED)
+        return clog
+
+
+class Snapshot:
+    """
+    The transactions whose effects a reader may see.
+    
+    Every id below xmin had finished when the snapshot was taken, every id
+    at or above xmax had not started, and xip is the sorted array of ids in
+    between that were still in progress. A transaction counts as finished
+    for this snapshot only if it is below xmax and not in xip; whether it
+    committed is then a CommitLog lookup.
+    """
+    
+    __slots__ = ("xmin", "xmax", "xip")
+    
+    def __init__(self, xmin, xmax, xip):
+        self.xmin = xmin
+        self.xmax = xmax
+        self.xip = array('q', sorted(xip))
+    
+    def in_progress(self, xid):
+        """Whether xid was running (or not yet started) when the snapshot was taken."""
+        if xid >= self.xmax:
+            return True
+        if xid < self.xmin:
+            return False
+        index = bisect.bisect_left(self.xip, xid)
+        return index < len(self.xip) and self.xip[index] == xid
+    
+    def to_dict(self):
+        return {"xmin": self.xmin, "xmax": self.xmax, "xip": list(self.xip)}
+
+
+class TransactionManager:
+    """
+    Assigns transaction ids, takes snapshots and decides version visibility.
+    
+    Ids are the transaction_log row ids. Versions are stamped with the id
+    that created them (txn_id, the xmin of the version) and, once
+    superseded, the id that created the next one (xmax). A version is
+    visible to a snapshot when its creator is the reader itself or
+    committed before the snapshot, and its deleter is not: an uncommitted
+    or aborted version is never visible, and a version replaced by an
+    aborted transaction still is.
+    """
+    
+    VERSION_CHAIN_SQL = """
+        SELECT balance, txn_id, xmax FROM account_versions
+        WHERE account_id = ?
+        ORDER BY version_id DESC
+    """
+    
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.clog = CommitLog.load(cursor)
+        self.active = set()
+        cursor.execute("SELECT COALESCE(MAX(txn_id), 0) + 1 FROM transaction_log")
+        self.next_xid = cursor.fetchone()[0]
+        self.version_checks = 0
+    
+    def begin(self, start_timestamp):
+        """Log a new transaction and return its id."""
+        self.cursor.execute(
+            "INSERT INTO transaction_log (start_timestamp, status) VALUES (?, ?)",
+            (start_timestamp, "STARTED")
+        )
+        xid = self.cursor.lastrowid
+        self.active.add(xid)
+        self.next_xid = max(self.next_xid, xid + 1)
+        return xid
+    
+    def snapshot(self):
+        """Snapshot of the transactions finished so far."""
+        return Snapshot(min(self.active, default=self.next_xid), self.next_xid, self.active)
+    
+    def commit(self, xid, commit_timestamp):
+        self.cursor.execute(
+            "UPDATE transaction_log SET commit_timestamp = ?, status = ? WHERE txn_id = ?",
+            (commit_timestamp, "COMMITTED", xid)
+        )
+        self.clog.set_status(xid, COMMITTED)
+        self.active.discard(xid)
+    
+    def abort(self, xid):
+        self.cursor.execute("UPDATE transaction_log SET status = ? WHERE txn_id = ?", ("ABORTED", xid))
+        self.clog.set_status(xid, ABORTED)
+        self.active.discard(xid)
+    
+    def _sees(self, snapshot, xid, own_xid):
+        if xid == own_xid:
+            return True
+        if xid != FROZEN_XID and snapshot.in_progress(xid):
+            return False
+        return self.clog.is_committed(xid)
+    
+    def visible(self, snapshot, xmin, xmax, own_xid=None):
+        """Whether a version created by xmin and deleted by xmax is visible."""
+        self.version_checks += 1
+        if not self._sees(snapshot, xmin, own_xid):
+            return False
+        return xmax is None or not self._sees(snapshot, xmax, own_xid)
+    
+    def write_conflict(self, account_id, snapshot, own_xid):
+        """
+        First-committer-wins check for a write to an account.
+        
+        The newest committed version of the account, other than the
+        writer's own, must be visible to the writer's snapshot; if it was
+        committed by a transaction the snapshot does not see, a concurrent
+        writer committed first.
+        
+        Returns:
+            int: Id of the conflicting committed writer, or None.
+        """
+        for _, xmin, _ in self.cursor.execute(self.VERSION_CHAIN_SQL, (account_id,)):
+            if xmin == own_xid or not self.clog.is_committed(xmin):
+                continue
+            self.version_checks += 1
+            return xmin if xmin != FROZEN_XID and snapshot.in_progress(xmin) else None
+        return None
+    
+    def read(self, account_id, snapshot, own_xid=None):
+        """
+        Balance of the version of an account visible to a snapshot.
+        
+        Returns:
+            float: The balance, or None if the account has no visible version.
+        """
+        # Newest first; rows past the first visible version are never fetched
+        for balance, xmin, xmax in self.cursor.execute(self.VERSION_CHAIN_SQL, (account_id,)):
+            if self.visible(snapshot, xmin, xmax, own_xid):
+                return balance
+        return None
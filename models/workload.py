@@ -0,0 +1,137 @@
+import itertools
+import random
+
+
+def item_name(key):
+    """Name of the items row used for a key number"""
+    return f"Item {key}"
+
+
+def item_key(name):
+    """Key number of an items row name (the inverse of item_name)"""
+    prefix, _, key = name.rpartition(" ")
+    if prefix != "Item" or not key.isdigit():
+        raise ValueError(f"Not a workload item name: {name}")
+    return int(key)
+
+
+def written_value(op, value):
+    """
+    Value of an item after a write op.
+    
+    A blind write sets an absolute "value"; any other write changes the
+    current value by "value_change".
+    """
+    if "value" in op:
+        return op["value"]
+    return value + op["value_change"]
+
+
+def zipf_weights(key_space, skew):
+    """
+    Zipfian access weights for keys 1..key_space.
+    
+    A skew of 0 gives a uniform distribution; larger values concentrate
+    accesses on the low-numbered (hot) keys.
+    """
+    return [1.0 / (rank ** skew) for rank in range(1, key_space + 1)]
+
+
+def generate_workload(num_txns=12, ops_per_txn=4, key_space=4, skew=0.0, read_ratio=0.5,
+                      abort_ratio=0.0, think_ticks=0, blind_write_ratio=0.0, first_id=1, seed=None):
+    """
+    Generate a transaction set in the format used by the simulations.
+    
+    Each transaction touches ops_per_txn distinct keys. Every key is read
+    first and, with probability 1 - read_ratio, then written with a random
+    value change. A fraction blind_write_ratio of the written keys is not
+    read first and gets an absolute value instead (a blind write, as in
+    "SET value = ..." without a SELECT). A fraction abort_ratio of transactions ends with an
+    explicit abort (an application-level rollback), which is what exposes
+    cascading aborts under protocols that release locks before commit.
+    With think_ticks > 0, transactions idle for that many scheduler ticks
+    after their last statement, modelling application work before the
+    commit or rollback decision.
+    
+    Args:
+        num_txns: Number of transactions
+        ops_per_txn: Distinct keys accessed per transaction
+        key_space: Number of keys (items rows) to choose from
+        skew: Zipfian skew of key selection (0 = uniform)
+        read_ratio: Probability that an accessed key is only read
+        abort_ratio: Fraction of transactions that abort voluntarily
+        think_ticks: Idle ticks between the last statement and commit/abort
+        blind_write_ratio: Fraction of written keys that are not read first
+        first_id: Transaction id of the first transaction
+        seed: Random seed, for reproducible workloads
+    
+    Returns:
+        list: Transactions as {"id", "name", "ops"} dicts.
+    """
+    rng = random.Random(seed)
+    keys = list(range(1, key_space + 1))
+    # Accumulated once: choices() would redo this O(key_space) sum per draw
+    cum_weights = list(itertools.accumulate(zipf_weights(key_space, skew)))
+    ops_per_txn = min(ops_per_txn, key_space)
+    
+    transactions = []
+    for txn_id in range(first_id, first_id + num_txns):
+        chosen = []
+        while len(chosen) < ops_per_txn:
+            key = rng.choices(keys, cum_weights=cum_weights)[0]
+            if key not in chosen:
+                chosen.append(key)
+        
+        reads = []
+        writes = []
+        for key in chosen:
+            if rng.random() >= read_ratio:
+                change = rng.randint(-50, 50)
+                if blind_write_ratio and rng.random() < blind_write_ratio:
+                    # Set outright, around the item's initial value of key * 100
+                    writes.append({"type": "write", "item": item_name(key), "value": key * 100 + change})
+                    continue
+                writes.append({"type": "write", "item": item_name(key), "value_change": change})
+            reads.append({"type": "read", "item": item_name(key)})
+        
+        ops = reads + writes
+        if think_ticks:
+            ops.append({"type": "think", "ticks": think_ticks})
+        if rng.random() < abort_ratio:
+            ops.append({"type": "abort"})
+        
+        transactions.append({"id": txn_id, "name": f"T{txn_id}", "ops": ops})
+    
+    return transactions
+
+
+def generate_phantom_workload(num_pairs=10, key_space=20, width=300, think_ticks=3, first_id=1, seed=None):
+    """
+    Generate reader/inserter pairs that produce phantoms under row locking.
+    
+    Items 1..key_space are assumed to hold key * 100. Each reader reads
+    the items with value in a random range [low, low + width], idles for
+    think_ticks, then reads the same range again; the inserter admitted
+    right after it inserts a new item (named after the keys above
+    key_space) with a value inside that range. Unless the range itself is
+    locked, the second read sees the inserted row.
+    
+    Returns:
+        list: Transactions as {"id", "name", "ops"} dicts, reader first in
+        each pair.
+    """
+    rng = random.Random(seed)
+    transactions = []
+    txn_id = first_id
+    for n in range(num_pairs):
+        low = rng.randint(1, key_space) * 100 - rng.randrange(width)
+        high = low + width
+        range_read = {"type": "range_read", "low": low, "high": high}
+        transactions.append({"id": txn_id, "name": f"T{txn_id}", "ops": [
+            range_read, {"type": "think", "ticks": think_ticks}, dict(range_read)
+        ]})
+        transactions.append({"id": txn_id + 1, "name": f"T{txn_id + 1}", "ops": [
+            {"type": "insert", "item": item_name(key_space + n + 1), "value": rng.randint(low, high)}
+        ]})
+        txn_id += 2
+    return transactions